@@ -0,0 +1,82 @@
+"""
+Compara los reportes de ReportsPage calculados con bucles de Python sobre
+objetos Sale/SaleItem frente a SalesAnalytics (NumPy) con ~1M líneas de venta.
+
+Uso: python -m benchmarks.bench_analytics [líneas]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from models.sale import Sale, SaleItem
+from services.sales_analytics import SalesAnalytics
+from utils.gc_utils import paused_gc
+
+def generate_sales(n_lines: int, n_products: int = 5_000):
+    products = [(f"p{i}", f"Producto {i}", round(random.uniform(1, 50), 2)) for i in range(n_products)]
+    start = datetime(2024, 1, 1)
+    sales = []
+    lines = 0
+    with paused_gc():
+        while lines < n_lines:
+            items = []
+            for product_id, name, cost in random.sample(products, random.randint(1, 7)):
+                quantity = random.randint(1, 5)
+                price = round(cost * 1.4, 2)
+                items.append(SaleItem(product_id, name, quantity, price, cost, price * quantity))
+            revenue = sum(i.subtotal for i in items)
+            cost_total = sum(i.cost * i.quantity for i in items)
+            timestamp = (start + timedelta(seconds=lines * 37)).isoformat()
+            sales.append(Sale(str(lines), timestamp, revenue, cost_total, revenue - cost_total, items))
+            lines += len(items)
+    return sales, lines
+
+def python_reports(sales):
+    """Lo que costaría calcular los mismos reportes recorriendo los dataclasses."""
+    per_product = {}
+    hourly = [0.0] * 24
+    for sale in sales:
+        hour = datetime.fromisoformat(sale.timestamp).hour
+        for item in sale.items:
+            metrics = per_product.setdefault(item.product_id, [0, 0.0, 0.0])
+            metrics[0] += item.quantity
+            metrics[1] += item.quantity * item.price
+            metrics[2] += item.quantity * item.cost
+            hourly[hour] += item.quantity * item.price
+    top = sorted(per_product.items(), key=lambda pair: pair[1][1], reverse=True)[:10]
+    margins = {pid: (m[1] - m[2]) / m[1] for pid, m in per_product.items() if m[1]}
+    days = {}
+    for sale in sales:
+        days[sale.timestamp[:10]] = days.get(sale.timestamp[:10], 0.0) + sale.total_revenue
+    return top, margins, hourly, days
+
+def numpy_reports(analytics: SalesAnalytics):
+    top = analytics.top_products(10)
+    margins = analytics.by_product()['margin']
+    hourly = analytics.by_hour_of_day()['revenue']
+    days = analytics.time_buckets(86400)
+    return top, margins, hourly, days
+
+def timed(fn, *args):
+    begin = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - begin
+
+def main():
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(1)
+    sales, lines = generate_sales(n_lines)
+    begin = time.perf_counter()
+    with paused_gc():
+        analytics = SalesAnalytics(sales)
+    analytics.by_product()  # consolida los búferes
+    build_time = time.perf_counter() - begin
+    python_time = min(timed(python_reports, sales) for _ in range(3))
+    numpy_time = min(timed(numpy_reports, analytics) for _ in range(3))
+    print(f"{len(sales)} ventas, {lines} líneas")
+    print(f"  Construcción columnar:   {build_time * 1000:8.1f} ms (una vez)")
+    print(f"  Reportes con Python:     {python_time * 1000:8.1f} ms")
+    print(f"  Reportes con NumPy:      {numpy_time * 1000:8.1f} ms ({python_time / numpy_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compara el tiempo de arranque en frío de los servicios leyendo los JSON
+directamente frente a leer la instantánea binaria de JSONStorage.
+
+Uso: python -m benchmarks.bench_cold_start [productos] [ventas]
+"""
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.json_storage import JSONStorage
+
+def generate_data(data_dir: str, n_products: int, n_sales: int):
+    """Genera un catálogo y un historial de ventas sintéticos."""
+    products = [
+        {'id': str(uuid.uuid4()), 'name': f"Producto {i}", 'cost': round(random.uniform(1, 50), 2),
+         'price': round(random.uniform(51, 100), 2), 'stock': random.randint(0, 500)}
+        for i in range(n_products)
+    ]
+    start = datetime(2020, 1, 1)
+    sales = []
+    for i in range(n_sales):
+        items = []
+        for product in random.sample(products, random.randint(1, 4)):
+            quantity = random.randint(1, 5)
+            items.append({'product_id': product['id'], 'name': product['name'], 'quantity': quantity,
+                          'price': product['price'], 'cost': product['cost'],
+                          'subtotal': product['price'] * quantity})
+        revenue = sum(item['subtotal'] for item in items)
+        cost = sum(item['cost'] * item['quantity'] for item in items)
+        sales.append({'id': str(uuid.uuid4()), 'timestamp': (start + timedelta(minutes=i)).isoformat(),
+                      'total_revenue': revenue, 'total_cost': cost, 'total_profit': revenue - cost,
+                      'items': items})
+    storage = JSONStorage(data_dir)
+    storage.save_products(products)
+    storage.save_sales(sales)
+
+def cold_start(data_dir: str, binary_snapshots: bool) -> float:
+    begin = time.perf_counter()
+    storage = JSONStorage(data_dir, binary_snapshots=binary_snapshots)
+    inventory = InventoryService(storage)
+    SalesService(storage, inventory)
+    return time.perf_counter() - begin
+
+def main():
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    n_sales = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    logging.disable(logging.CRITICAL)
+    data_dir = tempfile.mkdtemp(prefix="bench_cold_start_")
+    try:
+        generate_data(data_dir, n_products, n_sales)
+        json_time = min(cold_start(data_dir, False) for _ in range(3))
+        cold_start(data_dir, True)  # genera las instantáneas
+        snapshot_time = min(cold_start(data_dir, True) for _ in range(3))
+        print(f"{n_products} productos, {n_sales} ventas")
+        print(f"  JSON:                  {json_time * 1000:8.1f} ms")
+        print(f"  Instantánea binaria:   {snapshot_time * 1000:8.1f} ms ({json_time / snapshot_time:.1f}x)")
+    finally:
+        shutil.rmtree(data_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Mide la memoria que ocupa el historial de ventas en objetos del modelo con
+~1M líneas de venta: dataclasses simples (representación anterior) frente
+a los modelos compactos actuales (slots, nombres internados y líneas
+empaquetadas).
+
+Uso: python -m benchmarks.bench_memory [líneas]
+"""
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import List
+from models.sale import Sale
+
+@dataclass
+class LegacySaleItem:
+    product_id: str
+    name: str
+    quantity: int
+    price: float
+    cost: float
+    subtotal: float
+
+    def to_dict(self):
+        return asdict(self)
+
+@dataclass
+class LegacySale:
+    id: str
+    timestamp: str
+    total_revenue: float
+    total_cost: float
+    total_profit: float
+    items: List[LegacySaleItem]
+
+    def to_dict(self):
+        return asdict(self)
+
+def legacy_from_dict(data):
+    return LegacySale(data['id'], data['timestamp'], data['total_revenue'], data['total_cost'],
+                      data['total_profit'], [LegacySaleItem(**item) for item in data['items']])
+
+def generate_chunks(n_lines: int, n_products: int = 5_000, chunk_size: int = 10_000):
+    """Historial sintético serializado en bloques JSON, como se leería del almacenamiento."""
+    products = [(f"{i:08d}-0000-4000-8000-000000000000", f"Producto de prueba {i}", round(random.uniform(1, 50), 2))
+                for i in range(n_products)]
+    start = datetime(2024, 1, 1)
+    chunks, chunk, lines, n_sales = [], [], 0, 0
+    while lines < n_lines:
+        items = []
+        for product_id, name, cost in random.sample(products, random.randint(1, 7)):
+            quantity = random.randint(1, 5)
+            price = round(cost * 1.4, 2)
+            items.append({'product_id': product_id, 'name': name, 'quantity': quantity,
+                          'price': price, 'cost': cost, 'subtotal': price * quantity})
+        revenue = sum(i['subtotal'] for i in items)
+        cost_total = sum(i['cost'] * i['quantity'] for i in items)
+        chunk.append({'id': f"{n_sales:08d}-1111-4111-8111-111111111111",
+                      'timestamp': (start + timedelta(seconds=lines * 37)).isoformat(),
+                      'total_revenue': revenue, 'total_cost': cost_total,
+                      'total_profit': revenue - cost_total, 'items': items})
+        lines += len(items)
+        n_sales += 1
+        if len(chunk) == chunk_size:
+            chunks.append(json.dumps(chunk))
+            chunk = []
+    if chunk:
+        chunks.append(json.dumps(chunk))
+    return chunks, n_sales, lines
+
+def measure(chunks, build) -> int:
+    """Bytes retenidos por las ventas construidas, decodificando un bloque a la vez."""
+    gc.collect()
+    tracemalloc.start()
+    sales = []
+    for chunk in chunks:
+        sales.extend(build(data) for data in json.loads(chunk))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sales
+    return size
+
+def main():
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    random.seed(1)
+    chunks, n_sales, lines = generate_chunks(n_lines)
+    before = measure(chunks, legacy_from_dict)
+    after = measure(chunks, Sale.from_dict)
+    print(f"{n_sales} ventas, {lines} líneas")
+    print(f"  Dataclasses simples:   {before / 2**20:8.1f} MiB ({before / n_sales:6.0f} bytes/venta)")
+    print(f"  Modelos compactos:     {after / 2**20:8.1f} MiB ({after / n_sales:6.0f} bytes/venta, "
+          f"{before / after:.1f}x menos)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Mide la latencia de InventoryService.search_products sobre un catálogo
+sintético grande, por prefijo y con errores de tipeo.
+
+Uso: python -m benchmarks.bench_search [productos]
+"""
+import logging
+import random
+import sys
+import time
+from services.inventory_service import InventoryService
+from storage.base_storage import BaseStorage
+
+SYLLABLES = ["ma", "lo", "ri", "ta", "ne", "so", "vi", "ca", "du", "pe", "ro", "la", "zu", "fi", "go", "mar"]
+WORDS = [
+    "arroz", "azúcar", "aceite", "café", "leche", "harina", "frijol", "atún", "galletas", "jabón",
+    "refresco", "agua", "cerveza", "pan", "queso", "jamón", "yogur", "cereal", "sopa", "salsa",
+    "integral", "light", "natural", "grande", "chico", "familiar", "clásico", "picante", "dulce", "extra",
+]
+
+class MemoryStorage(BaseStorage):
+    """Almacenamiento en memoria para que el benchmark no mida E/S."""
+    def __init__(self, products):
+        self.products = products
+
+    def load_products(self):
+        return self.products
+
+    def save_products(self, products):
+        self.products = products
+
+    def load_sales(self):
+        return []
+
+    def save_sales(self, sales):
+        pass
+
+def generate_products(n_products: int):
+    """Nombres de la forma "<producto> <marca> <variante> <tamaño>" con marcas sintéticas."""
+    brands = list({''.join(random.choices(SYLLABLES, k=random.randint(2, 4))) for _ in range(5_000)})
+    return [
+        {'id': f"p{i}",
+         'name': f"{random.choice(WORDS[:20])} {random.choice(brands)} {random.choice(WORDS[20:])} "
+                 f"{random.choice([250, 500, 750, 1000, 2000])}g",
+         'cost': 1.0, 'price': 2.0, 'stock': 10}
+        for i in range(n_products)
+    ]
+
+def typo(word: str) -> str:
+    """Omite una letra, como un error de tipeo."""
+    i = random.randrange(1, len(word))
+    return word[:i] + word[i + 1:]
+
+def measure(inventory: InventoryService, queries, limit: int = 20) -> float:
+    begin = time.perf_counter()
+    for query in queries:
+        inventory.search_products(query, limit)
+    return (time.perf_counter() - begin) / len(queries)
+
+def main():
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    logging.disable(logging.CRITICAL)
+    random.seed(1)
+    inventory = InventoryService(MemoryStorage(generate_products(n_products)))
+    begin = time.perf_counter()
+    inventory.search_products("a")  # construye el índice
+    build_time = time.perf_counter() - begin
+    names = [p.name for p in inventory.get_all_products()]
+    prefix_queries = [random.choice(names).split()[1][:random.randint(2, 5)] for _ in range(1_000)]
+    multi_queries = [' '.join(w[:4] for w in random.choice(names).split()[:2]) for _ in range(1_000)]
+    typo_queries = [typo(random.choice(names).split()[1]) for _ in range(1_000)]
+    print(f"{n_products} productos (construcción del índice: {build_time * 1000:.0f} ms)")
+    print(f"  Prefijo:               {measure(inventory, prefix_queries) * 1000:8.3f} ms/consulta")
+    print(f"  Varias palabras:       {measure(inventory, multi_queries) * 1000:8.3f} ms/consulta")
+    print(f"  Con errores de tipeo:  {measure(inventory, typo_queries) * 1000:8.3f} ms/consulta")
+
+if __name__ == "__main__":
+    main()
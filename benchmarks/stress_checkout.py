@@ -0,0 +1,91 @@
+"""
+Prueba de estrés de ventas concurrentes: N hilos (uno por terminal) llenan
+carritos con reservas y finalizan ventas contra los mismos productos. Mide
+el rendimiento por cantidad de hilos y verifica que el stock nunca quede
+negativo ni se venda más de lo que había.
+
+Uso: python -m benchmarks.stress_checkout [hilos] [ventas_por_hilo]
+"""
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.json_storage import JSONStorage
+from storage.wal_storage import WALStorage
+
+HOT_PRODUCTS = 8
+INITIAL_STOCK = 500
+
+def run(n_threads: int, checkouts_per_thread: int):
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = WALStorage(JSONStorage(data_dir), data_dir)
+        inventory = InventoryService(storage)
+        for i in range(HOT_PRODUCTS):
+            inventory.add_product(f"Producto {i}", 1.0, 2.0, INITIAL_STOCK, sku=f"SKU{i}")
+        sales = SalesService(storage, inventory)
+        product_ids = [p.id for p in inventory.get_all_products()]
+        counts = {'sold': 0, 'rejected': 0}
+        counts_lock = threading.Lock()
+
+        def terminal(seed: int):
+            rng = random.Random(seed)
+            cart_id = str(uuid.uuid4())
+            # Las terminales pares reservan al agregar al carrito; las impares venden
+            # directamente, compitiendo por el mismo stock.
+            reserve_first = seed % 2 == 0
+            for _ in range(checkouts_per_thread):
+                picks = {pid: rng.randint(1, 4) for pid in rng.sample(product_ids, rng.randint(1, 3))}
+                if reserve_first:
+                    cart = {pid: q for pid, q in picks.items() if inventory.reserve(cart_id, pid, q)}
+                else:
+                    cart = picks
+                items = [{'product_id': pid, 'quantity': q} for pid, q in cart.items()]
+                sale = sales.record_sale(items, cart_id if reserve_first else None) if items else None
+                inventory.release(cart_id)
+                with counts_lock:
+                    if sale:
+                        counts['sold'] += sum(cart.values())
+                    else:
+                        counts['rejected'] += 1
+
+        threads = [threading.Thread(target=terminal, args=(i,)) for i in range(n_threads)]
+        begin = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - begin
+
+        stock = sum(p.stock for p in inventory.get_all_products())
+        sold_units = sum(item.quantity for sale in sales.iter_sales() for item in sale.items)
+        storage.close()
+        reloaded = sum(p.stock for p in InventoryService(WALStorage(JSONStorage(data_dir), data_dir)).get_all_products())
+        assert min(p.stock for p in inventory.get_all_products()) >= 0, "stock negativo"
+        assert stock == HOT_PRODUCTS * INITIAL_STOCK - sold_units == HOT_PRODUCTS * INITIAL_STOCK - counts['sold'], \
+            "el stock no coincide con lo vendido"
+        assert reloaded == stock, "el stock persistido no coincide"
+        total = n_threads * checkouts_per_thread
+        print(f"  {n_threads:3d} hilos: {total / elapsed:8.0f} intentos/s, {len(sales.get_all_sales()):5d} ventas, "
+              f"{counts['rejected']:5d} rechazadas, stock final {stock}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+def main():
+    max_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    checkouts = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    logging.disable(logging.CRITICAL)
+    print(f"{HOT_PRODUCTS} productos con stock {INITIAL_STOCK}, {checkouts} ventas por hilo")
+    n_threads = 1
+    while n_threads <= max_threads:
+        run(n_threads, checkouts)
+        n_threads *= 2
+
+if __name__ == "__main__":
+    main()
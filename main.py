@@ -1,10 +1,46 @@
+import atexit
+import threading
 import flet as ft
 from ui.main_view import MainView
 from services.inventory_service import InventoryService
 from services.sales_service import SalesService
-from storage.json_storage import JSONStorage
+from storage.journal_storage import JournalStorage
+from storage.serializers import fastest_codec
+from storage.wal_storage import WALStorage
+from storage.write_behind_storage import WriteBehindStorage
 from utils.logger import setup_logger
 
+_services = None
+_services_lock = threading.Lock()
+
+def get_services():
+    """
+    Crea una sola vez el almacenamiento y los servicios del proceso. Todas las
+    sesiones (una por terminal) comparten el mismo inventario, de modo que
+    los candados y reservas de stock de `InventoryService` las coordinan.
+    """
+    global _services
+    with _services_lock:
+        if _services is None:
+            # Cada operación se registra en el log de escritura anticipada (una escritura
+            # pequeña y sincronizada); los archivos JSON solo se reescriben en los checkpoints.
+            # La escritura diferida saca ese registro de los manejadores de la interfaz y
+            # agrupa las ráfagas de cambios en un único registro del log.
+            data_storage = WriteBehindStorage(
+                WALStorage(JournalStorage(binary_snapshots=True, codec=fastest_codec().name)),
+                flush_interval=0.5
+            )
+            inventory_service = InventoryService(data_storage)
+            # El índice de búsqueda se arma mientras se muestra la interfaz.
+            inventory_service.build_search_index_async()
+            sales_service = SalesService(data_storage, inventory_service)
+            # atexit ejecuta en orden inverso: primero se guardan los agregados y luego se
+            # cierra el almacenamiento, que vacía la cola de escritura diferida y consolida el log.
+            atexit.register(data_storage.close)
+            atexit.register(sales_service.flush)
+            _services = (data_storage, inventory_service, sales_service)
+        return _services
+
 def main(page: ft.Page):
     """
     Punto de entrada de la aplicación.
@@ -23,9 +59,7 @@ def main(page: ft.Page):
 
     # 2. Inicializar la capa de almacenamiento y servicios
     try:
-        data_storage = JSONStorage()
-        inventory_service = InventoryService(data_storage)
-        sales_service = SalesService(data_storage, inventory_service)
+        data_storage, inventory_service, sales_service = get_services()
     except Exception as e:
         logger.error(f"Error al inicializar servicios: {e}")
         page.add(ft.Text(f"Error crítico al iniciar la aplicación: {e}", color="red"))
@@ -34,6 +68,15 @@ def main(page: ft.Page):
 
     # 3. Crear y agregar la vista principal
     main_view = MainView(page, inventory_service, sales_service)
+
+    def on_disconnect(e):
+        main_view.close()
+        sales_service.flush()
+        data_storage.flush()
+        data_storage.inner.checkpoint()
+
+    # Al desconectarse la sesión se liberan sus reservas y se consolidan los cambios pendientes.
+    page.on_disconnect = on_disconnect
     page.add(main_view)
     page.update()
 
@@ -1,12 +1,29 @@
-from dataclasses import dataclass, asdict
+import sys
+from dataclasses import dataclass
+from typing import Optional
 
-@dataclass
+@dataclass(slots=True)
 class Product:
     id: str
     name: str
     cost: float
     price: float
     stock: int
+    sku: Optional[str] = None
+    # Stock mínimo antes de reabastecer; 0 desactiva la alerta.
+    reorder_threshold: int = 0
+
+    def __post_init__(self):
+        # Los nombres se repiten en cada línea de venta: internarlos permite compartir una sola copia.
+        self.name = sys.intern(self.name)
 
     def to_dict(self):
-        return asdict(self)
\ No newline at end of file
+        return {
+            'id': self.id,
+            'name': self.name,
+            'cost': self.cost,
+            'price': self.price,
+            'stock': self.stock,
+            'sku': self.sku,
+            'reorder_threshold': self.reorder_threshold,
+        }
@@ -1,8 +1,27 @@
-from dataclasses import dataclass, asdict
-from datetime import datetime
-from typing import List
+import struct
+import sys
+from dataclasses import dataclass
+from typing import List, Dict, Iterable, Iterator, Tuple
 
-@dataclass
+# Campos numéricos de una línea de venta empaquetados: quantity, price, cost, subtotal.
+LINE_FORMAT = struct.Struct('<qddd')
+QUANTITY_RANGE = range(-2 ** 63, 2 ** 63)
+
+def sale_quantity(quantity) -> int:
+    """
+    Valida la cantidad de una línea de venta y la devuelve como `int`. Se
+    empaqueta como entero de 64 bits, así que un float solo se acepta si no
+    tiene parte decimal (2.0 pasa a 2).
+    """
+    if isinstance(quantity, float) and quantity.is_integer():
+        quantity = int(quantity)
+    if isinstance(quantity, bool) or not isinstance(quantity, int):
+        raise ValueError(f"La cantidad de una línea de venta debe ser un número entero, no {quantity!r}.")
+    if quantity not in QUANTITY_RANGE:
+        raise ValueError(f"La cantidad de una línea de venta está fuera de rango: {quantity}.")
+    return quantity
+
+@dataclass(slots=True)
 class SaleItem:
     product_id: str
     name: str
@@ -11,17 +30,98 @@ class SaleItem:
     cost: float
     subtotal: float
 
+    def __post_init__(self):
+        self.quantity = sale_quantity(self.quantity)
+
     def to_dict(self):
-        return asdict(self)
+        return {
+            'product_id': self.product_id,
+            'name': self.name,
+            'quantity': self.quantity,
+            'price': self.price,
+            'cost': self.cost,
+            'subtotal': self.subtotal,
+        }
 
-@dataclass
 class Sale:
-    id: str
-    timestamp: str
-    total_revenue: float
-    total_cost: float
-    total_profit: float
-    items: List[SaleItem]
+    """
+    Venta con sus líneas almacenadas de forma compacta: los campos numéricos
+    de todas las líneas van empaquetados en un único `bytes` y los IDs y
+    nombres de producto (internados, compartidos entre ventas) en una tupla.
+    `items` reconstruye los `SaleItem` al acceder a ellos.
+    """
+    __slots__ = ('id', 'timestamp', 'total_revenue', 'total_cost', 'total_profit', '_labels', '_lines')
+
+    def __init__(self, id: str, timestamp: str, total_revenue: float, total_cost: float,
+                 total_profit: float, items: Iterable[SaleItem]):
+        self.id = id
+        self.timestamp = timestamp
+        self.total_revenue = total_revenue
+        self.total_cost = total_cost
+        self.total_profit = total_profit
+        self._pack((i.product_id, i.name, i.quantity, i.price, i.cost, i.subtotal) for i in items)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Sale":
+        """Construye la venta directamente desde su diccionario, sin crear objetos `SaleItem`."""
+        sale = cls.__new__(cls)
+        sale.id = data['id']
+        sale.timestamp = data['timestamp']
+        sale.total_revenue = data['total_revenue']
+        sale.total_cost = data['total_cost']
+        sale.total_profit = data['total_profit']
+        sale._pack(
+            (i['product_id'], i['name'], i['quantity'], i['price'], i['cost'], i['subtotal'])
+            for i in data['items']
+        )
+        return sale
+
+    def _pack(self, lines: Iterable[Tuple[str, str, int, float, float, float]]):
+        labels = []
+        packed = bytearray()
+        for product_id, name, quantity, price, cost, subtotal in lines:
+            labels.append(sys.intern(product_id))
+            labels.append(sys.intern(name))
+            packed += LINE_FORMAT.pack(sale_quantity(quantity), price, cost, subtotal)
+        self._labels = tuple(labels)
+        self._lines = bytes(packed)
+
+    def __len__(self):
+        """Cantidad de líneas de la venta."""
+        return len(self._labels) // 2
+
+    def iter_lines(self) -> Iterator[Tuple[str, str, int, float, float, float]]:
+        """Recorre las líneas como tuplas (product_id, name, quantity, price, cost, subtotal)."""
+        labels = self._labels
+        for i, numbers in enumerate(LINE_FORMAT.iter_unpack(self._lines)):
+            yield (labels[2 * i], labels[2 * i + 1]) + numbers
+
+    @property
+    def items(self) -> List[SaleItem]:
+        return [SaleItem(*line) for line in self.iter_lines()]
+
+    def __eq__(self, other):
+        if not isinstance(other, Sale):
+            return NotImplemented
+        return (self.id, self.timestamp, self.total_revenue, self.total_cost, self.total_profit,
+                self._labels, self._lines) == \
+               (other.id, other.timestamp, other.total_revenue, other.total_cost, other.total_profit,
+                other._labels, other._lines)
+
+    def __repr__(self):
+        return (f"Sale(id={self.id!r}, timestamp={self.timestamp!r}, total_revenue={self.total_revenue!r}, "
+                f"total_cost={self.total_cost!r}, total_profit={self.total_profit!r}, items={self.items!r})")
 
     def to_dict(self):
-        return asdict(self)
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp,
+            'total_revenue': self.total_revenue,
+            'total_cost': self.total_cost,
+            'total_profit': self.total_profit,
+            'items': [
+                {'product_id': product_id, 'name': name, 'quantity': quantity,
+                 'price': price, 'cost': cost, 'subtotal': subtotal}
+                for product_id, name, quantity, price, cost, subtotal in self.iter_lines()
+            ],
+        }
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass(slots=True)
+class StockMovement:
+    """Entrada del libro de stock: un cambio en el stock de un producto."""
+    seq: int
+    timestamp: str
+    product_id: str
+    delta: int
+    # Stock del producto después del movimiento.
+    balance: int
+    reason: str
+    # ID de la venta, archivo importado, etc. que originó el movimiento.
+    reference: Optional[str] = None
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'timestamp': self.timestamp,
+            'product_id': self.product_id,
+            'delta': self.delta,
+            'balance': self.balance,
+            'reason': self.reason,
+            'reference': self.reference,
+        }
@@ -1,28 +1,329 @@
 import uuid
 import os
-import json
-from typing import List, Dict, Optional
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Iterable, List, Dict, Iterator, Optional, Set
 from models.product import Product
+from models.stock_movement import StockMovement
+from services.product_import import ImportResult, ImportRowError, ProgressCallback, read_product_csv
+from services.product_search import ProductSearchIndex, normalize
+from services.stock_alerts import LowStockIndex, StockAlert
+from services.stock_ledger import StockLedger, TimeBound
 from storage.base_storage import BaseStorage
+from utils.gc_utils import paused_gc
 from utils.logger import get_logger
 
 logger = get_logger()
 
+# Criterios de orden de `query_products`; los empates se resuelven por ID.
+SORT_KEYS = {
+    'name': lambda p: normalize(p.name),
+    'sku': lambda p: p.sku or "",
+    'cost': lambda p: p.cost,
+    'price': lambda p: p.price,
+    'stock': lambda p: p.stock,
+}
+# Coincidencias aproximadas que se consideran al filtrar si ningún nombre coincide por prefijo.
+QUERY_FUZZY_LIMIT = 200
+
+class StockTransaction:
+    """
+    Ajustes de stock acumulados dentro de `InventoryService.transaction()`.
+    Cada ajuste se valida contra el stock disponible (sin lo reservado por
+    otros carritos) más los ajustes ya acumulados, sin modificar el
+    inventario hasta que la transacción termina; al confirmarla se vuelve a
+    validar con los productos bloqueados.
+    """
+    def __init__(self, inventory: "InventoryService", reservation_id: Optional[str] = None):
+        self._inventory = inventory
+        self.reservation_id = reservation_id
+        self.stock_deltas: Dict[str, int] = {}
+        self.writes: List[tuple] = []
+
+    def persist(self, operation: Callable, *args):
+        """
+        Agrega una escritura (p. ej. `storage.append_sale`) que se ejecuta en el
+        mismo lote que los ajustes, solo si la transacción se confirma.
+        """
+        self.writes.append((operation, args))
+
+    def available(self, product_id: str) -> int:
+        """Stock que quedaría disponible si se aplicaran los ajustes acumulados."""
+        if self._inventory.get_product(product_id) is None:
+            return 0
+        return self._inventory.available_stock(product_id, self.reservation_id) + self.stock_deltas.get(product_id, 0)
+
+    def adjust(self, product_id: str, delta: int) -> Product:
+        """Acumula un ajuste de stock; lanza ValueError si el producto no existe o el stock quedaría negativo."""
+        product = self._inventory.get_product(product_id)
+        if product is None:
+            raise ValueError(f"ID de producto no encontrado: {product_id}")
+        if self.available(product_id) + delta < 0:
+            raise ValueError(f"Stock insuficiente para el producto: {product.name}")
+        self.stock_deltas[product_id] = self.stock_deltas.get(product_id, 0) + delta
+        return product
+
+    def remove_stock(self, product_id: str, quantity: int) -> Product:
+        """Descuenta `quantity` unidades (debe ser positiva) y devuelve el producto."""
+        if quantity <= 0:
+            raise ValueError(f"Cantidad inválida para el producto {product_id}: {quantity}")
+        return self.adjust(product_id, -quantity)
+
 class InventoryService:
-    def __init__(self, storage: BaseStorage):
+    """
+    Catálogo de productos compartido por todas las sesiones del proceso.
+
+    El stock se protege con un candado por producto: las operaciones que
+    cambian el stock de varios productos los bloquean en orden de ID, así que
+    dos ventas simultáneas solo se esperan si comparten productos. Los índices
+    compartidos (búsqueda, SKU, stock bajo, reservas) usan un candado general
+    que se toma siempre después de los de producto.
+
+    Las reservas (`reserve`/`release`/`commit_reservation`) apartan stock
+    mientras un producto está en un carrito: el stock reservado no está
+    disponible para otras ventas hasta que se confirma o se libera.
+
+    Todo cambio de stock se registra en el libro de movimientos
+    (`services.stock_ledger`) junto con su motivo, en el mismo lote del
+    almacenamiento que el cambio. El lote se escribe antes de soltar los
+    candados de los productos, así que el almacenamiento recibe los cambios de
+    cada producto en el mismo orden en que se aplicaron en memoria. Entre los
+    candados de producto y el general se toma `StockLedger.writing()`, que
+    mantiene en orden de secuencia los movimientos de operaciones simultáneas.
+    """
+    def __init__(self, storage: BaseStorage, ledger_snapshot_every: int = 5000):
         self._storage = storage
+        self._ledger = StockLedger(storage, ledger_snapshot_every)
         self._products: Dict[str, Product] = {}
+        self._lock = threading.RLock()
+        self._product_locks: Dict[str, threading.Lock] = {}
+        # Stock reservado: total por producto y detalle por reserva (carrito).
+        self._reserved: Dict[str, int] = {}
+        self._reservations: Dict[str, Dict[str, int]] = {}
+        # El índice de búsqueda se construye fuera de `_lock` (ver `_build_index`)
+        # al arrancar con `build_search_index_async` o en la primera consulta;
+        # mientras tanto `_index_backlog` anota los productos que cambian para
+        # aplicarlos antes de publicarlo.
+        self._search_index: Optional[ProductSearchIndex] = None
+        self._index_backlog: Optional[Set[str]] = None
+        self._index_build_lock = threading.Lock()
+        # Índice secundario SKU/código de barras -> ID de producto.
+        self._sku_index: Dict[str, str] = {}
+        # Productos con umbral de reabastecimiento ordenados por stock / umbral.
+        self._low_stock = LowStockIndex()
+        self._stock_listeners: List[Callable[[StockAlert], None]] = []
+        # Versiones del catálogo: `_version` cambia con cualquier modificación
+        # (incluido el stock) y `_catalog_version` solo con altas, bajas y
+        # ediciones. Invalidan los órdenes y filtros guardados de `query_products`.
+        self._version = 0
+        self._catalog_version = 0
+        self._sorted_ids: Dict[str, tuple] = {}
+        self._filter_cache: Optional[tuple] = None
         self.load_products()
 
     def load_products(self):
-        """Carga los productos desde el almacenamiento."""
+        """Carga los productos desde el almacenamiento y concilia el libro de stock con ellos."""
+        movements = []
+        with self._ledger.writing():
+            with self._lock:
+                self._reserved = {}
+                self._reservations = {}
+                try:
+                    products_data = self._storage.load_products()
+                    self._products = {p['id']: Product(**p) for p in products_data}
+                    self._drop_index()
+                    self._rebuild_sku_index()
+                    self._low_stock.clear()
+                    for product in self._products.values():
+                        self._low_stock.update(product)
+                    logger.info(f"Se cargaron {len(self._products)} productos.")
+                    self._ledger.load()
+                    movements = self._ledger.reconcile({p.id: p.stock for p in self._products.values()})
+                except Exception as e:
+                    logger.error(f"Error al cargar productos: {e}")
+                    self._products = {}
+                    self._drop_index()
+                    self._sku_index = {}
+                    self._low_stock.clear()
+                self._touch()
+            if movements:
+                logger.info(f"Libro de stock conciliado con {len(movements)} movimientos.")
+                self._persist(self._ledger.persist, movements)
+
+    def _touch(self, catalog: bool = True):
+        """Registra un cambio en los productos (`catalog=False` si solo cambió el stock). Requiere `self._lock`."""
+        self._version += 1
+        if catalog:
+            self._catalog_version += 1
+
+    @property
+    def version(self) -> int:
+        """Número que cambia cada vez que cambia algún producto o su stock."""
+        return self._version
+
+    @property
+    def catalog_version(self) -> int:
+        """Como `version`, pero no cambia con los movimientos de stock (ventas, devoluciones...)."""
+        return self._catalog_version
+
+    def _rebuild_sku_index(self):
+        self._sku_index = {}
+        for product in self._products.values():
+            if not product.sku:
+                continue
+            if product.sku in self._sku_index:
+                logger.warning(f"SKU duplicado '{product.sku}' en el producto {product.id}; se conserva el primero.")
+                continue
+            self._sku_index[product.sku] = product.id
+
+    @staticmethod
+    def normalize_sku(sku: Optional[str]) -> Optional[str]:
+        """Quita los espacios de un SKU; una cadena vacía equivale a no tener SKU."""
+        sku = (sku or "").strip()
+        return sku or None
+
+    def _sku_available(self, sku: Optional[str], product_id: Optional[str] = None) -> bool:
+        """Indica si `sku` puede asignarse a `product_id` sin duplicarse."""
+        owner = self._sku_index.get(sku) if sku else None
+        if owner is not None and owner != product_id:
+            logger.warning(f"El SKU '{sku}' ya está asignado al producto {owner}.")
+            return False
+        return True
+
+    def _product_lock(self, product_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._product_locks.get(product_id)
+            if lock is None:
+                lock = self._product_locks[product_id] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def _locked(self, product_ids: Iterable[str]):
+        """Bloquea el stock de los productos indicados, en orden de ID para evitar interbloqueos."""
+        locks = [self._product_lock(product_id) for product_id in sorted(set(product_ids))]
+        for lock in locks:
+            lock.acquire()
         try:
-            products_data = self._storage.load_products()
-            self._products = {p['id']: Product(**p) for p in products_data}
-            logger.info(f"Se cargaron {len(self._products)} productos.")
-        except Exception as e:
-            logger.error(f"Error al cargar productos: {e}")
-            self._products = {}
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _build_index(self):
+        """
+        Construye el índice de búsqueda si falta, sin bloquear el catálogo: se
+        indexa una copia de los nombres y luego, bajo `self._lock`, se aplican
+        los productos que cambiaron entretanto y se publica. Debe llamarse sin
+        tener `self._lock`.
+        """
+        while self._search_index is None:
+            with self._index_build_lock:
+                with self._lock:
+                    if self._search_index is not None:
+                        return
+                    self._index_backlog = set()
+                    names = [(product.id, product.name) for product in self._products.values()]
+                index = ProductSearchIndex()
+                with paused_gc():
+                    for product_id, name in names:
+                        index.add(product_id, name)
+                with self._lock:
+                    backlog, self._index_backlog = self._index_backlog, None
+                    # Sin anotaciones el catálogo se recargó durante la construcción: se repite.
+                    if self._search_index is not None or backlog is None:
+                        continue
+                    for product_id in backlog:
+                        product = self._products.get(product_id)
+                        if product is None:
+                            index.remove(product_id)
+                        else:
+                            index.add(product_id, product.name)
+                    self._search_index = index
+
+    def build_search_index_async(self) -> threading.Thread:
+        """
+        Construye el índice de búsqueda en un hilo en segundo plano, para que
+        la primera búsqueda no tenga que esperar a indexar todo el catálogo.
+        """
+        thread = threading.Thread(target=self._build_index, name="search-index-build", daemon=True)
+        thread.start()
+        return thread
+
+    def _index(self) -> ProductSearchIndex:
+        """
+        Índice de búsqueda. Requiere `self._lock`; quien consulta llama antes a
+        `_build_index`, así que solo se construye aquí si se descartó entre medio.
+        """
+        if self._search_index is None:
+            index = ProductSearchIndex()
+            with paused_gc():
+                for product in self._products.values():
+                    index.add(product.id, product.name)
+            self._search_index = index
+        return self._search_index
+
+    def _drop_index(self):
+        """Descarta el índice de búsqueda (y cualquier construcción en curso). Requiere `self._lock`."""
+        self._search_index = None
+        self._index_backlog = None
+
+    def _reindex(self, product: Product):
+        if self._search_index is not None:
+            self._search_index.add(product.id, product.name)
+        elif self._index_backlog is not None:
+            self._index_backlog.add(product.id)
+
+    def _unindex(self, product_id: str):
+        if self._search_index is not None:
+            self._search_index.remove(product_id)
+        elif self._index_backlog is not None:
+            self._index_backlog.add(product_id)
+
+    def subscribe_stock_alerts(self, callback: Callable[[StockAlert], None]) -> Callable[[], None]:
+        """
+        Registra `callback` para recibir un `StockAlert` cada vez que cambia el
+        stock o el umbral de un producto que necesita (o dejó de necesitar)
+        reabastecerse. Devuelve una función para cancelar la suscripción.
+        """
+        self._stock_listeners.append(callback)
+
+        def unsubscribe():
+            if callback in self._stock_listeners:
+                self._stock_listeners.remove(callback)
+        return unsubscribe
+
+    def _refresh_low_stock(self, product: Product) -> Optional[StockAlert]:
+        """
+        Reubica el producto en el índice de stock bajo. Devuelve la alerta para
+        los suscriptores si corresponde; se envía con `_notify_stock` después
+        de soltar los candados. Requiere `self._lock`.
+        """
+        was_low = self._low_stock.needs_reorder(product.id)
+        self._low_stock.update(product)
+        is_low = self._low_stock.needs_reorder(product.id)
+        if was_low or is_low:
+            return StockAlert(product.id, product.name, product.stock, product.reorder_threshold, is_low)
+        return None
+
+    def _notify_stock(self, *alerts: Optional[StockAlert]):
+        for alert in alerts:
+            if alert is None:
+                continue
+            for callback in list(self._stock_listeners):
+                try:
+                    callback(alert)
+                except Exception as e:
+                    logger.error(f"Error en un suscriptor de alertas de stock: {e}")
+
+    def get_products_to_reorder(self, limit: Optional[int] = None) -> List[Product]:
+        """Productos con stock menor o igual a su umbral, empezando por los más urgentes."""
+        with self._lock:
+            return [self._products[product_id] for product_id in self._low_stock.lowest(limit)]
+
+    def count_products_to_reorder(self) -> int:
+        with self._lock:
+            return self._low_stock.count_below()
 
     def save_products(self):
         """Guarda los productos en el almacenamiento."""
@@ -34,53 +335,577 @@ class InventoryService:
         except Exception as e:
             logger.error(f"InventoryService: Error al guardar productos: {e}")
 
+    def _persist(self, operation, *args):
+        """Ejecuta una escritura incremental en el almacenamiento, registrando errores."""
+        try:
+            operation(*args)
+        except Exception as e:
+            logger.error(f"InventoryService: Error al persistir cambios: {e}")
+
     def get_all_products(self) -> List[Product]:
         return list(self._products.values())
 
     def get_product(self, product_id: str) -> Optional[Product]:
         return self._products.get(product_id)
 
-    def add_product(self, name: str, cost: float, price: float, stock: int) -> bool:
-        new_product = Product(str(uuid.uuid4()), name, cost, price, stock)
-        if new_product.id in self._products:
-            logger.warning(f"Intento de agregar producto duplicado: {new_product.id}")
-            return False
-        self._products[new_product.id] = new_product
-        self.save_products()
+    def get_product_by_sku(self, sku: str) -> Optional[Product]:
+        """Busca un producto por su SKU o código de barras."""
+        product_id = self._sku_index.get(self.normalize_sku(sku))
+        return self._products.get(product_id) if product_id else None
+
+    def search_products(self, query: str, limit: int = 20) -> List[Product]:
+        """
+        Busca productos por nombre, sin distinguir mayúsculas ni acentos.
+        Devuelve los que tienen palabras que empiezan con cada palabra de la
+        consulta o, si no hay ninguno, las coincidencias aproximadas (errores
+        de tipeo). Una consulta vacía
+        devuelve los primeros `limit` productos del catálogo.
+        """
+        if query.strip():
+            self._build_index()
+        with self._lock:
+            if not query.strip():
+                return list(islice(self._products.values(), limit))
+            return [self._products[product_id] for product_id in self._index().search(query, limit)]
+
+    def _ordered_ids(self, sort_by: str) -> List[str]:
+        """IDs de todo el catálogo en el orden `sort_by`, reutilizado mientras no cambie. Requiere `self._lock`."""
+        version = self._version if sort_by == 'stock' else self._catalog_version
+        cached = self._sorted_ids.get(sort_by)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        key = SORT_KEYS[sort_by]
+        ids = [p.id for p in sorted(self._products.values(), key=lambda p: (key(p), p.id))]
+        self._sorted_ids[sort_by] = (version, ids)
+        return ids
+
+    def _matching_ids(self, query: str, to_reorder: bool) -> Optional[Set[str]]:
+        """IDs que cumplen el filtro, o None si no hay filtro. Requiere `self._lock`."""
+        query = query.strip()
+        if not query and not to_reorder:
+            return None
+        key = (query, to_reorder, self._version)
+        if self._filter_cache is not None and self._filter_cache[0] == key:
+            return self._filter_cache[1]
+        ids = None
+        if query:
+            index = self._index()
+            ids = set(index.search_prefix(query, len(self._products)) or index.search_fuzzy(query, QUERY_FUZZY_LIMIT))
+            owner = self._sku_index.get(self.normalize_sku(query))
+            if owner is not None:
+                ids.add(owner)
+        if to_reorder:
+            low = set(self._low_stock.lowest())
+            ids = low if ids is None else ids & low
+        self._filter_cache = (key, ids)
+        return ids
+
+    def query_products(self, query: str = "", sort_by: str = "name", descending: bool = False,
+                       offset: int = 0, limit: Optional[int] = None, to_reorder: bool = False) -> List[Product]:
+        """
+        Página del catálogo filtrada y ordenada, para mostrar solo las filas
+        visibles. `query` filtra por nombre (como `search_products`, pero sin
+        límite) o por SKU exacto; `to_reorder` deja solo los productos por
+        reabastecer. `sort_by` es una clave de `SORT_KEYS`. El orden completo
+        se calcula una vez por versión del catálogo, así que pedir otra página
+        solo recorre hasta `offset + limit`.
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Criterio de orden no soportado: {sort_by}")
+        if query.strip():
+            self._build_index()
+        with self._lock:
+            ordered = self._ordered_ids(sort_by)
+            ids = reversed(ordered) if descending else iter(ordered)
+            matches = self._matching_ids(query, to_reorder)
+            if matches is not None:
+                ids = (product_id for product_id in ids if product_id in matches)
+            end = offset + limit if limit is not None else None
+            return [self._products[product_id] for product_id in islice(ids, offset, end)]
+
+    def count_products(self, query: str = "", to_reorder: bool = False) -> int:
+        """Cantidad de productos que devolvería `query_products` con el mismo filtro."""
+        if query.strip():
+            self._build_index()
+        with self._lock:
+            matches = self._matching_ids(query, to_reorder)
+            return len(self._products) if matches is None else len(matches)
+
+    def add_product(self, name: str, cost: float, price: float, stock: int, sku: Optional[str] = None,
+                    reorder_threshold: int = 0) -> bool:
+        new_product = Product(str(uuid.uuid4()), name, cost, price, stock, self.normalize_sku(sku), reorder_threshold)
+        with self._locked([new_product.id]), self._ledger.writing():
+            with self._lock:
+                if new_product.id in self._products:
+                    logger.warning(f"Intento de agregar producto duplicado: {new_product.id}")
+                    return False
+                if not self._sku_available(new_product.sku):
+                    return False
+                self._products[new_product.id] = new_product
+                if new_product.sku:
+                    self._sku_index[new_product.sku] = new_product.id
+                self._reindex(new_product)
+                self._touch()
+                alert = self._refresh_low_stock(new_product)
+                movements = self._ledger.record([(new_product.id, new_product.stock, new_product.stock)], 'initial')
+                data = new_product.to_dict()
+            with self._storage.batch():
+                self._persist(self._storage.upsert_product, data)
+                self._persist(self._ledger.persist, movements)
+        self._notify_stock(alert)
         logger.info(f"Producto agregado: {name}")
         return True
 
     def update_product(self, product_id: str, **kwargs) -> bool:
-        if product_id not in self._products:
-            logger.warning(f"No se pudo actualizar el producto. ID no encontrado: {product_id}")
-            return False
-        product = self._products[product_id]
-        for key, value in kwargs.items():
-            if hasattr(product, key):
-                setattr(product, key, value)
-        self.save_products()
+        with self._locked([product_id]), self._ledger.writing():
+            with self._lock:
+                if product_id not in self._products:
+                    logger.warning(f"No se pudo actualizar el producto. ID no encontrado: {product_id}")
+                    return False
+                product = self._products[product_id]
+                previous_stock = product.stock
+                reserved = self._reserved.get(product_id, 0)
+                if 'stock' in kwargs and kwargs['stock'] < reserved:
+                    logger.warning(f"No se pudo actualizar {product.name}: el stock {kwargs['stock']} es menor "
+                                   f"que las {reserved} unidades reservadas en carritos.")
+                    return False
+                if 'sku' in kwargs:
+                    kwargs['sku'] = self.normalize_sku(kwargs['sku'])
+                    if not self._sku_available(kwargs['sku'], product_id):
+                        return False
+                    if self._sku_index.get(product.sku) == product_id:
+                        del self._sku_index[product.sku]
+                    if kwargs['sku']:
+                        self._sku_index[kwargs['sku']] = product_id
+                for key, value in kwargs.items():
+                    if hasattr(product, key):
+                        setattr(product, key, value)
+                self._reindex(product)
+                self._touch()
+                alert = self._refresh_low_stock(product)
+                movements = self._ledger.record([(product_id, product.stock - previous_stock, product.stock)], 'adjustment')
+                data = product.to_dict()
+            with self._storage.batch():
+                self._persist(self._storage.upsert_product, data)
+                self._persist(self._ledger.persist, movements)
+        self._notify_stock(alert)
         logger.info(f"Producto actualizado: {product.name}")
         return True
 
     def delete_product(self, product_id: str) -> bool:
-        if product_id not in self._products:
-            logger.warning(f"No se pudo eliminar el producto. ID no encontrado: {product_id}")
-            return False
-        del self._products[product_id]
-        self.save_products()
+        with self._locked([product_id]), self._ledger.writing():
+            with self._lock:
+                if product_id not in self._products:
+                    logger.warning(f"No se pudo eliminar el producto. ID no encontrado: {product_id}")
+                    return False
+                product = self._products.pop(product_id)
+                if self._sku_index.get(product.sku) == product_id:
+                    del self._sku_index[product.sku]
+                self._unindex(product_id)
+                self._touch()
+                alert = None
+                if self._low_stock.needs_reorder(product_id):
+                    alert = StockAlert(product.id, product.name, product.stock, product.reorder_threshold, False)
+                self._low_stock.remove(product_id)
+                self._reserved.pop(product_id, None)
+                for held in self._reservations.values():
+                    held.pop(product_id, None)
+                movements = self._ledger.record([(product_id, -product.stock, 0)], 'removal')
+            with self._storage.batch():
+                self._persist(self._storage.delete_product, product_id)
+                self._persist(self._ledger.persist, movements)
+        self._notify_stock(alert)
         logger.info(f"Producto eliminado: {product_id}")
         return True
 
+    def import_products(self, path: str, on_progress: Optional[ProgressCallback] = None,
+                        chunk_size: int = 1000) -> ImportResult:
+        """
+        Importa productos desde un CSV (ver `services.product_import`). Las filas
+        se leen y validan por bloques sin cargar el archivo completo; cada una
+        actualiza el producto con su SKU o, si no trae SKU (o el SKU es nuevo y
+        el producto aún no tiene uno), el producto con el mismo nombre, y si no
+        hay ninguno crea uno nuevo. Los campos vacíos conservan el valor actual.
+
+        Todos los cambios se aplican y persisten juntos al final, con una sola
+        escritura; si el archivo no puede leerse no se modifica nada. Los
+        errores de cada fila se informan en el resultado sin detener la importación.
+        El stock nunca queda por debajo de lo reservado en carritos: se ajusta
+        a lo reservado y se informa en los errores.
+        """
+        result = ImportResult()
+        with self._lock:
+            sku_owner = dict(self._sku_index)
+            name_owner = {normalize(p.name): p.id for p in self._products.values()}
+            current_skus = {p.id: p.sku for p in self._products.values()}
+        planned: Dict[str, Dict] = {}
+        # Última línea del archivo que modificó cada producto, para informar errores al aplicarlos.
+        lines: Dict[str, int] = {}
+        created = set()
+        try:
+            for chunk in read_product_csv(path, chunk_size, on_progress):
+                for line, data, error in chunk:
+                    result.rows += 1
+                    if error is None:
+                        error = self._plan_import_row(data, line, planned, lines, created, sku_owner,
+                                                      name_owner, current_skus)
+                    if error is not None:
+                        result.errors.append(ImportRowError(line, error))
+        except (OSError, ValueError, UnicodeError) as e:
+            logger.error(f"Error al leer el archivo de importación {path}: {e}")
+            result.errors.append(ImportRowError(0, str(e)))
+            return result
+
+        upserts = []
+        alerts = []
+        stock_changes = []
+        # Los productos nuevos también se bloquean hasta persistirlos.
+        with self._locked(planned), self._ledger.writing():
+            with self._lock:
+                # Otra sesión pudo asignar un SKU del archivo después de planificar la importación.
+                for product_id, (sku, owner) in self._import_sku_conflicts(planned).items():
+                    del planned[product_id]
+                    created.discard(product_id)
+                    result.errors.append(ImportRowError(
+                        lines[product_id], f"el SKU '{sku}' ya está asignado al producto {owner}"
+                    ))
+                for product_id, fields in planned.items():
+                    product = self._products.get(product_id)
+                    if product is None and product_id not in created:
+                        logger.warning(f"Producto eliminado durante la importación: {product_id}")
+                        continue
+                    if product is not None and self._sku_index.get(product.sku) == product_id and \
+                            fields.get('sku', product.sku) != product.sku:
+                        del self._sku_index[product.sku]
+                for product_id, fields in planned.items():
+                    product = self._products.get(product_id)
+                    if product is None:
+                        if product_id not in created:
+                            continue
+                        product = Product(product_id, fields['name'], fields['cost'], fields['price'],
+                                          fields.get('stock', 0), fields.get('sku'), fields.get('reorder_threshold', 0))
+                        self._products[product_id] = product
+                        result.created += 1
+                        stock_changes.append((product_id, product.stock, product.stock))
+                    else:
+                        previous_stock = product.stock
+                        reserved = self._reserved.get(product_id, 0)
+                        if fields.get('stock', reserved) < reserved:
+                            result.errors.append(ImportRowError(
+                                lines[product_id], f"el stock de '{product.name}' se ajustó a las {reserved} "
+                                                   f"unidades reservadas en carritos (el archivo indica {fields['stock']})"
+                            ))
+                            fields['stock'] = reserved
+                        for key, value in fields.items():
+                            setattr(product, key, value)
+                        result.updated += 1
+                        stock_changes.append((product_id, product.stock - previous_stock, product.stock))
+                    if product.sku:
+                        self._sku_index[product.sku] = product_id
+                    alerts.append(self._refresh_low_stock(product))
+                    upserts.append(product.to_dict())
+                # El índice de búsqueda se reconstruye en la próxima consulta.
+                self._drop_index()
+                self._touch()
+                movements = self._ledger.record(stock_changes, 'import', os.path.basename(path))
+            if upserts:
+                with self._storage.batch():
+                    self._persist(self._storage.apply_product_changes, upserts)
+                    self._persist(self._ledger.persist, movements)
+        self._notify_stock(*alerts)
+        logger.info(f"Importación de {path}: {result.rows} filas, {result.created} productos nuevos, "
+                    f"{result.updated} actualizados, {len(result.errors)} errores.")
+        return result
+
+    def _import_sku_conflicts(self, planned: Dict[str, Dict]) -> Dict[str, tuple]:
+        """
+        Productos del plan cuyo SKU ya tiene otro producto que la importación no
+        cambia de SKU, como {ID: (SKU, dueño actual)}. Requiere `self._lock`.
+        """
+        conflicts: Dict[str, tuple] = {}
+        # Un producto descartado ya no libera su SKU anterior: se repite hasta que no haya cambios.
+        found = True
+        while found:
+            found = False
+            for product_id, fields in planned.items():
+                sku = fields.get('sku')
+                owner = self._sku_index.get(sku) if sku else None
+                if owner is None or owner == product_id or product_id in conflicts:
+                    continue
+                moving = owner in planned and owner not in conflicts and planned[owner].get('sku', sku) != sku
+                if not moving:
+                    conflicts[product_id] = (sku, owner)
+                    found = True
+        return conflicts
+
+    def _plan_import_row(self, data: Dict, line: int, planned: Dict[str, Dict], lines: Dict[str, int], created: set,
+                         sku_owner: Dict[str, str], name_owner: Dict[str, str],
+                         current_skus: Dict[str, Optional[str]]) -> Optional[str]:
+        """Agrega una fila válida al plan de importación; devuelve un mensaje si no puede aplicarse."""
+        sku = self.normalize_sku(data.pop('sku', None))
+        name_key = normalize(data['name'])
+        product_id = sku_owner.get(sku) if sku else None
+        if product_id is None:
+            candidate = name_owner.get(name_key)
+            if candidate is not None and not (sku and current_skus.get(candidate)):
+                product_id = candidate
+        if product_id is None:
+            missing = [label for key, label in (('cost', 'costo'), ('price', 'precio')) if key not in data]
+            if missing:
+                verb = 'faltan' if len(missing) > 1 else 'falta'
+                return f"{verb} {' y '.join(missing)} para el producto nuevo '{data['name']}'"
+            product_id = str(uuid.uuid4())
+            created.add(product_id)
+        fields = planned.setdefault(product_id, {})
+        fields.update(data)
+        lines[product_id] = line
+        if sku:
+            previous = current_skus.get(product_id)
+            if previous and sku_owner.get(previous) == product_id:
+                del sku_owner[previous]
+            fields['sku'] = sku
+            sku_owner[sku] = product_id
+            current_skus[product_id] = sku
+        name_owner[name_key] = product_id
+        return None
+
+    def available_stock(self, product_id: str, reservation_id: Optional[str] = None) -> int:
+        """
+        Stock que se puede vender o reservar: el stock menos lo reservado por
+        los carritos, sin contar lo que ya tiene apartado `reservation_id`.
+        """
+        with self._lock:
+            product = self._products.get(product_id)
+            if product is None:
+                return 0
+            own = self._reservations.get(reservation_id, {}).get(product_id, 0) if reservation_id else 0
+            return product.stock - self._reserved.get(product_id, 0) + own
+
+    def get_reserved(self, reservation_id: str) -> Dict[str, int]:
+        """Unidades apartadas por una reserva, por ID de producto."""
+        with self._lock:
+            return dict(self._reservations.get(reservation_id, {}))
+
+    def reserve(self, reservation_id: str, product_id: str, quantity: int) -> bool:
+        """
+        Aparta `quantity` unidades de un producto para `reservation_id` (p. ej.
+        un carrito). Falla si no hay suficiente stock disponible.
+        """
+        if quantity <= 0:
+            logger.warning(f"Cantidad inválida para reservar: {quantity}")
+            return False
+        with self._locked([product_id]), self._lock:
+            product = self._products.get(product_id)
+            if product is None:
+                logger.warning(f"No se pudo reservar. ID de producto no encontrado: {product_id}")
+                return False
+            if self.available_stock(product_id) < quantity:
+                logger.warning(f"Stock insuficiente para reservar {quantity} de {product.name}.")
+                return False
+            self._hold(reservation_id, product_id, quantity)
+        return True
+
+    def _hold(self, reservation_id: str, product_id: str, delta: int):
+        """Suma `delta` (negativo para liberar) a lo apartado por una reserva. Requiere `self._lock`."""
+        held = self._reservations.setdefault(reservation_id, {})
+        quantity = held.get(product_id, 0) + delta
+        if quantity > 0:
+            held[product_id] = quantity
+        else:
+            held.pop(product_id, None)
+        if not held:
+            del self._reservations[reservation_id]
+        reserved = self._reserved.get(product_id, 0) + delta
+        if reserved > 0:
+            self._reserved[product_id] = reserved
+        else:
+            self._reserved.pop(product_id, None)
+
+    def release(self, reservation_id: str, product_id: Optional[str] = None, quantity: Optional[int] = None):
+        """
+        Devuelve al stock disponible lo apartado por una reserva: `quantity`
+        unidades de `product_id`, todo lo de ese producto o, sin producto, la
+        reserva completa.
+        """
+        with self._lock:
+            held = self._reservations.get(reservation_id, {})
+            product_ids = [product_id] if product_id is not None else list(held)
+            for pid in product_ids:
+                current = held.get(pid, 0)
+                amount = current if quantity is None else min(quantity, current)
+                if amount:
+                    self._hold(reservation_id, pid, -amount)
+
+    def commit_reservation(self, reservation_id: str) -> bool:
+        """Descuenta del stock todo lo apartado por una reserva, en una sola transacción."""
+        try:
+            with self.transaction(reservation_id) as tx:
+                for product_id, quantity in self.get_reserved(reservation_id).items():
+                    tx.remove_stock(product_id, quantity)
+        except ValueError as e:
+            logger.warning(f"No se pudo confirmar la reserva {reservation_id}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Error al guardar la reserva confirmada {reservation_id}: {e}")
+            return False
+        return True
+
+    @contextmanager
+    def transaction(self, reservation_id: Optional[str] = None, reason: str = 'adjustment',
+                    reference: Optional[str] = None) -> Iterator[StockTransaction]:
+        """
+        Unidad de trabajo para modificar el stock de varios productos a la vez.
+        Los ajustes se validan a medida que se agregan; al salir del bloque sin
+        errores se bloquean los productos afectados, se revalidan contra el
+        stock actual (otra sesión pudo vender entretanto) y se aplican todos
+        juntos con una sola escritura, dentro de un lote del almacenamiento que
+        se escribe con los productos aún bloqueados. Las escrituras agregadas
+        con `tx.persist` (p. ej. la venta) van en ese mismo lote. Si el bloque o
+        la revalidación lanzan una excepción no se aplica ningún ajuste ni se
+        ejecuta ninguna escritura; si falla el lote, los ajustes y las reservas
+        consumidas se deshacen en memoria y el error se propaga.
+
+        No debe usarse dentro de otro `storage.batch()`: el lote exterior
+        retrasaría la escritura hasta después de soltar los candados.
+
+        Con `reservation_id`, las unidades apartadas por esa reserva cuentan
+        como disponibles y las que se descuentan se retiran de la reserva.
+        `reason` y `reference` se registran en el libro de stock (p. ej.
+        'sale' y el ID de la venta).
+        """
+        tx = StockTransaction(self, reservation_id)
+        yield tx
+        self._apply_stock_deltas(tx.stock_deltas, reservation_id, reason, reference, tx.writes)
+
+    def _apply_stock_deltas(self, stock_deltas: Dict[str, int], reservation_id: Optional[str] = None,
+                            reason: str = 'adjustment', reference: Optional[str] = None,
+                            writes: Iterable[tuple] = ()):
+        stock_deltas = {product_id: delta for product_id, delta in stock_deltas.items() if delta}
+        writes = list(writes)
+        if not stock_deltas and not writes:
+            return
+        alerts = []
+        movements = []
+        # Unidades retiradas de la reserva, para devolverlas si el lote falla.
+        consumed = []
+        with self._locked(stock_deltas), self._ledger.writing():
+            for product_id, delta in stock_deltas.items():
+                product = self._products.get(product_id)
+                if product is None:
+                    raise ValueError(f"ID de producto no encontrado: {product_id}")
+                if self.available_stock(product_id, reservation_id) + delta < 0:
+                    raise ValueError(f"Stock insuficiente para el producto: {product.name}")
+            with self._lock:
+                if stock_deltas:
+                    self._touch(catalog=False)
+                for product_id, delta in stock_deltas.items():
+                    if reservation_id and delta < 0:
+                        held = self._reservations.get(reservation_id, {}).get(product_id, 0)
+                        if held:
+                            consumed.append((product_id, min(held, -delta)))
+                            self._hold(reservation_id, product_id, -consumed[-1][1])
+                    self._products[product_id].stock += delta
+                    alerts.append(self._refresh_low_stock(self._products[product_id]))
+                movements = self._ledger.record(
+                    [(product_id, delta, self._products[product_id].stock) for product_id, delta in stock_deltas.items()],
+                    reason, reference
+                )
+            try:
+                with self._storage.batch():
+                    if stock_deltas:
+                        self._storage.apply_product_changes(None, None, stock_deltas)
+                    for operation, args in writes:
+                        operation(*args)
+                    self._ledger.persist(movements)
+            except Exception as e:
+                logger.error(f"InventoryService: Error al persistir los ajustes de stock; se deshacen: {e}")
+                with self._lock:
+                    self._touch(catalog=False)
+                    for product_id, delta in stock_deltas.items():
+                        self._products[product_id].stock -= delta
+                        self._refresh_low_stock(self._products[product_id])
+                    for product_id, quantity in consumed:
+                        self._hold(reservation_id, product_id, quantity)
+                    self._ledger.discard(movements)
+                raise
+        self._notify_stock(*alerts)
+        if stock_deltas:
+            logger.info(f"Stock actualizado para {len(stock_deltas)} productos.")
+
     def update_stock(self, product_id: str, quantity: int) -> bool:
-        if product_id not in self._products:
-            logger.warning(f"No se pudo actualizar el stock. ID no encontrado: {product_id}")
+        try:
+            with self.transaction() as tx:
+                product = tx.adjust(product_id, -quantity)
+        except ValueError as e:
+            logger.warning(f"No se pudo actualizar el stock: {e}")
             return False
-        product = self._products[product_id]
-        new_stock = product.stock - quantity
-        if new_stock < 0:
-            logger.warning(f"Stock insuficiente para el producto: {product.name}")
+        except Exception as e:
+            logger.error(f"Error al guardar el ajuste de stock: {e}")
             return False
-        product.stock = new_stock
-        self.save_products()
-        logger.info(f"Stock actualizado para {product.name}. Nuevo stock: {new_stock}")
+        logger.info(f"Stock actualizado para {product.name}. Nuevo stock: {product.stock}")
         return True
+
+    def return_stock(self, product_id: str, quantity: int, reference: Optional[str] = None) -> bool:
+        """Reingresa al stock `quantity` unidades devueltas (p. ej. de la venta `reference`)."""
+        if quantity <= 0:
+            logger.warning(f"Cantidad inválida para devolver: {quantity}")
+            return False
+        try:
+            with self.transaction(reason='return', reference=reference) as tx:
+                product = tx.adjust(product_id, quantity)
+        except ValueError as e:
+            logger.warning(f"No se pudo registrar la devolución: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Error al guardar la devolución: {e}")
+            return False
+        logger.info(f"Devolución de {quantity} unidades de {product.name}. Nuevo stock: {product.stock}")
+        return True
+
+    def get_stock_history(self, product_id: str, limit: int = 50) -> List[StockMovement]:
+        """Últimos movimientos de stock de un producto, del más reciente al más antiguo."""
+        try:
+            return self._ledger.history(product_id, limit)
+        except Exception as e:
+            logger.error(f"Error al leer el historial de stock de {product_id}: {e}")
+            return []
+
+    def get_stock_as_of(self, product_id: str, when: TimeBound) -> int:
+        """Stock que tenía un producto en la fecha `when` (ISO 8601 o `datetime`)."""
+        return self._ledger.stock_as_of(product_id, when)
+
+    def get_stock_levels_as_of(self, when: TimeBound) -> Dict[str, int]:
+        """Stock de todos los productos en la fecha `when`, por ID de producto."""
+        return self._ledger.stock_levels_as_of(when)
+
+    # Versiones asíncronas para los manejadores de Flet: la operación (y su
+    # escritura en disco) se ejecuta en el hilo de E/S del almacenamiento.
+
+    async def save_products_async(self):
+        await self._storage.run_async(self.save_products)
+
+    async def add_product_async(self, name: str, cost: float, price: float, stock: int, sku: Optional[str] = None,
+                                reorder_threshold: int = 0) -> bool:
+        return await self._storage.run_async(self.add_product, name, cost, price, stock, sku, reorder_threshold)
+
+    async def update_product_async(self, product_id: str, **kwargs) -> bool:
+        return await self._storage.run_async(self.update_product, product_id, **kwargs)
+
+    async def delete_product_async(self, product_id: str) -> bool:
+        return await self._storage.run_async(self.delete_product, product_id)
+
+    async def update_stock_async(self, product_id: str, quantity: int) -> bool:
+        return await self._storage.run_async(self.update_stock, product_id, quantity)
+
+    async def commit_reservation_async(self, reservation_id: str) -> bool:
+        return await self._storage.run_async(self.commit_reservation, reservation_id)
+
+    async def return_stock_async(self, product_id: str, quantity: int, reference: Optional[str] = None) -> bool:
+        return await self._storage.run_async(self.return_stock, product_id, quantity, reference)
+
+    async def get_stock_history_async(self, product_id: str, limit: int = 50) -> List[StockMovement]:
+        return await self._storage.run_async(self.get_stock_history, product_id, limit)
+
+    async def import_products_async(self, path: str, on_progress: Optional[ProgressCallback] = None,
+                                    chunk_size: int = 1000) -> ImportResult:
+        return await self._storage.run_async(self.import_products, path, on_progress, chunk_size)
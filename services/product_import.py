@@ -0,0 +1,148 @@
+import csv
+import math
+import os
+from dataclasses import dataclass, field
+from typing import List, Dict, BinaryIO, Callable, Iterator, Optional, Tuple
+
+# Encabezados aceptados para cada campo (en minúsculas y sin espacios extremos).
+COLUMNS = {
+    'name': ('nombre', 'name', 'producto', 'descripcion', 'descripción'),
+    'cost': ('costo', 'cost'),
+    'price': ('precio', 'price'),
+    'stock': ('stock', 'existencias', 'cantidad'),
+    'sku': ('sku', 'codigo', 'código', 'codigo de barras', 'código de barras', 'barcode'),
+    'reorder_threshold': ('stock minimo', 'stock mínimo', 'stock_minimo', 'reorder_threshold', 'minimo', 'mínimo'),
+}
+
+LABELS = {'cost': 'costo', 'price': 'precio', 'stock': 'stock', 'reorder_threshold': 'stock mínimo'}
+
+ProgressCallback = Callable[[int, float], None]
+
+@dataclass
+class ImportRowError:
+    line: int
+    message: str
+
+@dataclass
+class ImportResult:
+    """Resumen de una importación: filas leídas, productos creados/actualizados y errores por fila."""
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    errors: List[ImportRowError] = field(default_factory=list)
+
+def _parse_number(value: str, decimal_comma: bool) -> float:
+    value = value.strip().replace(' ', '')
+    if decimal_comma and ',' in value:
+        # "1.234,50": el punto separa miles y la coma es el decimal.
+        value = value.replace('.', '').replace(',', '.')
+    else:
+        value = value.replace(',', '')
+    number = float(value)
+    # float() acepta "nan" e "inf", que no son precios ni cantidades.
+    if not math.isfinite(number):
+        raise ValueError(f"'{value}' no es un número finito")
+    return number
+
+def _parse_int(value: str, decimal_comma: bool) -> int:
+    number = _parse_number(value, decimal_comma)
+    if not number.is_integer():
+        raise ValueError(f"'{value}' no es un número entero")
+    return int(number)
+
+def _map_header(header: List[str]) -> Dict[str, int]:
+    """Posición de cada campo conocido en el encabezado; lanza ValueError si falta el nombre."""
+    positions = {}
+    for index, title in enumerate(header):
+        title = title.strip().lower()
+        for column, aliases in COLUMNS.items():
+            if title in aliases and column not in positions:
+                positions[column] = index
+    if 'name' not in positions:
+        raise ValueError("El archivo no tiene una columna de nombre de producto.")
+    return positions
+
+def parse_row(row: List[str], positions: Dict[str, int], decimal_comma: bool) -> Dict:
+    """
+    Valida una fila y devuelve solo los campos presentes y no vacíos, ya
+    convertidos. Lanza ValueError con un mensaje para el usuario si la fila
+    no es válida.
+    """
+    values = {column: row[index].strip() for column, index in positions.items()
+              if index < len(row) and row[index].strip()}
+    if not values.get('name'):
+        raise ValueError("falta el nombre del producto")
+    data = {'name': values['name']}
+    if 'sku' in values:
+        data['sku'] = values['sku']
+    for column in ('cost', 'price'):
+        if column in values:
+            try:
+                data[column] = _parse_number(values[column], decimal_comma)
+            except ValueError:
+                raise ValueError(f"{LABELS[column]} inválido: '{values[column]}'")
+            if data[column] < 0:
+                raise ValueError(f"{LABELS[column]} no puede ser negativo")
+    for column in ('stock', 'reorder_threshold'):
+        if column in values:
+            try:
+                data[column] = _parse_int(values[column], decimal_comma)
+            except ValueError:
+                raise ValueError(f"{LABELS[column]} inválido: '{values[column]}'")
+            if data[column] < 0:
+                raise ValueError(f"{LABELS[column]} no puede ser negativo")
+    return data
+
+def _decoded_lines(f: BinaryIO, counter: List[int]) -> Iterator[str]:
+    """Líneas del archivo decodificadas como UTF-8, acumulando en `counter[0]` los bytes leídos."""
+    encoding = 'utf-8-sig'  # descarta el BOM que agrega Excel al inicio del archivo
+    for raw in f:
+        counter[0] += len(raw)
+        yield raw.decode(encoding, errors='replace')
+        encoding = 'utf-8'
+
+def read_product_csv(path: str, chunk_size: int = 1000,
+                     on_progress: Optional[ProgressCallback] = None
+                     ) -> Iterator[List[Tuple[int, Optional[Dict], Optional[str]]]]:
+    """
+    Lee un CSV de productos en bloques de `chunk_size` filas sin cargar el
+    archivo completo. Cada fila del bloque es (línea, datos, None) si es
+    válida o (línea, None, error) si no. Detecta el separador (`,`, `;` o
+    tabulador); con `;` se aceptan decimales con coma. Tras cada bloque llama
+    a `on_progress(filas_leídas, fracción_del_archivo)`.
+    """
+    total_bytes = os.path.getsize(path) or 1
+    read_bytes = [0]
+    with open(path, 'rb') as f:
+        lines = _decoded_lines(f, read_bytes)
+        header_line = next(lines, '')
+        try:
+            dialect = csv.Sniffer().sniff(header_line, delimiters=',;\t')
+            delimiter = dialect.delimiter
+        except csv.Error:
+            delimiter = ','
+        header = next(csv.reader([header_line], delimiter=delimiter), [])
+        positions = _map_header(header)
+        decimal_comma = delimiter == ';'
+        reader = csv.reader(lines, delimiter=delimiter)
+        chunk = []
+        rows = 0
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            rows += 1
+            # La línea física donde termina la fila (el encabezado es la línea 1).
+            line = reader.line_num + 1
+            try:
+                chunk.append((line, parse_row(row, positions, decimal_comma), None))
+            except ValueError as e:
+                chunk.append((line, None, str(e)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+                if on_progress:
+                    on_progress(rows, min(read_bytes[0] / total_bytes, 1.0))
+        if chunk:
+            yield chunk
+        if on_progress:
+            on_progress(rows, 1.0)
@@ -0,0 +1,265 @@
+import math
+import unicodedata
+from collections import Counter, deque
+from typing import List, Dict, Iterator, Set
+
+# Fracción mínima de los trigramas de una palabra de la consulta que debe
+# compartir una palabra del vocabulario para calcular su distancia de edición.
+MIN_TRIGRAM_OVERLAP = 0.4
+
+# Claves especiales de los nodos del trie; nunca chocan con un carácter.
+IDS = ''
+COUNT = None
+
+def normalize(text: str) -> str:
+    """Pasa a minúsculas, elimina acentos y colapsa los espacios."""
+    if text.isascii():
+        return ' '.join(text.lower().split())
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+def trigrams(text: str) -> Set[str]:
+    """Trigramas de cada palabra de un texto normalizado, con relleno para que cuenten los bordes."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def max_edits(word: str) -> int:
+    """
+    Ediciones toleradas en una palabra: ninguna hasta 2 letras, 1 hasta 5 y
+    luego 2. Las palabras con dígitos (tamaños, modelos) deben coincidir
+    exactamente: cambiar un dígito nombra otro producto.
+    """
+    if len(word) <= 2 or any(c.isdigit() for c in word):
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Distancia de edición entre `a` y `b` contando el intercambio de dos letras
+    vecinas como una sola edición. Solo calcula la franja de `limit` celdas
+    alrededor de la diagonal y devuelve `limit + 1` en cuanto la supera.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous2: List[int] = []
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        current = [over] * (len(b) + 1)
+        current[0] = row_min = i if i <= limit else over
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cb = b[j - 1]
+            cost = previous[j - 1] if ca == cb else previous[j - 1] + 1
+            if previous[j] < cost:
+                cost = previous[j] + 1
+            if current[j - 1] < cost:
+                cost = current[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and previous2[j - 2] < cost:
+                cost = previous2[j - 2] + 1
+            current[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        previous2, previous = previous, current
+    return min(previous[-1], over)
+
+class ProductSearchIndex:
+    """
+    Índice en memoria para buscar productos por nombre.
+    Cada palabra del nombre normalizado se guarda en un trie para búsquedas
+    por prefijo; cada nodo sabe cuántas entradas tiene debajo, lo que permite
+    resolver las consultas de varias palabras empezando por la más selectiva.
+    Las búsquedas aproximadas (errores de tipeo) corrigen cada palabra de la
+    consulta contra el vocabulario del catálogo: un índice invertido de
+    trigramas sobre las palabras distintas elige candidatos y la distancia de
+    edición decide cuáles se aceptan.
+    """
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self._words)
+
+    def clear(self):
+        self._trie: Dict = {COUNT: 0}
+        # Trigrama -> palabras distintas del catálogo que lo contienen.
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._words: Dict[str, List[str]] = {}
+        # Nombre normalizado entre espacios, para buscar inicios de palabra y palabras completas.
+        self._names: Dict[str, str] = {}
+
+    def add(self, product_id: str, name: str):
+        """Indexa (o reindexa) un producto."""
+        normalized = normalize(name)
+        words = normalized.split()
+        if self._words.get(product_id) == words:
+            return
+        self.remove(product_id)
+        self._words[product_id] = words
+        self._names[product_id] = f" {normalized} "
+        for word in set(words):
+            node = self._trie
+            node[COUNT] += 1
+            for char in word:
+                node = node.get(char) or node.setdefault(char, {COUNT: 0})
+                node[COUNT] += 1
+            ids = node.setdefault(IDS, set())
+            if not ids:
+                for gram in trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            ids.add(product_id)
+
+    def remove(self, product_id: str):
+        """Quita un producto del índice, podando las ramas del trie que queden vacías."""
+        words = self._words.pop(product_id, None)
+        if words is None:
+            return
+        del self._names[product_id]
+        for word in set(words):
+            node = self._trie
+            node[COUNT] -= 1
+            for char in word:
+                parent, node = node, node[char]
+                node[COUNT] -= 1
+                if not node[COUNT]:
+                    del parent[char]
+                    break
+            else:
+                node[IDS].discard(product_id)
+                if node[IDS]:
+                    continue
+                del node[IDS]
+            # Ningún otro producto usa la palabra: sale del vocabulario.
+            for gram in trigrams(word):
+                words_with_gram = self._trigrams[gram]
+                words_with_gram.discard(word)
+                if not words_with_gram:
+                    del self._trigrams[gram]
+
+    def _find(self, prefix: str) -> Dict:
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return {COUNT: 0}
+        return node
+
+    @staticmethod
+    def _iter_node(node: Dict) -> Iterator[str]:
+        """IDs bajo un nodo, primero los de las palabras más cortas."""
+        queue = deque([node])
+        while queue:
+            node = queue.popleft()
+            for key, child in node.items():
+                if key == IDS:
+                    yield from child
+                elif key is not COUNT:
+                    queue.append(child)
+
+    def search_prefix(self, query: str, limit: int) -> List[str]:
+        """IDs con una palabra que empieza con cada palabra de la consulta."""
+        words = list(set(normalize(query).split()))
+        if not words:
+            return []
+        # Se recorre el subárbol de la palabra más selectiva y se filtra con el
+        # resto: " q" in nombre equivale a que alguna palabra empiece con q.
+        nodes = sorted(((self._find(word), word) for word in words), key=lambda pair: pair[0][COUNT])
+        needles = [f" {word}" for _, word in nodes[1:]]
+        names = self._names
+        results: List[str] = []
+        seen: Set[str] = set()
+        for product_id in self._iter_node(nodes[0][0]):
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            name = names[product_id]
+            if all(needle in name for needle in needles):
+                results.append(product_id)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def _corrections(self, word: str) -> Dict[str, int]:
+        """
+        Palabras del vocabulario a distancia de edición aceptable de `word`,
+        con su distancia. Cada edición cambia a lo sumo tres trigramas, así que
+        una palabra a distancia `k` comparte al menos `len(grams) - 3k` con la
+        consulta; solo se calcula la distancia a las que alcanzan el mínimo.
+        """
+        max_distance = max_edits(word)
+        if not max_distance:
+            return {word: 0} if self._find(word).get(IDS) else {}
+        grams = trigrams(word)
+        # Con dos ediciones ese mínimo deja pasar casi cualquier palabra de
+        # sílabas parecidas; como en pg_trgm se exige además una fracción de
+        # los trigramas, a costa de alguna corrección poco parecida.
+        needed = max(len(grams) - 3 * max_distance, math.ceil(MIN_TRIGRAM_OVERLAP * len(grams)), 1)
+        # Una candidata aparece en al menos una de las listas más cortas que
+        # quedan tras descartar las `needed - 1` más largas; solo esas se recorren.
+        postings = sorted((self._trigrams.get(gram, ()) for gram in grams), key=len)
+        seeds = len(postings) - needed + 1
+        hits = Counter()
+        for ids in postings[:seeds]:
+            hits.update(ids)
+        corrections = {}
+        for candidate, count in hits.items():
+            if abs(len(candidate) - len(word)) > max_distance:
+                continue
+            count += sum(1 for ids in postings[seeds:] if candidate in ids)
+            if count < needed:
+                continue
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                corrections[candidate] = distance
+        return corrections
+
+    def search_fuzzy(self, query: str, limit: int) -> List[str]:
+        """
+        IDs cuyo nombre tiene, para cada palabra de la consulta, una palabra a
+        pocas ediciones de ella (letras faltantes, sobrantes, cambiadas o
+        intercambiadas), primero los de menor distancia total y nombre más corto.
+        """
+        words = list(dict.fromkeys(normalize(query).split()))
+        if not words:
+            return []
+        corrections = [self._corrections(word) for word in words]
+        if not all(corrections):
+            return []
+        # Como en `search_prefix`: se recorren los productos de la palabra más
+        # selectiva y se filtra con el resto buscando la palabra completa en el nombre.
+        sizes = [sum(len(self._find(w).get(IDS, ())) for w in found) for found in corrections]
+        pivot = sizes.index(min(sizes))
+        others = [[(f" {w} ", d) for w, d in sorted(found.items(), key=lambda pair: pair[1])]
+                  for i, found in enumerate(corrections) if i != pivot]
+        names = self._names
+        scored = []
+        seen: Set[str] = set()
+        for word, distance in sorted(corrections[pivot].items(), key=lambda pair: pair[1]):
+            for product_id in self._find(word).get(IDS, ()):
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                name = names[product_id]
+                total = distance
+                for needles in others:
+                    best = next((d for needle, d in needles if needle in name), None)
+                    if best is None:
+                        break
+                    total += best
+                else:
+                    scored.append((total, len(name), product_id))
+                    if len(scored) >= limit:
+                        break
+            if len(scored) >= limit:
+                break
+        scored.sort()
+        return [product_id for _, _, product_id in scored[:limit]]
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """Coincidencias por prefijo o, si no hay ninguna, coincidencias aproximadas."""
+        return self.search_prefix(query, limit) or self.search_fuzzy(query, limit)
@@ -0,0 +1,93 @@
+from typing import List, Dict, Optional
+from models.sale import Sale
+
+AGGREGATES_VERSION = 1
+METRICS = ("sales", "units", "revenue", "cost", "profit")
+
+def _empty_metrics() -> Dict[str, float]:
+    return dict.fromkeys(METRICS, 0)
+
+class SalesAggregates:
+    """
+    Totales de ventas acumulados de forma incremental: globales, por día
+    (AAAA-MM-DD) y por producto. Cada métrica guarda el número de ventas,
+    las unidades, los ingresos, el costo y la ganancia.
+
+    Junto con los totales se guarda cuántas ventas abarcan y el ID de la
+    última, para poder validar los agregados persistidos contra el historial.
+    """
+    def __init__(self):
+        self.totals: Dict[str, float] = _empty_metrics()
+        self.by_day: Dict[str, Dict[str, float]] = {}
+        self.by_product: Dict[str, Dict] = {}
+        self.sales_count = 0
+        self.last_sale_id: Optional[str] = None
+
+    def add_sale(self, sale: Sale):
+        """Suma una venta a todos los acumulados."""
+        day = self.by_day.get(sale.timestamp[:10])
+        if day is None:
+            day = self.by_day[sale.timestamp[:10]] = _empty_metrics()
+        units = 0
+        for product_id, name, quantity, _, cost, subtotal in sale.iter_lines():
+            product = self.by_product.get(product_id)
+            if product is None:
+                product = self.by_product[product_id] = dict(_empty_metrics(), name=name)
+            product['name'] = name
+            product['sales'] += 1
+            product['units'] += quantity
+            product['revenue'] += subtotal
+            product['cost'] += cost * quantity
+            product['profit'] += subtotal - cost * quantity
+            units += quantity
+        for metrics in (self.totals, day):
+            metrics['sales'] += 1
+            metrics['units'] += units
+            metrics['revenue'] += sale.total_revenue
+            metrics['cost'] += sale.total_cost
+            metrics['profit'] += sale.total_profit
+        self.sales_count += 1
+        self.last_sale_id = sale.id
+
+    def days_between(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """Totales por día con `start <= día < end` (fechas AAAA-MM-DD), en orden cronológico."""
+        return {
+            day: dict(metrics) for day, metrics in sorted(self.by_day.items())
+            if (start is None or day >= start) and (end is None or day < end)
+        }
+
+    def top_products(self, limit: int = 10, metric: str = "revenue") -> List[Dict]:
+        """Los `limit` productos con mayor valor en `metric`."""
+        ranked = sorted(self.by_product.items(), key=lambda pair: pair[1][metric], reverse=True)
+        return [dict(metrics, product_id=product_id) for product_id, metrics in ranked[:limit]]
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': AGGREGATES_VERSION,
+            'sales_count': self.sales_count,
+            'last_sale_id': self.last_sale_id,
+            'totals': self.totals,
+            'by_day': self.by_day,
+            'by_product': self.by_product,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SalesAggregates":
+        """Reconstruye los agregados persistidos; lanza ValueError si el formato no es válido."""
+        try:
+            if data['version'] != AGGREGATES_VERSION:
+                raise ValueError(f"versión {data['version']} no soportada")
+            aggregates = cls()
+            aggregates.sales_count = int(data['sales_count'])
+            aggregates.last_sale_id = data['last_sale_id']
+            aggregates.totals = {m: data['totals'][m] for m in METRICS}
+            aggregates.by_day = {
+                day: {m: metrics[m] for m in METRICS} for day, metrics in data['by_day'].items()
+            }
+            aggregates.by_product = {
+                product_id: dict({m: metrics[m] for m in METRICS}, name=metrics['name'])
+                for product_id, metrics in data['by_product'].items()
+            }
+            return aggregates
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Agregados de ventas inválidos: {e}")
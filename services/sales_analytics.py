@@ -0,0 +1,185 @@
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import List, Dict, Iterable, Optional, Union
+import numpy as np
+from models.sale import Sale
+
+EPOCH = datetime(1970, 1, 1)
+METRICS = ("units", "revenue", "cost", "profit")
+TimeBound = Union[str, datetime, None]
+
+def to_epoch(value: Union[str, datetime]) -> int:
+    """Segundos desde 1970 de un timestamp ISO 8601 sin zona horaria (hora local de la tienda)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int((value.replace(tzinfo=None) - EPOCH).total_seconds())
+
+def from_epoch(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=int(seconds))
+
+class SalesAnalytics:
+    """
+    Historial de ventas en formato columnar: una fila por línea de venta con
+    el timestamp (int64, segundos), el índice del producto, la cantidad, el
+    precio y el costo unitario. Las agrupaciones, rankings y series de tiempo
+    se calculan con operaciones vectorizadas de NumPy en lugar de recorrer
+    objetos `SaleItem`.
+
+    Las ventas nuevas se acumulan en búferes y se incorporan a los arreglos
+    en la siguiente consulta. Las ventas llegan desde el hilo de E/S y las
+    consultas desde la interfaz, así que ambas pasan por `self._lock`.
+    """
+    def __init__(self, sales: Iterable[Sale] = ()):
+        self.product_ids: List[str] = []
+        self.product_names: List[str] = []
+        self._product_index: Dict[str, int] = {}
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.products = np.empty(0, dtype=np.int32)
+        self.quantities = np.empty(0, dtype=np.int64)
+        self.prices = np.empty(0, dtype=np.float64)
+        self.costs = np.empty(0, dtype=np.float64)
+        # Ingresos y costo de cada línea, precalculados para no repetirlos en cada consulta.
+        self.line_revenue = np.empty(0, dtype=np.float64)
+        self.line_cost = np.empty(0, dtype=np.float64)
+        self._lock = threading.Lock()
+        self._reset_buffers()
+        for sale in sales:
+            self.add_sale(sale)
+
+    def _reset_buffers(self):
+        self._buf_timestamps = array('q')
+        self._buf_products = array('i')
+        self._buf_quantities = array('q')
+        self._buf_prices = array('d')
+        self._buf_costs = array('d')
+
+    def __len__(self):
+        return len(self.timestamps) + len(self._buf_timestamps)
+
+    def add_sale(self, sale: Sale):
+        """Agrega las líneas de una venta."""
+        timestamp = to_epoch(sale.timestamp)
+        with self._lock:
+            for product_id, name, quantity, price, cost, _ in sale.iter_lines():
+                index = self._product_index.get(product_id)
+                if index is None:
+                    index = self._product_index[product_id] = len(self.product_ids)
+                    self.product_ids.append(product_id)
+                    self.product_names.append(name)
+                else:
+                    self.product_names[index] = name
+                self._buf_timestamps.append(timestamp)
+                self._buf_products.append(index)
+                self._buf_quantities.append(quantity)
+                self._buf_prices.append(price)
+                self._buf_costs.append(cost)
+
+    def _consolidate(self):
+        """Incorpora los búferes a los arreglos. Requiere `self._lock`."""
+        if not self._buf_timestamps:
+            return
+        self.timestamps = np.concatenate((self.timestamps, np.frombuffer(self._buf_timestamps, dtype=np.int64)))
+        self.products = np.concatenate((self.products, np.frombuffer(self._buf_products, dtype=np.int32)))
+        self.quantities = np.concatenate((self.quantities, np.frombuffer(self._buf_quantities, dtype=np.int64)))
+        self.prices = np.concatenate((self.prices, np.frombuffer(self._buf_prices, dtype=np.float64)))
+        self.costs = np.concatenate((self.costs, np.frombuffer(self._buf_costs, dtype=np.float64)))
+        added = len(self._buf_timestamps)
+        quantities = self.quantities[-added:]
+        self.line_revenue = np.concatenate((self.line_revenue, quantities * self.prices[-added:]))
+        self.line_cost = np.concatenate((self.line_cost, quantities * self.costs[-added:]))
+        self._reset_buffers()
+
+    @staticmethod
+    def _mask(timestamps: np.ndarray, start: TimeBound, end: TimeBound) -> Optional[np.ndarray]:
+        """Máscara de las líneas con `start <= timestamp < end`, o None si no hay filtro."""
+        if start is None and end is None:
+            return None
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= to_epoch(start)
+        if end is not None:
+            mask &= timestamps < to_epoch(end)
+        return mask
+
+    def _columns(self, start: TimeBound, end: TimeBound) -> Dict[str, np.ndarray]:
+        """Columnas filtradas por fecha más las derivadas (ingresos y costo por línea)."""
+        # Los arreglos se reemplazan (no se modifican) al consolidar, así que
+        # basta con tomarlos juntos bajo el candado.
+        with self._lock:
+            self._consolidate()
+            columns = {
+                'timestamps': self.timestamps, 'products': self.products, 'units': self.quantities,
+                'revenue': self.line_revenue, 'cost': self.line_cost,
+            }
+        mask = self._mask(columns['timestamps'], start, end)
+        if mask is not None:
+            columns = {name: values[mask] for name, values in columns.items()}
+        return columns
+
+    @staticmethod
+    def _group(keys: np.ndarray, columns: Dict[str, np.ndarray], size: int) -> Dict[str, np.ndarray]:
+        """Suma las métricas por clave entera en [0, size)."""
+        groups = {metric: np.bincount(keys, weights=columns[metric], minlength=size)
+                  for metric in ("units", "revenue", "cost")}
+        groups['profit'] = groups['revenue'] - groups['cost']
+        return groups
+
+    def by_product(self, start: TimeBound = None, end: TimeBound = None) -> Dict[str, np.ndarray]:
+        """
+        Métricas por producto, indexadas como `product_ids`: unidades, ingresos,
+        costo, ganancia y margen (ganancia / ingresos).
+        """
+        columns = self._columns(start, end)
+        groups = self._group(columns['products'], columns, len(self.product_ids))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            groups['margin'] = np.where(groups['revenue'] > 0, groups['profit'] / groups['revenue'], 0.0)
+        return groups
+
+    def top_products(self, k: int = 10, metric: str = "revenue",
+                     start: TimeBound = None, end: TimeBound = None) -> List[Dict]:
+        """Los `k` productos con mayor `metric` (units, revenue, cost, profit o margin)."""
+        groups = self.by_product(start, end)
+        values = groups[metric]
+        sold = np.flatnonzero(groups['units'])
+        if not len(sold):
+            return []
+        k = min(k, len(sold))
+        candidates = sold[np.argpartition(-values[sold], k - 1)[:k]]
+        ranked = candidates[np.argsort(-values[candidates], kind='stable')]
+        return [
+            dict({m: float(groups[m][i]) for m in groups}, product_id=self.product_ids[i], name=self.product_names[i])
+            for i in ranked
+        ]
+
+    def time_buckets(self, bucket_seconds: int = 3600, start: TimeBound = None,
+                     end: TimeBound = None) -> List[Dict]:
+        """
+        Serie de tiempo con las métricas agrupadas en intervalos de `bucket_seconds`
+        (3600 = por hora, 86400 = por día). Solo incluye intervalos con ventas.
+        """
+        columns = self._columns(start, end)
+        if not len(columns['timestamps']):
+            return []
+        keys = columns['timestamps'] // bucket_seconds
+        first = int(keys.min())
+        span = int(keys.max()) - first + 1
+        if span <= 4 * len(keys):
+            # Rango denso: cada intervalo es una posición de bincount, sin ordenar.
+            groups = self._group(keys - first, columns, span)
+            buckets = np.flatnonzero(groups['units'])
+            groups = {m: values[buckets] for m, values in groups.items()}
+            buckets += first
+        else:
+            buckets, inverse = np.unique(keys, return_inverse=True)
+            groups = self._group(inverse, columns, len(buckets))
+        return [
+            dict({m: float(groups[m][i]) for m in METRICS}, start=from_epoch(bucket * bucket_seconds).isoformat())
+            for i, bucket in enumerate(buckets)
+        ]
+
+    def by_hour_of_day(self, start: TimeBound = None, end: TimeBound = None) -> Dict[str, np.ndarray]:
+        """Métricas por hora del día (arreglos de 24 posiciones), para curvas de ventas por hora."""
+        columns = self._columns(start, end)
+        hours = (columns['timestamps'] // 3600) % 24
+        return self._group(hours, columns, 24)
@@ -0,0 +1,56 @@
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator, List
+from models.sale import Sale
+
+FORMATS = ("csv", "jsonl")
+# Nivel de detalle: una fila por venta o una por línea de venta.
+LEVELS = ("sales", "lines")
+
+SALE_COLUMNS = ["id", "timestamp", "total_revenue", "total_cost", "total_profit", "items"]
+LINE_COLUMNS = ["sale_id", "timestamp", "product_id", "name", "quantity", "price", "cost", "subtotal"]
+
+def _sale_rows(sale: Sale) -> List[Dict]:
+    return [{
+        'id': sale.id,
+        'timestamp': sale.timestamp,
+        'total_revenue': sale.total_revenue,
+        'total_cost': sale.total_cost,
+        'total_profit': sale.total_profit,
+        'items': len(sale),
+    }]
+
+def _line_rows(sale: Sale) -> List[Dict]:
+    return [
+        {'sale_id': sale.id, 'timestamp': sale.timestamp, 'product_id': product_id, 'name': name,
+         'quantity': quantity, 'price': price, 'cost': cost, 'subtotal': subtotal}
+        for product_id, name, quantity, price, cost, subtotal in sale.iter_lines()
+    ]
+
+def export_chunks(sales: Iterable[Sale], fmt: str = "csv", level: str = "sales") -> Iterator[str]:
+    """
+    Convierte las ventas a texto CSV (con encabezado) o JSONL, un fragmento
+    por venta. Solo retiene la venta en curso, así que la memoria no depende
+    del tamaño del historial. Lanza ValueError si el formato o el nivel no existen.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de exportación no soportado: {fmt}")
+    if level not in LEVELS:
+        raise ValueError(f"Nivel de exportación no soportado: {level}")
+    columns, rows = (SALE_COLUMNS, _sale_rows) if level == "sales" else (LINE_COLUMNS, _line_rows)
+    if fmt == "jsonl":
+        for sale in sales:
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows(sale))
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator='\n')
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for sale in sales:
+        writer.writerows(rows(sale))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -1,46 +1,382 @@
+import asyncio
+import functools
+import os
 import uuid
-from typing import List, Dict, Optional
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Callable, List, Dict, Iterator, Optional
 from datetime import datetime
-from models.sale import Sale, SaleItem
+from models.sale import Sale, SaleItem, sale_quantity
 from services.inventory_service import InventoryService
+from services.sales_aggregates import METRICS, SalesAggregates
+from services.sales_analytics import SalesAnalytics
+from services.sales_export import export_chunks
 from storage.base_storage import BaseStorage
+from utils.gc_utils import paused_gc
 from utils.logger import get_logger
 
 logger = get_logger()
 
+# Cada cuántas ventas exportadas se informa el avance.
+EXPORT_PROGRESS_EVERY = 1000
+
 class SalesService:
-    def __init__(self, storage: BaseStorage, inventory_service: InventoryService):
+    def __init__(self, storage: BaseStorage, inventory_service: InventoryService,
+                 lazy: bool = False, cache_size: int = 256, aggregates_save_every: int = 50):
+        """
+        Con `lazy=True` solo se mantiene en memoria un índice id -> timestamp;
+        el cuerpo de cada venta se lee del almacenamiento al accederla y se
+        conserva en una caché LRU de `cache_size` ventas.
+
+        Los agregados de ventas se actualizan con cada venta y se persisten
+        cada `aggregates_save_every` ventas y al llamar a `flush()`.
+
+        El servicio puede compartirse entre sesiones: el stock se valida con los
+        candados de `InventoryService` y el registro en memoria de cada venta
+        nueva se serializa con un candado propio.
+        """
         self._storage = storage
+        self._lock = threading.RLock()
         self._inventory = inventory_service
+        self._lazy = lazy
+        self._cache_size = cache_size
         self._sales: Dict[str, Sale] = {}
+        self._sale_index: Dict[str, str] = {}
+        # Índice temporal: timestamps ordenados y el ID de venta en la misma posición.
+        self._timeline: List[str] = []
+        self._timeline_ids: List[str] = []
+        self._aggregates = SalesAggregates()
+        self._aggregates_save_every = aggregates_save_every
+        self._unsaved_aggregates = 0
+        # Vista columnar del historial; se construye en la primera consulta analítica.
+        self._analytics: Optional[SalesAnalytics] = None
+        # Cambia con cada venta registrada o recarga del historial.
+        self._version = 0
         self.load_sales()
 
     def load_sales(self):
         """Carga las ventas desde el almacenamiento."""
+        self._analytics = None
         try:
-            sales_data = self._storage.load_sales()
-            self._sales = {s['id']: Sale(id=s['id'], timestamp=s['timestamp'], total_revenue=s['total_revenue'], total_cost=s['total_cost'], total_profit=s['total_profit'], items=[SaleItem(**item) for item in s['items']]) for s in sales_data}
-            logger.info(f"Se cargaron {len(self._sales)} ventas.")
+            if self._lazy:
+                self._sale_index = dict(self._storage.iter_sale_index())
+                self._sales = OrderedDict()
+                logger.info(f"Se indexaron {len(self._sale_index)} ventas (carga diferida).")
+            else:
+                with paused_gc():
+                    self._sales = {s['id']: self._sale_from_dict(s) for s in self._storage.iter_sales()}
+                logger.info(f"Se cargaron {len(self._sales)} ventas.")
         except Exception as e:
             logger.error(f"Error al cargar ventas: {e}")
             self._sales = {}
+            self._sale_index = {}
+        self._rebuild_timeline()
+        self._load_aggregates()
+        self._version += 1
+
+    @property
+    def version(self) -> int:
+        """Número que cambia cada vez que cambia el historial de ventas."""
+        return self._version
+
+    def _rebuild_timeline(self):
+        if self._lazy:
+            pairs = list(self._sale_index.items())
+        else:
+            pairs = [(sale.id, sale.timestamp) for sale in self._sales.values()]
+        # El ordenamiento es estable: a igual timestamp se conserva el orden de registro.
+        pairs.sort(key=lambda pair: pair[1])
+        self._timeline = [timestamp for _, timestamp in pairs]
+        self._timeline_ids = [sale_id for sale_id, _ in pairs]
+
+    def _add_to_timeline(self, sale: Sale):
+        """Agrega una venta al índice temporal. Requiere `self._lock`."""
+        if not self._timeline or sale.timestamp >= self._timeline[-1]:
+            self._timeline.append(sale.timestamp)
+            self._timeline_ids.append(sale.id)
+        else:
+            # Venta con fecha anterior a la última (p. ej. si se atrasó el reloj).
+            position = bisect_right(self._timeline, sale.timestamp)
+            self._timeline.insert(position, sale.timestamp)
+            self._timeline_ids.insert(position, sale.id)
+
+    def _timeline_bounds(self, start: Optional[str], end: Optional[str]):
+        """Posiciones [lo, hi) del índice temporal con `start <= timestamp < end`."""
+        lo = 0 if start is None else bisect_left(self._timeline, start)
+        hi = len(self._timeline) if end is None else bisect_left(self._timeline, end)
+        return lo, max(lo, hi)
+
+    def query_sales(self, start: Optional[str] = None, end: Optional[str] = None, offset: int = 0,
+                    limit: Optional[int] = None, order: str = "asc") -> Iterator[Sale]:
+        """
+        Recorre las ventas con `start <= timestamp < end` ordenadas por fecha
+        (`order`: "asc" o "desc"), saltando las primeras `offset` y devolviendo
+        como máximo `limit`. El rango se ubica con búsqueda binaria sobre el
+        índice temporal y las ventas se obtienen a medida que se recorren, sin
+        copiar el historial (solo los IDs de la página); en modo diferido se
+        leen del almacenamiento.
+        """
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Orden no soportado: {order}")
+        # Solo se copian los IDs de la página, bajo el candado: una venta con
+        # fecha anterior insertada mientras se recorre desplazaría las posiciones.
+        with self._lock:
+            lo, hi = self._timeline_bounds(start, end)
+            count = max(0, hi - lo - offset)
+            if limit is not None:
+                count = min(count, limit)
+            if order == "asc":
+                sale_ids = self._timeline_ids[lo + offset:lo + offset + count]
+            else:
+                sale_ids = self._timeline_ids[hi - offset - count:hi - offset][::-1]
+        for sale_id in sale_ids:
+            sale = self.get_sale(sale_id)
+            if sale is not None:
+                yield sale
+
+    def _load_aggregates(self):
+        """
+        Carga los agregados persistidos y los valida contra el historial: si solo
+        les faltan las últimas ventas se ponen al día con ellas; si no coinciden,
+        faltan o están dañados, se recalculan desde cero.
+        """
+        sale_ids = list(self._sale_index if self._lazy else self._sales)
+        aggregates = None
+        try:
+            data = self._storage.load_aggregates()
+            if data is not None:
+                aggregates = SalesAggregates.from_dict(data)
+        except Exception as e:
+            logger.warning(f"Agregados de ventas descartados: {e}")
+        count = aggregates.sales_count if aggregates else 0
+        if aggregates is None or count > len(sale_ids) or \
+                (count and sale_ids[count - 1] != aggregates.last_sale_id):
+            self.rebuild_aggregates()
+            return
+        for sale_id in sale_ids[count:]:
+            sale = self.get_sale(sale_id)
+            if sale is None:
+                self.rebuild_aggregates()
+                return
+            aggregates.add_sale(sale)
+        self._aggregates = aggregates
+        if count < len(sale_ids):
+            logger.info(f"Agregados de ventas actualizados con {len(sale_ids) - count} ventas recientes.")
+            self.save_aggregates()
+
+    def rebuild_aggregates(self):
+        """Recalcula los agregados recorriendo todo el historial y los persiste."""
+        aggregates = SalesAggregates()
+        for sale in self.iter_sales():
+            aggregates.add_sale(sale)
+        self._aggregates = aggregates
+        logger.info(f"Agregados de ventas recalculados a partir de {aggregates.sales_count} ventas.")
+        self.save_aggregates()
+
+    def save_aggregates(self):
+        """Persiste los agregados de ventas."""
+        with self._lock:
+            try:
+                self._storage.save_aggregates(self._aggregates.to_dict())
+                self._unsaved_aggregates = 0
+            except Exception as e:
+                logger.error(f"Error al guardar los agregados de ventas: {e}")
+
+    def flush(self):
+        """Persiste el estado pendiente del servicio (los agregados de ventas)."""
+        if self._unsaved_aggregates:
+            self.save_aggregates()
+
+    @staticmethod
+    def _sale_from_dict(data: Dict) -> Sale:
+        return Sale.from_dict(data)
 
     def save_sales(self):
         """Guarda las ventas en el almacenamiento."""
         try:
-            sales_data = [s.to_dict() for s in self._sales.values()]
+            sales_data = [s.to_dict() for s in self.iter_sales()]
             self._storage.save_sales(sales_data)
             logger.info("Ventas guardadas.")
+            self._analytics = None
+            self.rebuild_aggregates()
+            self._version += 1
         except Exception as e:
             logger.error(f"Error al guardar ventas: {e}")
 
     def get_all_sales(self) -> List[Sale]:
-        return list(self._sales.values())
+        return list(self.iter_sales())
+
+    def iter_sales(self) -> Iterator[Sale]:
+        """
+        Recorre las ventas en orden de registro. En modo diferido se leen del
+        almacenamiento una a una, sin retenerlas en memoria.
+        """
+        if not self._lazy:
+            yield from list(self._sales.values())
+            return
+        for data in self._storage.iter_sales():
+            yield self._sale_from_dict(data)
+
+    def get_sale(self, sale_id: str) -> Optional[Sale]:
+        """Devuelve una venta por ID, leyéndola del almacenamiento si hace falta."""
+        if not self._lazy:
+            return self._sales.get(sale_id)
+        # La caché se comparte entre sesiones; la lectura del almacenamiento se hace sin el candado.
+        with self._lock:
+            sale = self._sales.get(sale_id)
+            if sale is not None:
+                self._sales.move_to_end(sale_id)
+                return sale
+            if sale_id not in self._sale_index:
+                return None
+        try:
+            data = self._storage.load_sale(sale_id)
+        except Exception as e:
+            logger.error(f"Error al cargar la venta {sale_id}: {e}")
+            return None
+        if data is None:
+            logger.warning(f"Venta indexada pero no encontrada en el almacenamiento: {sale_id}")
+            return None
+        sale = self._sale_from_dict(data)
+        with self._lock:
+            self._cache_sale(sale)
+        return sale
+
+    def _cache_sale(self, sale: Sale):
+        """Guarda una venta en la caché LRU del modo diferido. Requiere `self._lock`."""
+        self._sales[sale.id] = sale
+        self._sales.move_to_end(sale.id)
+        while len(self._sales) > self._cache_size:
+            self._sales.popitem(last=False)
+
+    def get_totals(self) -> Dict[str, float]:
+        """Totales históricos: ventas, unidades, ingresos, costo y ganancia."""
+        return dict(self._aggregates.totals)
+
+    def get_day_totals(self, day: str) -> Dict[str, float]:
+        """Totales de un día (AAAA-MM-DD)."""
+        metrics = self._aggregates.by_day.get(day)
+        return dict(metrics) if metrics else dict.fromkeys(METRICS, 0)
+
+    def get_daily_totals(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """Totales por día con `start <= día < end` (fechas AAAA-MM-DD)."""
+        return self._aggregates.days_between(start, end)
+
+    def get_product_totals(self, product_id: str) -> Optional[Dict]:
+        """Totales vendidos de un producto, o None si nunca se vendió."""
+        metrics = self._aggregates.by_product.get(product_id)
+        return dict(metrics) if metrics else None
+
+    def get_top_products(self, limit: int = 10, metric: str = "revenue") -> List[Dict]:
+        return self._aggregates.top_products(limit, metric)
+
+    def get_analytics(self) -> SalesAnalytics:
+        """
+        Devuelve el historial en formato columnar (NumPy) para reportes:
+        agrupaciones por producto, rankings y series de tiempo vectorizadas.
+        """
+        with self._lock:
+            if self._analytics is None:
+                with paused_gc():
+                    self._analytics = SalesAnalytics(self.iter_sales())
+                logger.info(f"Analítica de ventas construida con {len(self._analytics)} líneas.")
+            return self._analytics
+
+    def get_sales_between(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Sale]:
+        """
+        Devuelve las ventas con `start <= timestamp < end` (fechas ISO 8601).
+        El filtrado se delega al almacenamiento para que pueda usar sus índices.
+        """
+        try:
+            return [self._sale_from_dict(s) for s in self._storage.load_sales_range(start, end)]
+        except Exception as e:
+            logger.error(f"Error al consultar ventas entre {start} y {end}: {e}")
+            return []
+
+    def iter_sales_between(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Sale]:
+        """
+        Recorre las ventas con `start <= timestamp < end` en orden cronológico.
+        En modo diferido se leen del almacenamiento una a una (en el orden en
+        que se guardaron), sin retenerlas.
+        """
+        if not self._lazy:
+            yield from self.query_sales(start, end)
+            return
+        for data in self._storage.iter_sales_range(start, end):
+            yield self._sale_from_dict(data)
+
+    def count_sales_between(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Cantidad de ventas con `start <= timestamp < end`, por búsqueda binaria en el índice temporal."""
+        with self._lock:
+            lo, hi = self._timeline_bounds(start, end)
+        return hi - lo
+
+    def export_sales(self, start: Optional[str] = None, end: Optional[str] = None,
+                     fmt: str = "csv", level: str = "sales") -> Iterator[str]:
+        """
+        Genera el texto de la exportación de las ventas del rango, en CSV o
+        JSONL (`fmt`), con una fila por venta o por línea de venta (`level`:
+        "sales" o "lines"). Es un generador: la memoria usada no depende del
+        tamaño del historial.
+        """
+        return export_chunks(self.iter_sales_between(start, end), fmt, level)
+
+    def export_sales_to_file(self, path: str, start: Optional[str] = None, end: Optional[str] = None,
+                             fmt: str = "csv", level: str = "sales",
+                             on_progress: Optional[Callable[[int, int], None]] = None,
+                             cancel: Optional[threading.Event] = None) -> Optional[int]:
+        """
+        Escribe la exportación en `path` (ver `export_sales`), llamando a
+        `on_progress(exportadas, total)` cada `EXPORT_PROGRESS_EVERY` ventas.
+        Si se activa `cancel` se detiene y descarta el archivo parcial.
+        Devuelve la cantidad de ventas exportadas, o None si se canceló o falló.
+        """
+        total = self.count_sales_between(start, end)
+        exported = 0
+
+        def tracked(sales: Iterator[Sale]) -> Iterator[Sale]:
+            nonlocal exported
+            for sale in sales:
+                if cancel is not None and cancel.is_set():
+                    return
+                yield sale
+                exported += 1
+                if on_progress and exported % EXPORT_PROGRESS_EVERY == 0:
+                    on_progress(exported, total)
+
+        partial = f"{path}.part"
+        try:
+            # El BOM permite que Excel reconozca los acentos del CSV.
+            with open(partial, 'w', encoding='utf-8-sig' if fmt == "csv" else 'utf-8', newline='') as f:
+                for chunk in export_chunks(tracked(self.iter_sales_between(start, end)), fmt, level):
+                    f.write(chunk)
+            if cancel is not None and cancel.is_set():
+                os.remove(partial)
+                logger.info(f"Exportación de ventas a {path} cancelada tras {exported} ventas.")
+                return None
+            os.replace(partial, path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error al exportar ventas a {path}: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            return None
+        if on_progress:
+            on_progress(exported, total)
+        logger.info(f"Se exportaron {exported} ventas a {path}.")
+        return exported
 
-    def record_sale(self, sale_items: List[Dict]) -> Optional[Sale]:
+    def record_sale(self, sale_items: List[Dict], reservation_id: Optional[str] = None) -> Optional[Sale]:
         """
         Registra una venta y actualiza el inventario.
         sale_items: Lista de diccionarios, ej. [{'product_id': '...', 'quantity': 1}]
+        Todas las líneas se validan antes de tocar el stock: si alguna falla no
+        se descuenta nada. Los ajustes de stock (con sus movimientos en el libro
+        de stock) y la venta se persisten en un mismo lote del almacenamiento,
+        para que un corte no deje uno sin el otro; si el lote no se puede
+        escribir, el stock se restaura y la venta no se registra.
+        Con `reservation_id` (el carrito) se vende el stock apartado con
+        `InventoryService.reserve`, que queda consumido.
         """
         if not sale_items:
             logger.warning("Intento de registrar una venta vacía.")
@@ -50,38 +386,84 @@ class SalesService:
         total_revenue = 0.0
         total_cost = 0.0
 
-        for item in sale_items:
-            product = self._inventory.get_product(item['product_id'])
-            quantity = item['quantity']
-            if not product or product.stock < quantity or quantity <= 0:
-                logger.warning(f"No se pudo registrar la venta: stock insuficiente para el producto {product.name if product else 'ID no encontrado'}.")
-                return None
-            
-            subtotal = product.price * quantity
-            cost_subtotal = product.cost * quantity
-            
-            items.append(SaleItem(
-                product_id=product.id,
-                name=product.name,
-                quantity=quantity,
-                price=product.price,
-                cost=product.cost,
-                subtotal=subtotal
-            ))
-            total_revenue += subtotal
-            total_cost += cost_subtotal
-            
-            self._inventory.update_stock(product.id, quantity)
-        
-        new_sale = Sale(
-            id=str(uuid.uuid4()),
-            timestamp=datetime.now().isoformat(),
-            total_revenue=total_revenue,
-            total_cost=total_cost,
-            total_profit=total_revenue - total_cost,
-            items=items
-        )
-        self._sales[new_sale.id] = new_sale
-        self.save_sales()
+        sale_id = str(uuid.uuid4())
+        try:
+            with self._inventory.transaction(reservation_id, 'sale', sale_id) as tx:
+                for item in sale_items:
+                    quantity = sale_quantity(item['quantity'])
+                    product = tx.remove_stock(item['product_id'], quantity)
+
+                    subtotal = product.price * quantity
+                    cost_subtotal = product.cost * quantity
+
+                    items.append(SaleItem(
+                        product_id=product.id,
+                        name=product.name,
+                        quantity=quantity,
+                        price=product.price,
+                        cost=product.cost,
+                        subtotal=subtotal
+                    ))
+                    total_revenue += subtotal
+                    total_cost += cost_subtotal
+
+                new_sale = Sale(
+                    id=sale_id,
+                    timestamp=datetime.now().isoformat(),
+                    total_revenue=total_revenue,
+                    total_cost=total_cost,
+                    total_profit=total_revenue - total_cost,
+                    items=items
+                )
+                tx.persist(self._storage.append_sale, new_sale.to_dict())
+        except ValueError as e:
+            logger.warning(f"No se pudo registrar la venta: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error al guardar la venta; el stock no se modificó: {e}")
+            return None
+
+        with self._lock:
+            if self._lazy:
+                self._sale_index[new_sale.id] = new_sale.timestamp
+                self._cache_sale(new_sale)
+            else:
+                self._sales[new_sale.id] = new_sale
+            self._add_to_timeline(new_sale)
+            self._version += 1
+            self._aggregates.add_sale(new_sale)
+            if self._analytics is not None:
+                self._analytics.add_sale(new_sale)
+            self._unsaved_aggregates += 1
+            if self._unsaved_aggregates >= self._aggregates_save_every:
+                self.save_aggregates()
         logger.info(f"Venta registrada con ID: {new_sale.id}")
-        return new_sale
\ No newline at end of file
+        return new_sale
+
+    # Versiones asíncronas para los manejadores de Flet: la operación (y su
+    # escritura en disco) se ejecuta en el hilo de E/S del almacenamiento.
+
+    async def record_sale_async(self, sale_items: List[Dict], reservation_id: Optional[str] = None) -> Optional[Sale]:
+        return await self._storage.run_async(self.record_sale, sale_items, reservation_id)
+
+    async def save_sales_async(self):
+        await self._storage.run_async(self.save_sales)
+
+    async def flush_async(self):
+        await self._storage.run_async(self.flush)
+
+    async def export_sales_to_file_async(self, path: str, start: Optional[str] = None, end: Optional[str] = None,
+                                         fmt: str = "csv", level: str = "sales",
+                                         on_progress: Optional[Callable[[int, int], None]] = None,
+                                         cancel: Optional[threading.Event] = None) -> Optional[int]:
+        """
+        La exportación solo lee, así que corre en el ejecutor por defecto y no
+        en el hilo de E/S del almacenamiento, para no demorar las ventas.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(
+            self.export_sales_to_file, path, start, end, fmt, level, on_progress, cancel
+        ))
+
+    async def get_sales_between_async(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Sale]:
+        return await self._storage.run_async(self.get_sales_between, start, end)
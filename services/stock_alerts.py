@@ -0,0 +1,70 @@
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
+from models.product import Product
+
+@dataclass
+class StockAlert:
+    """Cambio en el estado de reabastecimiento de un producto."""
+    product_id: str
+    name: str
+    stock: int
+    reorder_threshold: int
+    needs_reorder: bool
+
+class LowStockIndex:
+    """
+    Productos con umbral de reabastecimiento, ordenados por la razón
+    stock / umbral. Un producto necesita reabastecerse cuando la razón es
+    menor o igual a 1; como la lista está ordenada, contar o listar esos
+    productos es una búsqueda binaria en lugar de recorrer el catálogo.
+    """
+    def __init__(self):
+        self._entries: List[Tuple[float, str]] = []
+        self._keys: Dict[str, Tuple[float, str]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def ratio(product: Product) -> Optional[float]:
+        """Razón stock / umbral, o None si el producto no tiene umbral."""
+        if product.reorder_threshold <= 0:
+            return None
+        return product.stock / product.reorder_threshold
+
+    def clear(self):
+        self._entries = []
+        self._keys = {}
+
+    def needs_reorder(self, product_id: str) -> bool:
+        key = self._keys.get(product_id)
+        return key is not None and key[0] <= 1
+
+    def update(self, product: Product):
+        """Reubica un producto según su stock y umbral actuales."""
+        ratio = self.ratio(product)
+        key = self._keys.get(product.id)
+        if key is not None and ratio is not None and key[0] == ratio:
+            return
+        self.remove(product.id)
+        if ratio is not None:
+            key = (ratio, product.id)
+            insort(self._entries, key)
+            self._keys[product.id] = key
+
+    def remove(self, product_id: str):
+        key = self._keys.pop(product_id, None)
+        if key is not None:
+            del self._entries[bisect_left(self._entries, key)]
+
+    def count_below(self, max_ratio: float = 1.0) -> int:
+        """Cantidad de productos con razón <= `max_ratio`."""
+        return bisect_right(self._entries, (max_ratio, '\uffff'))
+
+    def lowest(self, limit: Optional[int] = None, max_ratio: float = 1.0) -> List[str]:
+        """IDs con razón <= `max_ratio`, empezando por los más urgentes."""
+        end = self.count_below(max_ratio)
+        if limit is not None:
+            end = min(end, limit)
+        return [product_id for _, product_id in self._entries[:end]]
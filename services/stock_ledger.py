@@ -0,0 +1,188 @@
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from models.stock_movement import StockMovement
+from storage.base_storage import BaseStorage
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Motivos de los movimientos: alta de producto, venta, ajuste manual,
+# importación CSV, devolución, baja del producto y conciliación al arrancar
+# (stock que cambió sin pasar por el libro).
+REASONS = ("initial", "sale", "adjustment", "import", "return", "removal", "reconcile")
+
+TimeBound = Union[str, datetime]
+
+def _iso(value: TimeBound) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _replay(levels: Dict[str, int], movement: Dict):
+    if movement['reason'] == 'removal':
+        levels.pop(movement['product_id'], None)
+    else:
+        levels[movement['product_id']] = movement['balance']
+
+class StockLedger:
+    """
+    Libro de movimientos de stock, solo de agregado. Cada movimiento guarda
+    el cambio, el stock resultante, el motivo y una referencia (la venta, el
+    archivo importado...). El stock actual es una vista materializada del
+    libro que se mantiene en memoria.
+
+    Cada `snapshot_every` movimientos se guarda una instantánea con el stock
+    de todos los productos: al arrancar se lee la última y solo se reproducen
+    los movimientos posteriores, y el stock a una fecha pasada se calcula desde
+    la instantánea anterior más cercana en lugar de recorrer todo el historial.
+    """
+    def __init__(self, storage: BaseStorage, snapshot_every: int = 5000):
+        self._storage = storage
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._balances: Dict[str, int] = {}
+        self._last_seq = 0
+        self._last_time: Optional[datetime] = None
+        self._since_snapshot = 0
+        self._due_snapshot: Optional[Dict] = None
+
+    def __len__(self):
+        return self._last_seq
+
+    def load(self) -> int:
+        """Reconstruye los saldos desde la última instantánea; devuelve cuántos movimientos se reprodujeron."""
+        snapshot = self._storage.load_stock_snapshot()
+        balances = dict(snapshot['stock']) if snapshot else {}
+        seq = snapshot['seq'] if snapshot else 0
+        timestamp = snapshot['timestamp'] if snapshot else None
+        replayed = 0
+        for movement in self._storage.iter_stock_movements(seq):
+            _replay(balances, movement)
+            seq, timestamp = movement['seq'], movement['timestamp']
+            replayed += 1
+        with self._lock:
+            self._balances = balances
+            self._last_seq = seq
+            self._last_time = datetime.fromisoformat(timestamp) if timestamp else None
+            self._since_snapshot = replayed
+            self._due_snapshot = None
+        logger.info(f"Libro de stock cargado: {seq} movimientos, {replayed} reproducidos desde la última instantánea.")
+        return replayed
+
+    def writing(self) -> threading.Lock:
+        """
+        Candado que se toma antes de `record` y se suelta después de `persist`
+        (o `discard`), para que los movimientos lleguen al almacenamiento en
+        orden de `seq` aunque los registren operaciones concurrentes.
+        """
+        return self._write_lock
+
+    def balance(self, product_id: str) -> Optional[int]:
+        """Stock de un producto según el libro, o None si no tiene movimientos."""
+        return self._balances.get(product_id)
+
+    def record(self, changes: Iterable[Tuple[str, int, int]], reason: str,
+               reference: Optional[str] = None) -> List[Dict]:
+        """
+        Registra movimientos (producto, cambio, stock resultante) con un mismo
+        motivo y devuelve los registros para `persist`. Debe llamarse con el
+        stock de esos productos bloqueado y dentro de `writing()`, para que el
+        número de secuencia siga el orden real de los cambios.
+        """
+        movements = []
+        with self._lock:
+            now = datetime.now()
+            # Las marcas de tiempo nunca retroceden: las consultas por fecha
+            # dependen de que sigan el orden de secuencia.
+            if self._last_time is not None and now < self._last_time:
+                now = self._last_time
+            self._last_time = now
+            timestamp = now.isoformat()
+            for product_id, delta, balance in changes:
+                if delta:
+                    self._last_seq += 1
+                    movements.append(StockMovement(
+                        self._last_seq, timestamp, product_id, delta, balance, reason, reference
+                    ).to_dict())
+                if reason == 'removal':
+                    self._balances.pop(product_id, None)
+                else:
+                    self._balances[product_id] = balance
+            self._since_snapshot += len(movements)
+            if movements and self._since_snapshot >= self.snapshot_every:
+                self._due_snapshot = {'seq': self._last_seq, 'timestamp': timestamp, 'stock': dict(self._balances)}
+                self._since_snapshot = 0
+        return movements
+
+    def discard(self, movements: List[Dict]):
+        """
+        Deshace los movimientos de `record` que no se pudieron persistir. Debe
+        llamarse sin haber soltado `writing()`, así que fueron los últimos.
+        """
+        if not movements:
+            return
+        with self._lock:
+            self._last_seq = movements[0]['seq'] - 1
+            for movement in reversed(movements):
+                self._balances[movement['product_id']] = movement['balance'] - movement['delta']
+            self._since_snapshot = max(self._since_snapshot - len(movements), 0)
+            if self._due_snapshot is not None and self._due_snapshot['seq'] >= movements[0]['seq']:
+                self._due_snapshot = None
+
+    def reconcile(self, stock: Dict[str, int]) -> List[Dict]:
+        """
+        Registra los movimientos necesarios para que el libro coincida con el
+        stock de los productos: 'initial' para los que no tienen movimientos,
+        'reconcile' para los que difieren y 'removal' para los que ya no existen.
+        """
+        with self._lock:
+            balances = dict(self._balances)
+        initial = [(pid, qty, qty) for pid, qty in stock.items() if pid not in balances]
+        changed = [(pid, qty - balances[pid], qty) for pid, qty in stock.items()
+                   if pid in balances and balances[pid] != qty]
+        removed = [(pid, -qty, 0) for pid, qty in balances.items() if pid not in stock]
+        return (self.record(initial, 'initial') + self.record(changed, 'reconcile')
+                + self.record(removed, 'removal'))
+
+    def persist(self, movements: List[Dict]):
+        """
+        Guarda los movimientos y, si corresponde, la instantánea pendiente. Se
+        llama dentro del mismo lote del almacenamiento que el cambio de stock.
+        """
+        if movements:
+            self._storage.append_stock_movements(movements)
+        with self._lock:
+            snapshot, self._due_snapshot = self._due_snapshot, None
+        if snapshot is not None:
+            self._storage.save_stock_snapshot(snapshot)
+            logger.info(f"Instantánea de stock guardada en el movimiento {snapshot['seq']}.")
+
+    def stock_levels_as_of(self, when: TimeBound) -> Dict[str, int]:
+        """Stock de todos los productos en el instante `when` (incluye los movimientos con esa fecha exacta)."""
+        when = _iso(when)
+        snapshot = self._storage.load_stock_snapshot(when)
+        levels = dict(snapshot['stock']) if snapshot else {}
+        for movement in self._storage.iter_stock_movements(snapshot['seq'] if snapshot else 0):
+            if movement['timestamp'] > when:
+                break
+            _replay(levels, movement)
+        return levels
+
+    def stock_as_of(self, product_id: str, when: TimeBound) -> int:
+        """Stock de un producto en el instante `when`."""
+        when = _iso(when)
+        snapshot = self._storage.load_stock_snapshot(when)
+        levels = {product_id: snapshot['stock'].get(product_id, 0)} if snapshot else {}
+        for movement in self._storage.iter_stock_movements(snapshot['seq'] if snapshot else 0, product_id):
+            if movement['timestamp'] > when:
+                break
+            _replay(levels, movement)
+        return levels.get(product_id, 0)
+
+    def history(self, product_id: str, limit: int = 50) -> List[StockMovement]:
+        """Últimos `limit` movimientos de un producto, del más reciente al más antiguo."""
+        recent = deque(maxlen=limit)
+        for movement in self._storage.iter_stock_movements(0, product_id):
+            recent.append(movement)
+        return [StockMovement(**movement) for movement in reversed(recent)]
@@ -1,7 +1,18 @@
+import asyncio
+import functools
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, List, Dict, Iterator, Optional, Tuple
+
+_executor_lock = threading.Lock()
 
 class BaseStorage(ABC):
+    # True si `batch()` aplica todas las escrituras del bloque o ninguna; si es
+    # False, un error a mitad del bloque deja aplicadas las anteriores.
+    atomic_batches = False
+
     @abstractmethod
     def load_products(self) -> List[Dict]:
         pass
@@ -16,4 +27,190 @@ class BaseStorage(ABC):
 
     @abstractmethod
     def save_sales(self, sales: List[Dict]):
-        pass
\ No newline at end of file
+        pass
+
+    def iter_sales(self) -> Iterator[Dict]:
+        """
+        Recorre las ventas una a una. Por defecto carga la lista completa;
+        los backends que pueden leer de forma incremental deben sobrescribirlo.
+        """
+        yield from self.load_sales()
+
+    def iter_sale_index(self) -> Iterator[Tuple[str, str]]:
+        """Recorre los pares (id, timestamp) de todas las ventas."""
+        for sale in self.iter_sales():
+            yield sale['id'], sale['timestamp']
+
+    def load_sale(self, sale_id: str) -> Optional[Dict]:
+        """Carga una única venta por ID. Por defecto recorre el historial."""
+        for sale in self.iter_sales():
+            if sale['id'] == sale_id:
+                return sale
+        return None
+
+    def upsert_product(self, product: Dict):
+        """Inserta o reemplaza un único producto."""
+        self.apply_product_changes(upserts=[product])
+
+    def delete_product(self, product_id: str):
+        """Elimina un único producto."""
+        self.apply_product_changes(deletes=[product_id])
+
+    def apply_stock_delta(self, product_id: str, delta: int):
+        """Suma `delta` (positivo o negativo) al stock de un producto."""
+        self.apply_product_changes(stock_deltas={product_id: delta})
+
+    def apply_product_changes(self, upserts: Optional[List[Dict]] = None,
+                              deletes: Optional[List[str]] = None,
+                              stock_deltas: Optional[Dict[str, int]] = None):
+        """
+        Aplica en bloque altas/modificaciones, bajas y ajustes de stock.
+        Por defecto reescribe el catálogo completo una sola vez; los backends
+        con escritura por filas deben sobrescribirlo.
+        """
+        products = {p['id']: p for p in self.load_products()}
+        self._merge_product_changes(products, upserts, deletes, stock_deltas)
+        self.save_products(list(products.values()))
+
+    @staticmethod
+    def _merge_product_changes(products: Dict[str, Dict], upserts: Optional[List[Dict]],
+                               deletes: Optional[List[str]], stock_deltas: Optional[Dict[str, int]]):
+        """Aplica los cambios sobre un diccionario de productos indexado por ID."""
+        for product in upserts or []:
+            products[product['id']] = dict(product)
+        for product_id in deletes or []:
+            products.pop(product_id, None)
+        for product_id, delta in (stock_deltas or {}).items():
+            if product_id in products:
+                product = products[product_id]
+                products[product_id] = dict(product, stock=product['stock'] + delta)
+
+    def append_sale(self, sale: Dict):
+        """
+        Persiste una venta nueva. Por defecto reescribe el historial completo;
+        los backends que soportan escritura incremental deben sobrescribirlo.
+        """
+        sales = self.load_sales()
+        sales.append(sale)
+        self.save_sales(sales)
+
+    def append_sales(self, sales: List[Dict]):
+        """Persiste varias ventas nuevas. Por defecto las agrega una a una."""
+        for sale in sales:
+            self.append_sale(sale)
+
+    def load_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """
+        Carga las ventas con `start <= timestamp < end` (fechas ISO 8601).
+        Por defecto filtra en memoria; los backends con índices deben sobrescribirlo.
+        """
+        return [
+            s for s in self.load_sales()
+            if (start is None or s['timestamp'] >= start) and (end is None or s['timestamp'] < end)
+        ]
+
+    def iter_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Recorre una a una las ventas con `start <= timestamp < end`. Por defecto
+        filtra `iter_sales`; los backends con índices deben sobrescribirlo.
+        """
+        for sale in self.iter_sales():
+            if (start is None or sale['timestamp'] >= start) and (end is None or sale['timestamp'] < end):
+                yield sale
+
+    def load_aggregates(self) -> Optional[Dict]:
+        """
+        Carga los agregados de ventas persistidos (ver `services.sales_aggregates`),
+        o None si no hay. Por defecto no se persisten y se recalculan al iniciar.
+        """
+        return None
+
+    def save_aggregates(self, aggregates: Dict):
+        """Persiste los agregados de ventas. Por defecto no hace nada."""
+        pass
+
+    def append_stock_movements(self, movements: List[Dict]):
+        """
+        Agrega movimientos al libro de stock (ver `services.stock_ledger`). Por
+        defecto no se persisten y el libro arranca cada vez desde el stock actual.
+        """
+        pass
+
+    def iter_stock_movements(self, after_seq: int = 0, product_id: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Recorre en orden de `seq` los movimientos con `seq > after_seq`, solo
+        los de `product_id` si se indica. Por defecto no hay movimientos.
+        """
+        return iter(())
+
+    def save_stock_snapshot(self, snapshot: Dict):
+        """Persiste una instantánea del stock ({'seq', 'timestamp', 'stock'}). Por defecto no hace nada."""
+        pass
+
+    def load_stock_snapshot(self, before: Optional[str] = None) -> Optional[Dict]:
+        """
+        Carga la instantánea de stock más reciente con `timestamp <= before`
+        (la última si `before` es None), o None si no hay ninguna.
+        """
+        return None
+
+    @contextmanager
+    def batch(self):
+        """
+        Agrupa las escrituras realizadas dentro del bloque para que se persistan
+        como una unidad. Por defecto no hace nada; lo aprovechan los backends
+        transaccionales (p. ej. el log de escritura anticipada).
+        """
+        yield
+
+    def flush(self):
+        """Fuerza la escritura de cualquier cambio pendiente. Por defecto no hace nada."""
+        pass
+
+    def close(self):
+        """
+        Espera a las operaciones asíncronas en curso, detiene el hilo de E/S,
+        vacía los cambios pendientes y libera los recursos del almacenamiento.
+        Las subclases que lo sobrescriban deben llamarlo antes de cerrar sus
+        propios recursos.
+        """
+        with _executor_lock:
+            executor = self.__dict__.pop('_async_executor', None)
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.flush()
+
+    def _io_executor(self) -> ThreadPoolExecutor:
+        """Hilo de E/S de este almacenamiento; se crea con la primera operación asíncrona."""
+        with _executor_lock:
+            executor = self.__dict__.get('_async_executor')
+            if executor is None:
+                executor = self._async_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"{type(self).__name__}-io"
+                )
+            return executor
+
+    async def run_async(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Ejecuta `func(*args, **kwargs)` en el hilo de E/S del almacenamiento y
+        espera el resultado sin bloquear el bucle de eventos. Hay un único hilo
+        por almacenamiento, así que las operaciones asíncronas se ejecutan de
+        a una y en el orden en que se pidieron.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor(), functools.partial(func, *args, **kwargs))
+
+    async def save_products_async(self, products: List[Dict]):
+        await self.run_async(self.save_products, products)
+
+    async def save_sales_async(self, sales: List[Dict]):
+        await self.run_async(self.save_sales, sales)
+
+    async def append_sale_async(self, sale: Dict):
+        await self.run_async(self.append_sale, sale)
+
+    async def load_sales_range_async(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        return await self.run_async(self.load_sales_range, start, end)
+
+    async def flush_async(self):
+        await self.run_async(self.flush)
@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+from typing import List, Dict, Iterator, Optional
+from storage.json_storage import JSONStorage
+from storage.serializers import decode_auto, fastest_codec
+from utils.file_utils import open_for_append
+from utils.logger import get_logger
+
+logger = get_logger()
+
+class JournalStorage(JSONStorage):
+    """
+    Variante de JSONStorage que no reescribe sales.json en cada venta.
+    Cada venta nueva se agrega como una línea al diario `sales.journal.jsonl`;
+    al cargar, el diario se reproduce sobre la última instantánea (sales.json).
+    Cuando el diario supera `compact_threshold` registros se compacta en un
+    hilo en segundo plano.
+    """
+    def __init__(self, data_dir="data", compact_threshold: int = 500, binary_snapshots: bool = False,
+                 codec: str = "json-pretty"):
+        super().__init__(data_dir, binary_snapshots, codec)
+        self.journal_file = os.path.join(self.data_dir, 'sales.journal.jsonl')
+        self.compacting_file = f"{self.journal_file}.compacting"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._journal_records = len(self._read_journal(self.journal_file))
+
+        # Una compactación interrumpida (p. ej. por un cierre abrupto) se retoma al iniciar.
+        if os.path.exists(self.compacting_file):
+            with self._lock:
+                self._start_compaction()
+
+    def _read_journal(self, path: str) -> List[Dict]:
+        """Lee los registros de un diario, ignorando una última línea truncada."""
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(fastest_codec().decode(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Registro inválido en {path}, línea {line_number}. Se omite.")
+        return records
+
+    def _read_snapshot(self) -> List[Dict]:
+        """Lee sales.json propagando los errores, para no compactar sobre datos corruptos."""
+        if not os.path.exists(self.sales_file):
+            return []
+        with open(self.sales_file, 'rb') as f:
+            return decode_auto(f.read())
+
+    @staticmethod
+    def _merge(*sources: List[Dict]) -> List[Dict]:
+        """Une varias listas de ventas conservando el orden y descartando IDs repetidos."""
+        merged: Dict[str, Dict] = {}
+        for source in sources:
+            for sale in source:
+                merged.setdefault(sale['id'], sale)
+        return list(merged.values())
+
+    def _iter_journal_file(self, f, path: str) -> Iterator[Dict]:
+        """Recorre un diario abierto en modo binario registrando la ubicación de cada venta."""
+        offset = 0
+        for line_number, line in enumerate(f, start=1):
+            start, offset = offset, offset + len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sale = fastest_codec().decode(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Registro inválido en {path}, línea {line_number}. Se omite.")
+                continue
+            self._sale_offsets[sale['id']] = (path, start, len(line))
+            yield sale
+
+    def iter_sales(self) -> Iterator[Dict]:
+        """Recorre la instantánea y luego el diario, una venta a la vez."""
+        # Los archivos se abren bajo el candado para obtener una vista coherente
+        # aunque una compactación los renombre mientras se recorren.
+        with self._lock:
+            handles = [(path, open(path, 'rb'))
+                       for path in (self.sales_file, self.compacting_file, self.journal_file)
+                       if os.path.exists(path)]
+        seen = set()
+        try:
+            for path, f in handles:
+                if path == self.sales_file:
+                    sales = self._iter_sales_source(f)
+                else:
+                    sales = self._iter_journal_file(f, path)
+                for sale in sales:
+                    if sale['id'] in seen:
+                        continue
+                    seen.add(sale['id'])
+                    yield sale
+        except ValueError as e:
+            logger.error(f"Error al decodificar el historial de ventas: {e}")
+        finally:
+            for _, f in handles:
+                f.close()
+
+    def load_sales(self) -> List[Dict]:
+        """Carga la instantánea de ventas y reproduce el diario sobre ella."""
+        try:
+            sales = list(self.iter_sales())
+            logger.info(f"Diario de ventas reproducido: {len(sales)} ventas.")
+            return sales
+        except Exception as e:
+            logger.error(f"Error inesperado al reproducir el diario de ventas: {e}")
+            return []
+
+    def append_sale(self, sale: Dict):
+        """Agrega una venta al final del diario sin tocar el resto del historial."""
+        self.append_sales([sale])
+
+    def append_sales(self, sales: List[Dict]):
+        """
+        Agrega varias ventas al diario con una sola escritura sincronizada.
+        Los errores de escritura se propagan: quien llama no debe dar la venta
+        por guardada.
+        """
+        if not sales:
+            return
+        with self._lock:
+            try:
+                with open_for_append(self.journal_file) as f:
+                    start = f.seek(0, os.SEEK_END)
+                    locations = []
+                    chunks = []
+                    for sale in sales:
+                        # El diario siempre es JSON compacto, una venta por línea.
+                        line = fastest_codec().encode(sale)
+                        locations.append((sale['id'], start, len(line)))
+                        chunks.append(line + b'\n')
+                        start += len(line) + 1
+                    f.write(b''.join(chunks))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._journal_records += len(sales)
+                for sale_id, offset, length in locations:
+                    self._sale_offsets[sale_id] = (self.journal_file, offset, length)
+                logger.info(f"{len(sales)} ventas agregadas al diario.")
+            except IOError as e:
+                logger.error(f"Error de E/S al escribir en el diario de ventas: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Error inesperado al escribir en el diario de ventas: {e}")
+                raise
+
+            if self._journal_records >= self.compact_threshold:
+                self._start_compaction()
+
+    def save_sales(self, sales: List[Dict]):
+        """Reescribe la instantánea completa y descarta el diario pendiente."""
+        with self._lock:
+            # Invalida cualquier compactación en curso: su resultado ya no es válido.
+            self._generation += 1
+            super().save_sales(sales)
+            for path in (self.journal_file, self.compacting_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._journal_records = 0
+
+    def _start_compaction(self):
+        """Rota el diario y lanza la compactación en segundo plano. Requiere `self._lock`."""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        if not os.path.exists(self.compacting_file):
+            if not os.path.exists(self.journal_file):
+                return
+            os.replace(self.journal_file, self.compacting_file)
+            self._journal_records = 0
+            self._sale_offsets.clear()
+        self._compaction_thread = threading.Thread(
+            target=self._compact,
+            args=(self._generation,),
+            name="sales-journal-compaction",
+            daemon=True
+        )
+        self._compaction_thread.start()
+
+    def _compact(self, generation: int):
+        """Fusiona la instantánea con el diario rotado y la reemplaza atómicamente."""
+        logger.info("Compactando diario de ventas...")
+        try:
+            sales = self._merge(self._read_snapshot(), self._read_journal(self.compacting_file))
+            # El archivo temporal se escribe fuera del candado para no bloquear
+            # las ventas nuevas; solo el renombrado final se sincroniza.
+            tmp_path = f"{self.sales_file}.compact"
+            with open(tmp_path, 'wb') as f:
+                f.write(self.codec.encode(sales))
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                if generation != self._generation:
+                    os.remove(tmp_path)
+                    logger.info("Compactación descartada: las ventas se reescribieron mientras tanto.")
+                    return
+                os.replace(tmp_path, self.sales_file)
+                os.remove(self.compacting_file)
+                self._sale_offsets.clear()
+            logger.info(f"Diario de ventas compactado: {len(sales)} ventas en {self.sales_file}.")
+        except Exception as e:
+            logger.error(f"Error al compactar el diario de ventas: {e}")
+
+    def close(self):
+        """Cierra el almacenamiento y espera a que termine una compactación en curso."""
+        super().close()
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
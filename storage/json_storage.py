@@ -1,20 +1,63 @@
+import bisect
+import codecs
 import json
+import marshal
 import os
-from typing import List, Dict
+import struct
+import sys
+import threading
+from typing import List, Dict, Iterator, Optional, Tuple
 from storage.base_storage import BaseStorage
+from storage.serializers import decode_auto, detect_codec, fastest_codec, get_codec
+from utils.file_utils import open_for_append
+from utils.gc_utils import paused_gc
 from utils.logger import get_logger
 
 logger = get_logger()
 
+STREAM_CHUNK_SIZE = 64 * 1024
+SNAPSHOT_MAGIC = b'INVSNAP1'
+# Movimientos de stock por segmento del libro (`stock_ledger/<primer seq>.jsonl`).
+LEDGER_SEGMENT_SIZE = 10000
+
 class JSONStorage(BaseStorage):
     """
     Una clase de almacenamiento que maneja la carga y guardado de datos
     de productos y ventas en archivos JSON.
+
+    Con `binary_snapshots=True` se mantiene junto a cada JSON una instantánea
+    binaria (`.snap`, formato `marshal`) que se usa al arrancar mientras su
+    firma coincida con el JSON (mtime y tamaño); si difieren se regenera.
+
+    `codec` elige el formato de escritura (ver `storage.serializers`); al leer,
+    el formato se detecta automáticamente, de modo que cambiar de códec no
+    requiere migrar los archivos existentes.
+
+    Los errores al escribir productos, ventas o movimientos de stock se
+    registran y se propagan, para que quien llama (p. ej. un checkpoint del
+    log de escritura anticipada) no dé por guardado lo que no llegó a disco.
     """
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", binary_snapshots: bool = False, codec: str = "json-pretty"):
         self.data_dir = data_dir
+        self.codec = get_codec(codec)
+        self.binary_snapshots = binary_snapshots
         self.products_file = os.path.join(self.data_dir, 'products.json')
         self.sales_file = os.path.join(self.data_dir, 'sales.json')
+        self.aggregates_file = os.path.join(self.data_dir, 'aggregates.json')
+        self.ledger_dir = os.path.join(self.data_dir, 'stock_ledger')
+        self.stock_snapshots_dir = os.path.join(self.data_dir, 'stock_snapshots')
+        self._ledger_lock = threading.Lock()
+        # Protege products.json y su copia en memoria: sin él, dos cambios
+        # incrementales simultáneos parten de la misma copia y uno se pierde.
+        self._products_lock = threading.RLock()
+        # Segmento del libro de stock abierto para agregar: (ruta, movimientos).
+        self._ledger_segment: Optional[Tuple[str, int]] = None
+        # Copia del catálogo tal como está en disco, para no releer el archivo
+        # en cada cambio incremental.
+        self._products_cache: Optional[Dict[str, Dict]] = None
+        # Ubicación (archivo, offset, longitud en bytes) de cada venta vista al
+        # recorrer el historial, para poder releerla sin volver a parsearlo todo.
+        self._sale_offsets: Dict[str, Tuple[str, int, int]] = {}
         self._ensure_data_dir()
 
     def _ensure_data_dir(self):
@@ -23,60 +66,403 @@ class JSONStorage(BaseStorage):
             os.makedirs(self.data_dir)
             logger.info(f"Directorio de datos creado: {self.data_dir}")
 
+    def _write_atomic(self, path: str, data):
+        """
+        Serializa `data` con el códec configurado en un archivo temporal, lo
+        sincroniza a disco y lo renombra sobre `path`, de modo que un corte
+        nunca deje el archivo a medias.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.codec.encode(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _snapshot_header(self, stat: os.stat_result) -> Dict:
+        """Firma que debe coincidir entre un JSON y su instantánea binaria."""
+        return {
+            'source': (stat.st_mtime_ns, stat.st_size),
+            'format': (marshal.version, sys.version_info[:2])
+        }
+
+    def _load_binary_snapshot(self, path: str, stat: Optional[os.stat_result] = None) -> Optional[List[Dict]]:
+        """
+        Devuelve el contenido de la instantánea de `path` si sigue vigente.
+        `stat` permite validar contra un archivo ya abierto (`os.fstat`).
+        """
+        snapshot_path = f"{path}.snap"
+        if not self.binary_snapshots or not os.path.exists(snapshot_path):
+            return None
+        try:
+            with open(snapshot_path, 'rb') as f:
+                if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    return None
+                (header_size,) = struct.unpack('<I', f.read(4))
+                if marshal.loads(f.read(header_size)) != self._snapshot_header(stat or os.stat(path)):
+                    logger.info(f"Instantánea binaria obsoleta para {path}; se regenerará.")
+                    return None
+                # Leer el bloque completo y decodificarlo de una vez es mucho más
+                # rápido que `marshal.load` sobre el archivo.
+                data = f.read()
+            with paused_gc():
+                return marshal.loads(data)
+        except (OSError, EOFError, ValueError, TypeError, struct.error) as e:
+            logger.warning(f"No se pudo leer la instantánea binaria de {path}: {e}")
+            return None
+
+    def _write_binary_snapshot(self, path: str, data: List[Dict], stat: Optional[os.stat_result] = None):
+        """Escribe la instantánea binaria de `path`. Un fallo aquí no es crítico."""
+        if not self.binary_snapshots:
+            return
+        snapshot_path = f"{path}.snap"
+        tmp_path = f"{snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                header = marshal.dumps(self._snapshot_header(stat or os.stat(path)))
+                f.write(SNAPSHOT_MAGIC + struct.pack('<I', len(header)) + header)
+                f.write(marshal.dumps(data))
+            os.replace(tmp_path, snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo escribir la instantánea binaria de {path}: {e}")
+
     def load_products(self) -> List[Dict]:
         """Carga productos del archivo JSON."""
-        if not os.path.exists(self.products_file):
-            logger.warning("Archivo products.json no encontrado. Devolviendo lista vacía.")
-            return []
-        try:
-            with open(self.products_file, 'r', encoding='utf-8') as f:
-                products = json.load(f)
-                logger.info("Productos cargados exitosamente.")
+        with self._products_lock:
+            if not os.path.exists(self.products_file):
+                logger.warning("Archivo products.json no encontrado. Devolviendo lista vacía.")
+                return []
+            products = self._load_binary_snapshot(self.products_file)
+            if products is not None:
+                self._products_cache = {p['id']: dict(p) for p in products}
+                logger.info("Productos cargados desde la instantánea binaria.")
                 return products
-        except json.JSONDecodeError as e:
-            logger.error(f"Error al decodificar JSON en products.json: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Error inesperado al cargar products.json: {e}")
-            return []
+            try:
+                with open(self.products_file, 'rb') as f:
+                    products = decode_auto(f.read())
+                    self._products_cache = {p['id']: dict(p) for p in products}
+                    logger.info("Productos cargados exitosamente.")
+                    self._write_binary_snapshot(self.products_file, products, os.fstat(f.fileno()))
+                return products
+            except ValueError as e:
+                logger.error(f"Error al decodificar products.json: {e}")
+                return []
+            except Exception as e:
+                logger.error(f"Error inesperado al cargar products.json: {e}")
+                return []
 
     def save_products(self, products: List[Dict]):
         """Guarda productos en el archivo JSON."""
-        logger.info(f"Intentando guardar {len(products)} productos en {self.products_file}")
-        try:
-            with open(self.products_file, 'w', encoding='utf-8') as f:
-                json.dump(products, f, indent=4)
-            logger.info("Productos guardados exitosamente.")
-        except IOError as e:
-            logger.error(f"Error de E/S al guardar products.json: {e}")
-        except Exception as e:
-            logger.error(f"Error inesperado al guardar products.json: {e}")
+        with self._products_lock:
+            logger.info(f"Intentando guardar {len(products)} productos en {self.products_file}")
+            try:
+                self._write_atomic(self.products_file, products)
+                self._write_binary_snapshot(self.products_file, products)
+                self._products_cache = {p['id']: dict(p) for p in products}
+                logger.info("Productos guardados exitosamente.")
+            except IOError as e:
+                logger.error(f"Error de E/S al guardar products.json: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Error inesperado al guardar products.json: {e}")
+                raise
+
+    def apply_product_changes(self, upserts: Optional[List[Dict]] = None,
+                              deletes: Optional[List[str]] = None,
+                              stock_deltas: Optional[Dict[str, int]] = None):
+        """
+        Aplica los cambios sobre la copia en memoria del catálogo y reescribe
+        products.json una sola vez, sin volver a leerlo.
+        """
+        with self._products_lock:
+            if self._products_cache is None:
+                self.load_products()
+            products = dict(self._products_cache or {})
+            self._merge_product_changes(products, upserts, deletes, stock_deltas)
+            self.save_products(list(products.values()))
 
     def load_sales(self) -> List[Dict]:
         """Carga ventas del archivo JSON."""
         if not os.path.exists(self.sales_file):
             logger.warning("Archivo sales.json no encontrado. Devolviendo lista vacía.")
             return []
+        sales = self._load_binary_snapshot(self.sales_file)
+        if sales is not None:
+            logger.info("Ventas cargadas desde la instantánea binaria.")
+            return sales
         try:
-            with open(self.sales_file, 'r', encoding='utf-8') as f:
-                sales = json.load(f)
+            with open(self.sales_file, 'rb') as f:
+                sales = decode_auto(f.read())
                 logger.info("Ventas cargadas exitosamente.")
+                self._write_binary_snapshot(self.sales_file, sales, os.fstat(f.fileno()))
                 return sales
-        except json.JSONDecodeError as e:
-            logger.error(f"Error al decodificar JSON en sales.json: {e}")
+        except ValueError as e:
+            logger.error(f"Error al decodificar sales.json: {e}")
             return []
         except Exception as e:
             logger.error(f"Error inesperado al cargar sales.json: {e}")
             return []
 
+    def _iter_json_array(self, f) -> Iterator[Tuple[int, int, Dict]]:
+        """
+        Decodifica de forma incremental un arreglo JSON abierto en modo binario.
+        Produce tuplas (offset, longitud en bytes, elemento) manteniendo en memoria
+        solo un bloque de lectura más el elemento en curso.
+        """
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        buffer, pos, offset, eof = '', 0, 0, False
+        opened = False
+
+        def read_more():
+            nonlocal buffer, pos, eof
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+            pos = 0
+
+        while True:
+            # Avanza sobre espacios y separadores entre elementos.
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n' + (',' if opened else ''):
+                    pos += 1
+                    offset += 1
+                if pos < len(buffer) or eof:
+                    break
+                read_more()
+            if pos >= len(buffer):
+                raise ValueError("El arreglo JSON está incompleto.")
+            if not opened:
+                if buffer[pos] != '[':
+                    raise ValueError("El archivo no contiene un arreglo JSON.")
+                opened = True
+                pos += 1
+                offset += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    read_more()
+            length = len(buffer[pos:end].encode('utf-8'))
+            yield offset, length, item
+            offset += length
+            pos = end
+
+    def _iter_sales_file(self, f, path: str) -> Iterator[Dict]:
+        """
+        Recorre un arreglo de ventas registrando la ubicación de cada una.
+        Los formatos que no son JSON se decodifican completos.
+        """
+        codec = detect_codec(f.peek(64)[:64])
+        if not codec.is_json:
+            yield from codec.decode(f.read())
+            return
+        for offset, length, sale in self._iter_json_array(f):
+            self._sale_offsets[sale['id']] = (path, offset, length)
+            yield sale
+
+    def _iter_sales_source(self, f) -> Iterator[Dict]:
+        """
+        Recorre sales.json (ya abierto en `f`), usando la instantánea binaria si
+        está vigente y regenerándola al terminar si no lo estaba.
+        """
+        stat = os.fstat(f.fileno())
+        snapshot = self._load_binary_snapshot(self.sales_file, stat)
+        if snapshot is not None:
+            yield from snapshot
+            return
+        collected: Optional[List[Dict]] = [] if self.binary_snapshots else None
+        for sale in self._iter_sales_file(f, self.sales_file):
+            if collected is not None:
+                collected.append(sale)
+            yield sale
+        if collected is not None:
+            self._write_binary_snapshot(self.sales_file, collected, stat)
+
+    def iter_sales(self) -> Iterator[Dict]:
+        """Recorre las ventas de sales.json una a una sin cargar el archivo completo."""
+        if not os.path.exists(self.sales_file):
+            logger.warning("Archivo sales.json no encontrado. No hay ventas que recorrer.")
+            return
+        try:
+            with open(self.sales_file, 'rb') as f:
+                yield from self._iter_sales_source(f)
+        except ValueError as e:
+            logger.error(f"Error al decodificar sales.json: {e}")
+
+    def load_sale(self, sale_id: str) -> Optional[Dict]:
+        """Carga una venta leyendo directamente su ubicación conocida en disco."""
+        location = self._sale_offsets.get(sale_id)
+        if location is not None:
+            path, offset, length = location
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    sale = fastest_codec().decode(f.read(length))
+                if isinstance(sale, dict) and sale.get('id') == sale_id:
+                    return sale
+            except (OSError, ValueError):
+                pass
+            # La ubicación quedó obsoleta (el archivo se reescribió); se recorre el historial.
+            del self._sale_offsets[sale_id]
+        return super().load_sale(sale_id)
+
+    def append_sales(self, sales: List[Dict]):
+        """Agrega varias ventas reescribiendo sales.json una sola vez."""
+        if not sales:
+            return
+        existing = self.load_sales()
+        self.save_sales(existing + sales)
+
     def save_sales(self, sales: List[Dict]):
         """Guarda ventas en el archivo JSON."""
         logger.info(f"Intentando guardar {len(sales)} ventas en {self.sales_file}")
         try:
-            with open(self.sales_file, 'w', encoding='utf-8') as f:
-                json.dump(sales, f, indent=4)
+            self._sale_offsets.clear()
+            self._write_atomic(self.sales_file, sales)
+            self._write_binary_snapshot(self.sales_file, sales)
             logger.info("Ventas guardadas exitosamente.")
         except IOError as e:
             logger.error(f"Error de E/S al guardar sales.json: {e}")
+            raise
         except Exception as e:
             logger.error(f"Error inesperado al guardar sales.json: {e}")
+            raise
+
+    def load_aggregates(self) -> Optional[Dict]:
+        """Carga aggregates.json; devuelve None si no existe o está dañado."""
+        if not os.path.exists(self.aggregates_file):
+            return None
+        try:
+            with open(self.aggregates_file, 'rb') as f:
+                return decode_auto(f.read())
+        except (IOError, ValueError) as e:
+            logger.error(f"Error al leer aggregates.json: {e}")
+            return None
+
+    def save_aggregates(self, aggregates: Dict):
+        """Reescribe aggregates.json de forma atómica."""
+        try:
+            self._write_atomic(self.aggregates_file, aggregates)
+        except IOError as e:
+            logger.error(f"Error de E/S al guardar aggregates.json: {e}")
+        except Exception as e:
+            logger.error(f"Error inesperado al guardar aggregates.json: {e}")
+
+    def _ledger_segments(self) -> List[Tuple[int, str]]:
+        """Segmentos del libro de stock como (primer seq, ruta), en orden."""
+        if not os.path.isdir(self.ledger_dir):
+            return []
+        segments = []
+        for name in os.listdir(self.ledger_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == '.jsonl' and stem.isdigit():
+                segments.append((int(stem), os.path.join(self.ledger_dir, name)))
+        return sorted(segments)
+
+    def _open_ledger_segment(self, first_seq: int) -> Tuple[str, int]:
+        """Segmento donde agregar movimientos, rotándolo si está lleno. Requiere `self._ledger_lock`."""
+        if self._ledger_segment is None:
+            segments = self._ledger_segments()
+            if segments:
+                path = segments[-1][1]
+                # Se descarta una última línea a medias antes de contar los movimientos.
+                with open_for_append(path):
+                    pass
+                with open(path, 'rb') as f:
+                    self._ledger_segment = (path, sum(1 for _ in f))
+        if self._ledger_segment is None or self._ledger_segment[1] >= LEDGER_SEGMENT_SIZE:
+            if not os.path.exists(self.ledger_dir):
+                os.makedirs(self.ledger_dir)
+            self._ledger_segment = (os.path.join(self.ledger_dir, f"{first_seq:012d}.jsonl"), 0)
+        return self._ledger_segment
+
+    def append_stock_movements(self, movements: List[Dict]):
+        """Agrega los movimientos al segmento actual del libro de stock, una línea por movimiento."""
+        if not movements:
+            return
+        with self._ledger_lock:
+            try:
+                path, count = self._open_ledger_segment(movements[0]['seq'])
+                with open_for_append(path) as f:
+                    f.write(b''.join(fastest_codec().encode(m) + b'\n' for m in movements))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._ledger_segment = (path, count + len(movements))
+            except IOError as e:
+                logger.error(f"Error de E/S al escribir en el libro de stock: {e}")
+                raise
+            except Exception as e:
+                logger.error(f"Error inesperado al escribir en el libro de stock: {e}")
+                raise
+
+    def _read_ledger_segment(self, path: str) -> Iterator[Dict]:
+        with open(path, 'rb') as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    yield fastest_codec().decode(line)
+                except ValueError:
+                    logger.warning(f"Movimiento de stock incompleto en {path}, línea {line_number}; se omite.")
+
+    def iter_stock_movements(self, after_seq: int = 0, product_id: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Recorre los segmentos del libro desde el que contiene `after_seq`, sin
+        cargar el historial completo. Los movimientos se agregan en orden de
+        `seq` (ver `StockLedger.writing`), así que se leen tal cual.
+        """
+        segments = self._ledger_segments()
+        first = max(bisect.bisect_right([seq for seq, _ in segments], after_seq) - 1, 0)
+        try:
+            for _, path in segments[first:]:
+                for movement in self._read_ledger_segment(path):
+                    if movement['seq'] <= after_seq or (product_id is not None and movement['product_id'] != product_id):
+                        continue
+                    yield movement
+        except OSError as e:
+            logger.error(f"Error al leer el libro de stock: {e}")
+
+    def save_stock_snapshot(self, snapshot: Dict):
+        """Escribe la instantánea en `stock_snapshots/<seq>.json` y la registra en el índice."""
+        try:
+            if not os.path.exists(self.stock_snapshots_dir):
+                os.makedirs(self.stock_snapshots_dir)
+            self._write_atomic(os.path.join(self.stock_snapshots_dir, f"{snapshot['seq']:012d}.json"), snapshot)
+            entry = {'seq': snapshot['seq'], 'timestamp': snapshot['timestamp']}
+            with open(os.path.join(self.stock_snapshots_dir, 'index.jsonl'), 'ab') as f:
+                f.write(fastest_codec().encode(entry) + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+        except IOError as e:
+            logger.error(f"Error de E/S al guardar la instantánea de stock: {e}")
+        except Exception as e:
+            logger.error(f"Error inesperado al guardar la instantánea de stock: {e}")
+
+    def load_stock_snapshot(self, before: Optional[str] = None) -> Optional[Dict]:
+        """Busca la instantánea en el índice y lee solo ese archivo."""
+        index_file = os.path.join(self.stock_snapshots_dir, 'index.jsonl')
+        if not os.path.exists(index_file):
+            return None
+        try:
+            best = None
+            with open(index_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = fastest_codec().decode(line)
+                    except ValueError:
+                        continue
+                    if (before is None or entry['timestamp'] <= before) and (best is None or entry['seq'] > best['seq']):
+                        best = entry
+            if best is None:
+                return None
+            with open(os.path.join(self.stock_snapshots_dir, f"{best['seq']:012d}.json"), 'rb') as f:
+                return decode_auto(f.read())
+        except (IOError, ValueError) as e:
+            logger.error(f"Error al leer las instantáneas de stock: {e}")
+            return None
@@ -0,0 +1,206 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Iterator, Optional
+from storage.json_storage import JSONStorage
+from storage.journal_storage import JournalStorage
+from storage.serializers import decode_auto
+from utils.logger import get_logger
+
+logger = get_logger()
+
+PARTITION_FILE_PATTERN = re.compile(r"^(\d{4}-\d{2})\.json$")
+
+class PartitionedStorage(JSONStorage):
+    """
+    Variante de JSONStorage que reparte las ventas en un archivo por mes
+    (`data/sales/2026-10.json`) más un manifiesto con el rango de fechas de
+    cada partición. Registrar una venta solo reescribe la partición del mes
+    correspondiente y las consultas por rango abren únicamente las particiones
+    que se solapan con él. Las particiones leídas se conservan en una caché LRU.
+    """
+    def __init__(self, data_dir="data", cached_partitions: int = 12, binary_snapshots: bool = False,
+                 codec: str = "json-pretty"):
+        super().__init__(data_dir, binary_snapshots, codec)
+        self.sales_dir = os.path.join(self.data_dir, 'sales')
+        self.manifest_file = os.path.join(self.sales_dir, 'manifest.json')
+        self.cached_partitions = cached_partitions
+        self._lock = threading.RLock()
+        self._cache: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        if not os.path.exists(self.sales_dir):
+            os.makedirs(self.sales_dir)
+        self._manifest = self._load_manifest()
+
+    @staticmethod
+    def partition_key(timestamp: str) -> str:
+        """Devuelve la clave de partición (AAAA-MM) de un timestamp ISO 8601."""
+        return timestamp[:7]
+
+    def _partition_file(self, key: str) -> str:
+        return os.path.join(self.sales_dir, f"{key}.json")
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Lee el manifiesto; si no existe, migra sales.json o lo reconstruye desde las particiones."""
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'rb') as f:
+                    return decode_auto(f.read())['partitions']
+            except (ValueError, KeyError) as e:
+                logger.error(f"Manifiesto de particiones inválido, se reconstruye: {e}")
+                return self._rebuild_manifest()
+        if any(PARTITION_FILE_PATTERN.match(name) for name in os.listdir(self.sales_dir)):
+            return self._rebuild_manifest()
+        self._manifest = {}
+        self._migrate_legacy_sales()
+        return self._manifest
+
+    def _rebuild_manifest(self) -> Dict[str, Dict]:
+        """Recalcula el manifiesto recorriendo los archivos de partición existentes."""
+        self._manifest = {}
+        for name in sorted(os.listdir(self.sales_dir)):
+            match = PARTITION_FILE_PATTERN.match(name)
+            if match:
+                self._update_manifest_entry(match.group(1), self._read_partition(match.group(1)))
+        self._write_manifest()
+        logger.info(f"Manifiesto de particiones reconstruido: {len(self._manifest)} particiones.")
+        return self._manifest
+
+    def _migrate_legacy_sales(self):
+        """Reparte por mes las ventas de sales.json (y su diario, si existe)."""
+        legacy_files = [self.sales_file, os.path.join(self.data_dir, 'sales.journal.jsonl')]
+        if not any(os.path.exists(path) for path in legacy_files):
+            return
+        sales = JournalStorage(self.data_dir).load_sales()
+        self._write_all_partitions(sales)
+        logger.info(f"Migración a particiones mensuales completada: {len(sales)} ventas.")
+
+    def _write_manifest(self):
+        self._write_atomic(self.manifest_file, {'version': 1, 'partitions': self._manifest})
+
+    def _update_manifest_entry(self, key: str, sales: List[Dict]):
+        if not sales:
+            self._manifest.pop(key, None)
+            return
+        timestamps = [s['timestamp'] for s in sales]
+        self._manifest[key] = {'count': len(sales), 'first': min(timestamps), 'last': max(timestamps)}
+
+    def _read_partition(self, key: str) -> List[Dict]:
+        path = self._partition_file(key)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            return decode_auto(f.read())
+
+    def _load_partition(self, key: str) -> List[Dict]:
+        """Devuelve una partición desde la caché o desde disco."""
+        with self._lock:
+            sales = self._cache.get(key)
+            if sales is None:
+                sales = self._read_partition(key)
+                self._cache[key] = sales
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cached_partitions:
+                self._cache.popitem(last=False)
+            return sales
+
+    def _write_partition(self, key: str, sales: List[Dict]):
+        """Escribe una partición y actualiza su entrada del manifiesto. Requiere `self._lock`."""
+        if sales:
+            self._write_atomic(self._partition_file(key), sales)
+        elif os.path.exists(self._partition_file(key)):
+            os.remove(self._partition_file(key))
+        self._cache.pop(key, None)
+        self._update_manifest_entry(key, sales)
+
+    def _write_all_partitions(self, sales: List[Dict]):
+        """Reemplaza todas las particiones por las ventas dadas. Requiere `self._lock`."""
+        partitions: Dict[str, List[Dict]] = {}
+        for sale in sales:
+            partitions.setdefault(self.partition_key(sale['timestamp']), []).append(sale)
+        for key in set(self._manifest) - set(partitions):
+            self._write_partition(key, [])
+        for key, partition_sales in partitions.items():
+            self._write_partition(key, partition_sales)
+        self._write_manifest()
+
+    def _overlapping_keys(self, start: Optional[str], end: Optional[str]) -> List[str]:
+        """Claves de las particiones cuyo rango [first, last] se solapa con [start, end)."""
+        return [
+            key for key, entry in sorted(self._manifest.items())
+            if (start is None or entry['last'] >= start) and (end is None or entry['first'] < end)
+        ]
+
+    def load_sales(self) -> List[Dict]:
+        """Carga todas las ventas recorriendo las particiones en orden cronológico."""
+        try:
+            sales = list(self.iter_sales())
+            logger.info(f"Ventas cargadas desde {len(self._manifest)} particiones.")
+            return sales
+        except Exception as e:
+            logger.error(f"Error inesperado al cargar las particiones de ventas: {e}")
+            return []
+
+    def iter_sales(self) -> Iterator[Dict]:
+        """Recorre las particiones de una en una."""
+        for key in self._overlapping_keys(None, None):
+            yield from self._load_partition(key)
+
+    def iter_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """Recorre las ventas del rango partición por partición, abriendo solo las que se solapan con él."""
+        for key in self._overlapping_keys(start, end):
+            for sale in self._load_partition(key):
+                if (start is None or sale['timestamp'] >= start) and (end is None or sale['timestamp'] < end):
+                    yield sale
+
+    def load_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """Carga las ventas del rango abriendo solo las particiones que se solapan con él."""
+        try:
+            keys = self._overlapping_keys(start, end)
+            logger.info(f"Consulta de ventas entre {start} y {end}: {len(keys)} particiones.")
+            return [
+                s for key in keys for s in self._load_partition(key)
+                if (start is None or s['timestamp'] >= start) and (end is None or s['timestamp'] < end)
+            ]
+        except Exception as e:
+            logger.error(f"Error al consultar particiones de ventas: {e}")
+            return []
+
+    def save_sales(self, sales: List[Dict]):
+        """Reescribe todas las particiones."""
+        logger.info(f"Intentando guardar {len(sales)} ventas en {self.sales_dir}")
+        try:
+            with self._lock:
+                self._write_all_partitions(sales)
+            logger.info("Ventas guardadas exitosamente.")
+        except IOError as e:
+            logger.error(f"Error de E/S al guardar las particiones de ventas: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error inesperado al guardar las particiones de ventas: {e}")
+            raise
+
+    def append_sale(self, sale: Dict):
+        """Agrega la venta reescribiendo solo la partición de su mes."""
+        self.append_sales([sale])
+
+    def append_sales(self, sales: List[Dict]):
+        """Agrega varias ventas reescribiendo una vez cada partición afectada."""
+        partitions: Dict[str, List[Dict]] = {}
+        for sale in sales:
+            partitions.setdefault(self.partition_key(sale['timestamp']), []).append(sale)
+        try:
+            with self._lock:
+                for key, new_sales in partitions.items():
+                    partition_sales = self._load_partition(key) + new_sales
+                    self._write_partition(key, partition_sales)
+                    self._cache[key] = partition_sales
+                if partitions:
+                    self._write_manifest()
+            logger.info(f"{len(sales)} ventas guardadas en las particiones {sorted(partitions)}.")
+        except IOError as e:
+            logger.error(f"Error de E/S al guardar ventas en las particiones: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error inesperado al guardar ventas en las particiones: {e}")
+            raise
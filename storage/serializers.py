@@ -0,0 +1,90 @@
+import json
+from typing import Any, Callable, Dict, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Primeros bytes con los que msgpack codifica un arreglo o un mapa.
+MSGPACK_MARKERS = set(range(0x80, 0xa0)) | {0xdc, 0xdd, 0xde, 0xdf}
+JSON_WHITESPACE = b' \t\r\n\xef\xbb\xbf'
+
+class Codec:
+    """Serializador con nombre que convierte listas/diccionarios a bytes y viceversa."""
+    def __init__(self, name: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any],
+                 is_json: bool):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+        self.is_json = is_json
+
+    def __repr__(self):
+        return f"Codec({self.name!r})"
+
+_CODECS: Dict[str, Codec] = {}
+
+def register_codec(codec: Codec):
+    """Registra un códec para poder seleccionarlo por nombre."""
+    _CODECS[codec.name] = codec
+
+def get_codec(name: str) -> Codec:
+    """Devuelve un códec registrado; lanza ValueError si no existe o no está instalado."""
+    try:
+        return _CODECS[name]
+    except KeyError:
+        raise ValueError(f"Códec desconocido o no instalado: {name}. Disponibles: {available_codecs()}")
+
+def available_codecs() -> List[str]:
+    return list(_CODECS)
+
+def fastest_codec() -> Codec:
+    """El códec más rápido disponible que sigue produciendo JSON legible."""
+    return _CODECS['orjson'] if 'orjson' in _CODECS else _CODECS['json']
+
+def detect_codec(head: bytes) -> Codec:
+    """
+    Identifica el formato a partir de los primeros bytes de un archivo.
+    Cualquier variante de JSON se decodifica con el lector JSON más rápido instalado.
+    """
+    stripped = head.lstrip(JSON_WHITESPACE)
+    if not stripped:
+        raise ValueError("El archivo está vacío.")
+    if stripped[:1] in (b'[', b'{'):
+        return fastest_codec()
+    if stripped[0] in MSGPACK_MARKERS:
+        if 'msgpack' not in _CODECS:
+            raise ValueError("El archivo está en formato msgpack, pero el paquete msgpack no está instalado.")
+        return _CODECS['msgpack']
+    raise ValueError("Formato de archivo no reconocido.")
+
+def decode_auto(raw: bytes) -> Any:
+    """Decodifica `raw` detectando su formato."""
+    return detect_codec(raw[:64]).decode(raw)
+
+register_codec(Codec(
+    'json-pretty',
+    lambda data: json.dumps(data, indent=4).encode('utf-8'),
+    json.loads,
+    is_json=True
+))
+register_codec(Codec(
+    'json',
+    lambda data: json.dumps(data, separators=(',', ':')).encode('utf-8'),
+    json.loads,
+    is_json=True
+))
+if orjson is not None:
+    register_codec(Codec('orjson', orjson.dumps, orjson.loads, is_json=True))
+if msgpack is not None:
+    register_codec(Codec(
+        'msgpack',
+        lambda data: msgpack.packb(data, use_bin_type=True),
+        lambda raw: msgpack.unpackb(raw, raw=False),
+        is_json=False
+    ))
@@ -0,0 +1,467 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional, Tuple
+from storage.base_storage import BaseStorage
+from storage.journal_storage import JournalStorage
+from utils.logger import get_logger
+
+logger = get_logger()
+
+SCHEMA_VERSION = 5
+SALES_BATCH_SIZE = 500
+MOVEMENTS_BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    cost REAL NOT NULL,
+    price REAL NOT NULL,
+    stock INTEGER NOT NULL,
+    sku TEXT,
+    reorder_threshold INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sales (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    total_revenue REAL NOT NULL,
+    total_cost REAL NOT NULL,
+    total_profit REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sale_items (
+    sale_id TEXT NOT NULL REFERENCES sales(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    cost REAL NOT NULL,
+    subtotal REAL NOT NULL,
+    PRIMARY KEY (sale_id, position)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stock_movements (
+    seq INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    balance INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    reference TEXT
+);
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    seq INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    stock TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku ON products(sku);
+CREATE INDEX IF NOT EXISTS idx_sales_timestamp ON sales(timestamp);
+CREATE INDEX IF NOT EXISTS idx_sale_items_product_id ON sale_items(product_id);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_product_id ON stock_movements(product_id, seq);
+CREATE INDEX IF NOT EXISTS idx_stock_snapshots_timestamp ON stock_snapshots(timestamp);
+"""
+
+PRODUCT_COLUMNS = ("id", "name", "cost", "price", "stock", "sku", "reorder_threshold")
+# Columnas agregadas a `products` después de la versión 1, con su definición y
+# el valor que toman en los productos guardados antes de existir.
+ADDED_PRODUCT_COLUMNS = {
+    "sku": ("TEXT", None),
+    "reorder_threshold": ("INTEGER NOT NULL DEFAULT 0", 0),
+}
+SALE_COLUMNS = ("id", "timestamp", "total_revenue", "total_cost", "total_profit")
+ITEM_COLUMNS = ("product_id", "name", "quantity", "price", "cost", "subtotal")
+MOVEMENT_COLUMNS = ("seq", "timestamp", "product_id", "delta", "balance", "reason", "reference")
+
+class SQLiteStorage(BaseStorage):
+    """
+    Almacenamiento en una base SQLite con tablas indexadas para productos,
+    ventas y líneas de venta. Usa journal WAL, por lo que cada escritura
+    toca solo las filas afectadas en lugar de reescribir archivos completos.
+    Las escrituras de un `batch()` comparten una sola transacción: o se
+    confirman todas o ninguna.
+    """
+    atomic_batches = True
+
+    def __init__(self, data_dir="data", db_name="inventario.db"):
+        self.data_dir = data_dir
+        self.db_file = os.path.join(self.data_dir, db_name)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+            logger.info(f"Directorio de datos creado: {self.data_dir}")
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+
+    def _migrate(self):
+        """Crea el esquema y, en una base nueva, importa los archivos JSON existentes."""
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            with self._conn:
+                if version > 0:
+                    existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(products)")}
+                    for column, (definition, _) in ADDED_PRODUCT_COLUMNS.items():
+                        if column not in existing:
+                            self._conn.execute(f"ALTER TABLE products ADD COLUMN {column} {definition}")
+                self._conn.executescript(SCHEMA)
+            if version == 0:
+                self.import_json(self.data_dir)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            logger.info(f"Esquema SQLite actualizado a la versión {SCHEMA_VERSION}.")
+
+    @contextmanager
+    def _transaction(self):
+        """Abre una transacción, o se une a la del `batch()` abierto en este hilo."""
+        with self._lock:
+            if getattr(self._local, 'in_batch', False):
+                yield
+                return
+            with self._conn:
+                yield
+
+    @contextmanager
+    def batch(self):
+        """Ejecuta las escrituras del bloque en una sola transacción; si algo falla se revierten todas."""
+        if getattr(self._local, 'in_batch', False):
+            yield
+            return
+        with self._lock:
+            self._local.in_batch = True
+            try:
+                with self._conn:
+                    yield
+            finally:
+                self._local.in_batch = False
+
+    def import_json(self, data_dir: str):
+        """Importa products.json y sales.json (incluido su diario) desde `data_dir`."""
+        products_file = os.path.join(data_dir, 'products.json')
+        sales_file = os.path.join(data_dir, 'sales.json')
+        journal_file = os.path.join(data_dir, 'sales.journal.jsonl')
+        if not any(os.path.exists(f) for f in (products_file, sales_file, journal_file)):
+            return
+        json_storage = JournalStorage(data_dir)
+        products = json_storage.load_products()
+        sales = json_storage.load_sales()
+        imported = 0
+        with self._lock, self._conn:
+            for product in products:
+                try:
+                    self._conn.execute("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", self._product_row(product))
+                    imported += 1
+                except sqlite3.IntegrityError as e:
+                    # Un ID o SKU repetido no debe reemplazar al producto ya importado.
+                    logger.warning(f"Producto {product.get('id')} ({product.get('name')}) omitido en la "
+                                   f"migración: su ID o SKU '{product.get('sku')}' ya existe ({e}).")
+            for sale in sales:
+                self._insert_sale(sale)
+        logger.info(f"Migración desde JSON completada: {imported} de {len(products)} productos "
+                    f"y {len(sales)} ventas.")
+
+    @staticmethod
+    def _product_row(product: Dict) -> tuple:
+        # Los productos guardados antes de existir una columna no traen esa clave.
+        return tuple(
+            product[c] if c in product else ADDED_PRODUCT_COLUMNS[c][1]
+            for c in PRODUCT_COLUMNS
+        )
+
+    def _insert_sale(self, sale: Dict):
+        """Inserta una venta y sus líneas. Debe llamarse dentro de una transacción."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sales VALUES (?, ?, ?, ?, ?)",
+            tuple(sale[c] for c in SALE_COLUMNS)
+        )
+        self._conn.execute("DELETE FROM sale_items WHERE sale_id = ?", (sale['id'],))
+        self._conn.executemany(
+            "INSERT INTO sale_items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(sale['id'], position) + tuple(item[c] for c in ITEM_COLUMNS)
+             for position, item in enumerate(sale['items'])]
+        )
+
+    def _build_sales(self, sale_rows: List[sqlite3.Row], item_rows: List[sqlite3.Row]) -> List[Dict]:
+        """Reconstruye los diccionarios de venta a partir de sus filas."""
+        sales = {row['id']: dict({c: row[c] for c in SALE_COLUMNS}, items=[]) for row in sale_rows}
+        for row in item_rows:
+            sale = sales.get(row['sale_id'])
+            if sale is not None:
+                sale['items'].append({c: row[c] for c in ITEM_COLUMNS})
+        return list(sales.values())
+
+    def load_products(self) -> List[Dict]:
+        """Carga productos de la tabla `products`."""
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT * FROM products ORDER BY rowid").fetchall()
+            logger.info("Productos cargados exitosamente.")
+            return [dict(row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al cargar productos: {e}")
+            return []
+
+    def save_products(self, products: List[Dict]):
+        """Reemplaza el catálogo completo en una sola transacción."""
+        logger.info(f"Intentando guardar {len(products)} productos en {self.db_file}")
+        try:
+            with self._transaction():
+                self._conn.execute("DELETE FROM products")
+                self._conn.executemany(
+                    "INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._product_row(p) for p in products]
+                )
+            logger.info("Productos guardados exitosamente.")
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar productos: {e}")
+            raise
+
+    def apply_product_changes(self, upserts: Optional[List[Dict]] = None,
+                              deletes: Optional[List[str]] = None,
+                              stock_deltas: Optional[Dict[str, int]] = None):
+        """Aplica los cambios fila por fila dentro de una única transacción."""
+        try:
+            with self._transaction():
+                self._conn.executemany(
+                    "INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, cost = excluded.cost, "
+                    "price = excluded.price, stock = excluded.stock, sku = excluded.sku, "
+                    "reorder_threshold = excluded.reorder_threshold",
+                    [self._product_row(p) for p in upserts or []]
+                )
+                self._conn.executemany(
+                    "DELETE FROM products WHERE id = ?",
+                    [(product_id,) for product_id in deletes or []]
+                )
+                self._conn.executemany(
+                    "UPDATE products SET stock = stock + ? WHERE id = ?",
+                    [(delta, product_id) for product_id, delta in (stock_deltas or {}).items()]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al aplicar cambios de productos: {e}")
+            raise
+
+    def load_sales(self) -> List[Dict]:
+        """Carga todas las ventas con sus líneas."""
+        return self.load_sales_range()
+
+    def load_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """Carga las ventas con `start <= timestamp < end`, filtrando con el índice de fechas."""
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        try:
+            with self._lock:
+                sale_rows = self._conn.execute(
+                    f"SELECT * FROM sales {where} ORDER BY rowid", params
+                ).fetchall()
+                item_rows = self._conn.execute(
+                    f"SELECT * FROM sale_items WHERE sale_id IN (SELECT id FROM sales {where}) "
+                    "ORDER BY sale_id, position", params
+                ).fetchall()
+            logger.info(f"Ventas cargadas exitosamente: {len(sale_rows)}.")
+            return self._build_sales(sale_rows, item_rows)
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al cargar ventas: {e}")
+            return []
+
+    def iter_sales(self) -> Iterator[Dict]:
+        """Recorre las ventas por lotes de `SALES_BATCH_SIZE`, sin cargar el historial completo."""
+        return self.iter_sales_range()
+
+    def iter_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """Recorre por lotes las ventas con `start <= timestamp < end`, filtrando con el índice de fechas."""
+        conditions, params = ["rowid > ?"], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        query = f"SELECT rowid, * FROM sales WHERE {' AND '.join(conditions)} ORDER BY rowid LIMIT ?"
+        last_rowid = 0
+        while True:
+            try:
+                with self._lock:
+                    sale_rows = self._conn.execute(
+                        query, [last_rowid, *params, SALES_BATCH_SIZE]
+                    ).fetchall()
+                    if not sale_rows:
+                        return
+                    ids = [row['id'] for row in sale_rows]
+                    item_rows = self._conn.execute(
+                        f"SELECT * FROM sale_items WHERE sale_id IN ({', '.join('?' * len(ids))}) "
+                        "ORDER BY sale_id, position", ids
+                    ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Error de SQLite al recorrer ventas: {e}")
+                return
+            last_rowid = sale_rows[-1]['rowid']
+            yield from self._build_sales(sale_rows, item_rows)
+
+    def iter_sale_index(self) -> Iterator[Tuple[str, str]]:
+        """Recorre los pares (id, timestamp) sin leer las líneas de venta."""
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT id, timestamp FROM sales ORDER BY rowid").fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al leer el índice de ventas: {e}")
+            return
+        for row in rows:
+            yield row['id'], row['timestamp']
+
+    def load_sale(self, sale_id: str) -> Optional[Dict]:
+        """Carga una venta por su clave primaria."""
+        try:
+            with self._lock:
+                sale_rows = self._conn.execute("SELECT * FROM sales WHERE id = ?", (sale_id,)).fetchall()
+                item_rows = self._conn.execute(
+                    "SELECT * FROM sale_items WHERE sale_id = ? ORDER BY position", (sale_id,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al cargar la venta {sale_id}: {e}")
+            return None
+        sales = self._build_sales(sale_rows, item_rows)
+        return sales[0] if sales else None
+
+    def save_sales(self, sales: List[Dict]):
+        """Reemplaza el historial de ventas completo en una sola transacción."""
+        logger.info(f"Intentando guardar {len(sales)} ventas en {self.db_file}")
+        try:
+            with self._transaction():
+                self._conn.execute("DELETE FROM sale_items")
+                self._conn.execute("DELETE FROM sales")
+                for sale in sales:
+                    self._insert_sale(sale)
+            logger.info("Ventas guardadas exitosamente.")
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar ventas: {e}")
+            raise
+
+    def append_sale(self, sale: Dict):
+        """Inserta únicamente las filas de la venta nueva."""
+        try:
+            with self._transaction():
+                self._insert_sale(sale)
+            logger.info(f"Venta {sale['id']} guardada.")
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar la venta {sale['id']}: {e}")
+            raise
+
+    def append_sales(self, sales: List[Dict]):
+        """Inserta varias ventas nuevas en una sola transacción."""
+        try:
+            with self._transaction():
+                for sale in sales:
+                    self._insert_sale(sale)
+            logger.info(f"{len(sales)} ventas guardadas.")
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar {len(sales)} ventas: {e}")
+            raise
+
+    def load_aggregates(self) -> Optional[Dict]:
+        """Carga los agregados de ventas guardados en la tabla `meta`."""
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM meta WHERE key = 'aggregates'").fetchone()
+            return json.loads(row['value']) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error al leer los agregados de ventas: {e}")
+            return None
+
+    def save_aggregates(self, aggregates: Dict):
+        """Guarda los agregados de ventas en la tabla `meta`."""
+        try:
+            with self._transaction():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('aggregates', ?)",
+                    (json.dumps(aggregates),)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar los agregados de ventas: {e}")
+
+    def append_stock_movements(self, movements: List[Dict]):
+        """Inserta los movimientos del libro de stock en una sola transacción."""
+        if not movements:
+            return
+        try:
+            with self._transaction():
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO stock_movements VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [tuple(m.get(column) for column in MOVEMENT_COLUMNS) for m in movements]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar {len(movements)} movimientos de stock: {e}")
+            raise
+
+    def iter_stock_movements(self, after_seq: int = 0, product_id: Optional[str] = None) -> Iterator[Dict]:
+        """Recorre los movimientos por lotes de `MOVEMENTS_BATCH_SIZE` usando la clave `seq`."""
+        query = "SELECT * FROM stock_movements WHERE seq > ?"
+        params = []
+        if product_id is not None:
+            query += " AND product_id = ?"
+            params.append(product_id)
+        query += " ORDER BY seq LIMIT ?"
+        last_seq = after_seq
+        while True:
+            try:
+                with self._lock:
+                    rows = self._conn.execute(query, [last_seq, *params, MOVEMENTS_BATCH_SIZE]).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Error de SQLite al recorrer los movimientos de stock: {e}")
+                return
+            if not rows:
+                return
+            last_seq = rows[-1]['seq']
+            for row in rows:
+                yield dict(row)
+
+    def save_stock_snapshot(self, snapshot: Dict):
+        """Guarda una instantánea del stock como JSON en `stock_snapshots`."""
+        try:
+            with self._transaction():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO stock_snapshots VALUES (?, ?, ?)",
+                    (snapshot['seq'], snapshot['timestamp'], json.dumps(snapshot['stock']))
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error de SQLite al guardar la instantánea de stock: {e}")
+
+    def load_stock_snapshot(self, before: Optional[str] = None) -> Optional[Dict]:
+        """Busca la instantánea con el índice de fechas."""
+        query = "SELECT * FROM stock_snapshots"
+        params = []
+        if before is not None:
+            query += " WHERE timestamp <= ?"
+            params.append(before)
+        query += " ORDER BY seq DESC LIMIT 1"
+        try:
+            with self._lock:
+                row = self._conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            return {'seq': row['seq'], 'timestamp': row['timestamp'], 'stock': json.loads(row['stock'])}
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error al leer la instantánea de stock: {e}")
+            return None
+
+    def close(self):
+        """Cierra la conexión con la base de datos."""
+        super().close()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,331 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional, Tuple
+from storage.base_storage import BaseStorage
+from storage.serializers import fastest_codec
+from utils.file_utils import open_for_append
+from utils.logger import get_logger
+
+logger = get_logger()
+
+class WALStorage(BaseStorage):
+    """
+    Envoltorio con log de escritura anticipada (write-ahead log) sobre otro
+    `BaseStorage`. Cada operación lógica se agrega y sincroniza en `wal.log`
+    antes de aplicarse en memoria; el almacenamiento interno solo se actualiza
+    en los puntos de control (checkpoints), cada `checkpoint_every` registros,
+    de modo que una operación cuesta una escritura pequeña en lugar de
+    reescribir archivos completos.
+
+    Los registros son idempotentes (los ajustes de stock se guardan como el
+    estado final del producto), así que al arrancar basta con reproducir el
+    log posterior al último checkpoint. Las escrituras hechas dentro de
+    `batch()` se guardan en un único registro: o se aplican todas o ninguna.
+
+    El log se guarda en `data_dir`; por defecto, el directorio de datos del
+    almacenamiento interno.
+    """
+    atomic_batches = True
+
+    def __init__(self, inner: BaseStorage, data_dir: Optional[str] = None, checkpoint_every: int = 1000):
+        self.inner = inner
+        if data_dir is None:
+            data_dir = getattr(inner, 'data_dir', "data")
+        self.wal_file = os.path.join(data_dir, 'wal.log')
+        self.checkpoint_file = f"{self.wal_file}.checkpoint"
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.RLock()
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint_thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._records_since_checkpoint = 0
+        self._products: Dict[str, Dict] = {}
+        # Ventas registradas en el log que aún no están en el almacenamiento interno.
+        self._pending_sales: Dict[str, Dict] = {}
+        self._checkpointing_sales: Dict[str, Dict] = {}
+        # Lo mismo para los movimientos del libro de stock, por `seq`.
+        self._pending_movements: Dict[int, Dict] = {}
+        self._checkpointing_movements: Dict[int, Dict] = {}
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        self._recover()
+
+    def _read_log(self, path: str) -> List[List[Dict]]:
+        """Lee las operaciones de un segmento del log, omitiendo los registros dañados (p. ej. truncados)."""
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, 'rb') as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    records.append(fastest_codec().decode(line)['ops'])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Registro inválido en {path}, línea {line_number}. Se omite.")
+        return records
+
+    def _recover(self):
+        """Carga el estado del almacenamiento interno y reproduce el log pendiente."""
+        self._products = {p['id']: p for p in self.inner.load_products()}
+        interrupted = self._read_log(self.checkpoint_file)
+        live = self._read_log(self.wal_file)
+        if interrupted:
+            # Un checkpoint interrumpido pudo haber llegado a guardar algunas ventas.
+            applied = {sale_id for sale_id, _ in self.inner.iter_sale_index()}
+            seqs = [op['movement']['seq'] for ops in interrupted for op in ops if op['op'] == 'stock_movement']
+            applied_movements = {m['seq'] for m in self.inner.iter_stock_movements(min(seqs) - 1)} if seqs else set()
+            for ops in interrupted:
+                self._apply(ops, skip_sales=applied, skip_movements=applied_movements)
+        for ops in live:
+            self._apply(ops)
+        if interrupted or live:
+            logger.info(f"Log de escritura anticipada reproducido: {len(interrupted) + len(live)} registros.")
+            self.checkpoint()
+
+    def _apply(self, ops: List[Dict], skip_sales=(), skip_movements=()):
+        """Aplica operaciones ya resueltas al estado en memoria. Requiere `self._lock`."""
+        for op in ops:
+            if op['op'] == 'upsert_product':
+                self._products[op['product']['id']] = op['product']
+            elif op['op'] == 'delete_product':
+                self._products.pop(op['id'], None)
+            elif op['op'] == 'append_sale' and op['sale']['id'] not in skip_sales:
+                self._pending_sales[op['sale']['id']] = op['sale']
+            elif op['op'] == 'stock_movement' and op['movement']['seq'] not in skip_movements:
+                self._pending_movements[op['movement']['seq']] = op['movement']
+
+    def _resolve(self, ops: List[Dict]) -> List[Dict]:
+        """Convierte los ajustes de stock en el estado final de cada producto. Requiere `self._lock`."""
+        overlay: Dict[str, Optional[Dict]] = {}
+        resolved = []
+        for op in ops:
+            if op['op'] == 'stock_delta':
+                product = overlay[op['id']] if op['id'] in overlay else self._products.get(op['id'])
+                if product is None:
+                    continue
+                product = dict(product, stock=product['stock'] + op['delta'])
+                overlay[op['id']] = product
+                resolved.append({'op': 'upsert_product', 'product': product})
+            else:
+                if op['op'] == 'upsert_product':
+                    overlay[op['product']['id']] = op['product']
+                elif op['op'] == 'delete_product':
+                    overlay[op['id']] = None
+                resolved.append(op)
+        return resolved
+
+    def _submit(self, ops: List[Dict]):
+        """Registra y aplica operaciones, o las acumula si hay un `batch()` abierto en este hilo."""
+        pending = getattr(self._local, 'ops', None)
+        if pending is not None:
+            pending.extend(ops)
+            return
+        self._commit(ops)
+
+    def _commit(self, ops: List[Dict]):
+        if not ops:
+            return
+        with self._lock:
+            resolved = self._resolve(ops)
+            try:
+                with open_for_append(self.wal_file) as f:
+                    f.write(fastest_codec().encode({'ops': resolved}) + b'\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except IOError as e:
+                logger.error(f"Error de E/S al escribir en el log de escritura anticipada: {e}")
+                raise
+            self._apply(resolved)
+            self._records_since_checkpoint += 1
+            if self._records_since_checkpoint >= self.checkpoint_every:
+                self._start_checkpoint()
+
+    @contextmanager
+    def batch(self):
+        """Agrupa las escrituras del bloque en un único registro atómico del log."""
+        if getattr(self._local, 'ops', None) is not None:
+            yield
+            return
+        self._local.ops = []
+        try:
+            yield
+            ops = self._local.ops
+        finally:
+            self._local.ops = None
+        self._commit(ops)
+
+    def _start_checkpoint(self):
+        if self._checkpoint_thread is not None and self._checkpoint_thread.is_alive():
+            return
+        self._checkpoint_thread = threading.Thread(target=self.checkpoint, name="wal-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+
+    def checkpoint(self):
+        """Vuelca el estado al almacenamiento interno y descarta el log ya aplicado."""
+        with self._checkpoint_lock:
+            with self._lock:
+                if os.path.exists(self.wal_file):
+                    if os.path.exists(self.checkpoint_file):
+                        # Un checkpoint previo no terminó: se une al segmento pendiente.
+                        with open(self.wal_file, 'rb') as src, open_for_append(self.checkpoint_file) as dst:
+                            dst.write(src.read())
+                        os.remove(self.wal_file)
+                    else:
+                        os.replace(self.wal_file, self.checkpoint_file)
+                if not os.path.exists(self.checkpoint_file):
+                    return
+                products = [dict(p) for p in self._products.values()]
+                sales = list(self._pending_sales.values())
+                self._checkpointing_sales.update(self._pending_sales)
+                self._pending_sales = {}
+                movements = [self._pending_movements[seq] for seq in sorted(self._pending_movements)]
+                self._checkpointing_movements.update(self._pending_movements)
+                self._pending_movements = {}
+                self._records_since_checkpoint = 0
+            try:
+                with self.inner.batch():
+                    self.inner.save_products(products)
+                    self.inner.append_sales(sales)
+                    self.inner.append_stock_movements(movements)
+                self.inner.flush()
+            except Exception as e:
+                logger.error(f"Error durante el checkpoint; el log se conserva para reintentar: {e}")
+                with self._lock:
+                    self._checkpointing_sales.update(self._pending_sales)
+                    self._pending_sales = self._checkpointing_sales
+                    self._checkpointing_sales = {}
+                    self._checkpointing_movements.update(self._pending_movements)
+                    self._pending_movements = self._checkpointing_movements
+                    self._checkpointing_movements = {}
+                return
+            with self._lock:
+                os.remove(self.checkpoint_file)
+                self._checkpointing_sales = {}
+                self._checkpointing_movements = {}
+            logger.info(f"Checkpoint completado: {len(products)} productos y {len(sales)} ventas nuevas.")
+
+    def _unsaved_sales(self) -> Dict[str, Dict]:
+        """Ventas que todavía no están en el almacenamiento interno."""
+        with self._lock:
+            sales = dict(self._checkpointing_sales)
+            sales.update(self._pending_sales)
+            return sales
+
+    def load_products(self) -> List[Dict]:
+        with self._lock:
+            return [dict(p) for p in self._products.values()]
+
+    def save_products(self, products: List[Dict]):
+        """Reemplaza el catálogo completo y lo consolida de inmediato con un checkpoint."""
+        with self._lock:
+            removed = set(self._products) - {p['id'] for p in products}
+            ops = [{'op': 'delete_product', 'id': product_id} for product_id in removed]
+            ops += [{'op': 'upsert_product', 'product': dict(p)} for p in products]
+            self._commit(ops)
+        self.checkpoint()
+
+    def apply_product_changes(self, upserts: Optional[List[Dict]] = None,
+                              deletes: Optional[List[str]] = None,
+                              stock_deltas: Optional[Dict[str, int]] = None):
+        ops = [{'op': 'upsert_product', 'product': dict(p)} for p in upserts or []]
+        ops += [{'op': 'delete_product', 'id': product_id} for product_id in deletes or []]
+        ops += [{'op': 'stock_delta', 'id': product_id, 'delta': delta}
+                for product_id, delta in (stock_deltas or {}).items()]
+        self._submit(ops)
+
+    def iter_sales(self) -> Iterator[Dict]:
+        unsaved = self._unsaved_sales()
+        for sale in self.inner.iter_sales():
+            unsaved.pop(sale['id'], None)
+            yield sale
+        yield from unsaved.values()
+
+    def iter_sale_index(self) -> Iterator[Tuple[str, str]]:
+        unsaved = self._unsaved_sales()
+        for sale_id, timestamp in self.inner.iter_sale_index():
+            unsaved.pop(sale_id, None)
+            yield sale_id, timestamp
+        for sale in unsaved.values():
+            yield sale['id'], sale['timestamp']
+
+    def iter_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        unsaved = self._unsaved_sales()
+        for sale in self.inner.iter_sales_range(start, end):
+            unsaved.pop(sale['id'], None)
+            yield sale
+        for sale in unsaved.values():
+            if (start is None or sale['timestamp'] >= start) and (end is None or sale['timestamp'] < end):
+                yield sale
+
+    def load_sales(self) -> List[Dict]:
+        return list(self.iter_sales())
+
+    def load_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        unsaved = self._unsaved_sales()
+        sales = self.inner.load_sales_range(start, end)
+        for sale in sales:
+            unsaved.pop(sale['id'], None)
+        return sales + [
+            s for s in unsaved.values()
+            if (start is None or s['timestamp'] >= start) and (end is None or s['timestamp'] < end)
+        ]
+
+    def load_sale(self, sale_id: str) -> Optional[Dict]:
+        sale = self._unsaved_sales().get(sale_id)
+        return sale if sale is not None else self.inner.load_sale(sale_id)
+
+    def save_sales(self, sales: List[Dict]):
+        """Reemplaza el historial completo tras consolidar el log pendiente."""
+        self.checkpoint()
+        with self._checkpoint_lock:
+            self.inner.save_sales(sales)
+
+    def append_sale(self, sale: Dict):
+        self._submit([{'op': 'append_sale', 'sale': sale}])
+
+    def append_sales(self, sales: List[Dict]):
+        self._submit([{'op': 'append_sale', 'sale': sale} for sale in sales])
+
+    def load_aggregates(self) -> Optional[Dict]:
+        return self.inner.load_aggregates()
+
+    def append_stock_movements(self, movements: List[Dict]):
+        self._submit([{'op': 'stock_movement', 'movement': m} for m in movements])
+
+    def iter_stock_movements(self, after_seq: int = 0, product_id: Optional[str] = None) -> Iterator[Dict]:
+        with self._lock:
+            unsaved = dict(self._checkpointing_movements)
+            unsaved.update(self._pending_movements)
+        for movement in self.inner.iter_stock_movements(after_seq, product_id):
+            unsaved.pop(movement['seq'], None)
+            yield movement
+        for seq in sorted(unsaved):
+            movement = unsaved[seq]
+            if seq > after_seq and (product_id is None or movement['product_id'] == product_id):
+                yield movement
+
+    def save_stock_snapshot(self, snapshot: Dict):
+        """
+        Las instantáneas son completas por sí mismas y no pasan por el log:
+        si se pierde una, el libro se reconstruye desde la anterior.
+        """
+        self.inner.save_stock_snapshot(snapshot)
+
+    def load_stock_snapshot(self, before: Optional[str] = None) -> Optional[Dict]:
+        return self.inner.load_stock_snapshot(before)
+
+    def save_aggregates(self, aggregates: Dict):
+        """
+        Los agregados se derivan del historial y no pasan por el log: si quedan
+        desfasados tras un corte, `SalesService` los pone al día al iniciar.
+        """
+        self.inner.save_aggregates(aggregates)
+
+    def close(self):
+        """Espera al checkpoint en curso, consolida el log y cierra el almacenamiento interno."""
+        thread = self._checkpoint_thread
+        if thread is not None:
+            thread.join()
+        super().close()
+        self.checkpoint()
+        self.inner.close()
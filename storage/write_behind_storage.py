@@ -0,0 +1,309 @@
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Iterator, Optional, Tuple
+from storage.base_storage import BaseStorage
+from utils.logger import get_logger
+
+logger = get_logger()
+
+class WriteBehindStorage(BaseStorage):
+    """
+    Envoltorio de escritura diferida sobre otro `BaseStorage`.
+    Las escrituras solo se encolan en memoria y regresan de inmediato; un hilo
+    en segundo plano agrupa las ráfagas de cambios y las vuelca al almacenamiento
+    interno como máximo una vez por `flush_interval` segundos.
+    Las lecturas vacían la cola antes de delegar, por lo que siempre ven los
+    cambios más recientes. Las escrituras de un `batch()` se encolan juntas y
+    llegan al almacenamiento interno en el mismo volcado.
+    """
+    def __init__(self, inner: BaseStorage, flush_interval: float = 1.0):
+        self.inner = inner
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        self._local = threading.local()
+        self._reset_pending()
+        self._worker = threading.Thread(target=self._run, name="write-behind-flush", daemon=True)
+        self._worker.start()
+
+    def _reset_pending(self):
+        """Descarta el estado pendiente. Requiere `self._lock` salvo en el constructor."""
+        self._pending_products: Optional[List[Dict]] = None
+        self._product_upserts: Dict[str, Dict] = {}
+        self._product_deletes: List[str] = []
+        self._stock_deltas: Dict[str, int] = {}
+        self._pending_sales: Optional[List[Dict]] = None
+        self._appended_sales: List[Dict] = []
+        self._pending_aggregates: Optional[Dict] = None
+        self._pending_movements: List[Dict] = []
+        self._pending_snapshots: List[Dict] = []
+
+    def _mark_dirty(self):
+        self._dirty.set()
+
+    def _enqueue(self, queue, *args):
+        """Encola un cambio con `queue(*args)`, o lo acumula si hay un `batch()` abierto en este hilo."""
+        pending = getattr(self._local, 'ops', None)
+        if pending is not None:
+            pending.append((queue, args))
+            return
+        with self._lock:
+            queue(*args)
+        self._mark_dirty()
+
+    @contextmanager
+    def batch(self):
+        """Encola las escrituras del bloque de una sola vez, para que ningún volcado las separe."""
+        if getattr(self._local, 'ops', None) is not None:
+            yield
+            return
+        self._local.ops = []
+        try:
+            yield
+            ops = self._local.ops
+        finally:
+            self._local.ops = None
+        if not ops:
+            return
+        with self._lock:
+            for queue, args in ops:
+                queue(*args)
+        self._mark_dirty()
+
+    def _run(self):
+        """Bucle del hilo: espera cambios, deja pasar el intervalo y vuelca una sola vez."""
+        while not self._closed.is_set():
+            self._dirty.wait()
+            # Las escrituras que lleguen durante el intervalo se agrupan en el mismo volcado.
+            self._closed.wait(self.flush_interval)
+            self.flush()
+
+    def load_products(self) -> List[Dict]:
+        self.flush()
+        return self.inner.load_products()
+
+    def save_products(self, products: List[Dict]):
+        self._enqueue(self._queue_products, [dict(p) for p in products])
+
+    def _queue_products(self, products: List[Dict]):
+        """Requiere `self._lock`."""
+        self._pending_products = products
+        self._product_upserts.clear()
+        self._product_deletes.clear()
+        self._stock_deltas.clear()
+
+    def apply_product_changes(self, upserts: Optional[List[Dict]] = None,
+                              deletes: Optional[List[str]] = None,
+                              stock_deltas: Optional[Dict[str, int]] = None):
+        """Fusiona los cambios con los pendientes: el último estado de cada producto prevalece."""
+        self._enqueue(self._queue_product_changes, upserts, deletes, stock_deltas)
+
+    def _queue_product_changes(self, upserts: Optional[List[Dict]], deletes: Optional[List[str]],
+                               stock_deltas: Optional[Dict[str, int]]):
+        """Requiere `self._lock`."""
+        if self._pending_products is not None:
+            products = {p['id']: p for p in self._pending_products}
+            self._merge_product_changes(products, upserts, deletes, stock_deltas)
+            self._pending_products = list(products.values())
+            return
+        for product in upserts or []:
+            self._product_upserts[product['id']] = dict(product)
+            self._stock_deltas.pop(product['id'], None)
+            if product['id'] in self._product_deletes:
+                self._product_deletes.remove(product['id'])
+        for product_id in deletes or []:
+            self._product_upserts.pop(product_id, None)
+            self._stock_deltas.pop(product_id, None)
+            if product_id not in self._product_deletes:
+                self._product_deletes.append(product_id)
+        for product_id, delta in (stock_deltas or {}).items():
+            if product_id in self._product_upserts:
+                self._product_upserts[product_id]['stock'] += delta
+            elif product_id not in self._product_deletes:
+                self._stock_deltas[product_id] = self._stock_deltas.get(product_id, 0) + delta
+
+    def load_sales(self) -> List[Dict]:
+        self.flush()
+        return self.inner.load_sales()
+
+    def load_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        self.flush()
+        return self.inner.load_sales_range(start, end)
+
+    def iter_sales(self) -> Iterator[Dict]:
+        self.flush()
+        yield from self.inner.iter_sales()
+
+    def iter_sales_range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        self.flush()
+        yield from self.inner.iter_sales_range(start, end)
+
+    def iter_sale_index(self) -> Iterator[Tuple[str, str]]:
+        self.flush()
+        yield from self.inner.iter_sale_index()
+
+    def load_sale(self, sale_id: str) -> Optional[Dict]:
+        self.flush()
+        return self.inner.load_sale(sale_id)
+
+    def save_sales(self, sales: List[Dict]):
+        self._enqueue(self._queue_sales_snapshot, list(sales))
+
+    def _queue_sales_snapshot(self, sales: List[Dict]):
+        """Requiere `self._lock`."""
+        self._pending_sales = sales
+        self._appended_sales.clear()
+
+    def append_sale(self, sale: Dict):
+        self.append_sales([sale])
+
+    def append_sales(self, sales: List[Dict]):
+        self._enqueue(self._queue_sales, list(sales))
+
+    def _queue_sales(self, sales: List[Dict]):
+        """Requiere `self._lock`."""
+        if self._pending_sales is not None:
+            self._pending_sales.extend(sales)
+        else:
+            self._appended_sales.extend(sales)
+
+    def load_aggregates(self) -> Optional[Dict]:
+        self.flush()
+        return self.inner.load_aggregates()
+
+    def save_aggregates(self, aggregates: Dict):
+        self._enqueue(self._queue_aggregates, aggregates)
+
+    def _queue_aggregates(self, aggregates: Dict):
+        """Requiere `self._lock`."""
+        self._pending_aggregates = aggregates
+
+    def append_stock_movements(self, movements: List[Dict]):
+        self._enqueue(self._queue_movements, list(movements))
+
+    def _queue_movements(self, movements: List[Dict]):
+        """Requiere `self._lock`."""
+        self._pending_movements.extend(movements)
+
+    def iter_stock_movements(self, after_seq: int = 0, product_id: Optional[str] = None) -> Iterator[Dict]:
+        self.flush()
+        yield from self.inner.iter_stock_movements(after_seq, product_id)
+
+    def save_stock_snapshot(self, snapshot: Dict):
+        self._enqueue(self._queue_snapshot, snapshot)
+
+    def _queue_snapshot(self, snapshot: Dict):
+        """Requiere `self._lock`."""
+        self._pending_snapshots.append(snapshot)
+
+    def load_stock_snapshot(self, before: Optional[str] = None) -> Optional[Dict]:
+        self.flush()
+        return self.inner.load_stock_snapshot(before)
+
+    def flush(self):
+        """Vuelca al almacenamiento interno todos los cambios pendientes."""
+        with self._flush_lock:
+            with self._lock:
+                self._dirty.clear()
+                products = self._pending_products
+                upserts = list(self._product_upserts.values())
+                deletes = list(self._product_deletes)
+                stock_deltas = dict(self._stock_deltas)
+                sales = self._pending_sales
+                appended_sales = list(self._appended_sales)
+                aggregates = self._pending_aggregates
+                movements = self._pending_movements
+                snapshots = self._pending_snapshots
+                self._reset_pending()
+
+            if products is None and not (upserts or deletes or stock_deltas) and sales is None \
+                    and not appended_sales and aggregates is None and not movements and not snapshots:
+                return
+            changed, appended = len(upserts) + len(deletes) + len(stock_deltas), len(appended_sales)
+            taken = (products, upserts, deletes, stock_deltas, sales, appended_sales,
+                     aggregates, movements, snapshots)
+            # Cada paso que termina se descarta de lo tomado, para que un error
+            # devuelva a la cola solo lo que no llegó al almacenamiento interno.
+            try:
+                with self.inner.batch():
+                    if products is not None:
+                        self.inner.save_products(products)
+                        products = None
+                    if upserts or deletes or stock_deltas:
+                        self.inner.apply_product_changes(upserts, deletes, stock_deltas)
+                        upserts, deletes, stock_deltas = [], [], {}
+                    if sales is not None:
+                        self.inner.save_sales(sales)
+                        sales = None
+                    if appended_sales:
+                        self.inner.append_sales(appended_sales)
+                        appended_sales = []
+                    if aggregates is not None:
+                        self.inner.save_aggregates(aggregates)
+                        aggregates = None
+                    self.inner.append_stock_movements(movements)
+                    movements = []
+                    while snapshots:
+                        self.inner.save_stock_snapshot(snapshots[0])
+                        snapshots = snapshots[1:]
+                logger.info(
+                    f"Escritura diferida: {changed} cambios de productos y {appended} ventas nuevas volcadas."
+                )
+            except Exception as e:
+                logger.error(f"Error al volcar la escritura diferida; los cambios se reintentarán: {e}")
+                if self.inner.atomic_batches:
+                    # El almacenamiento interno descartó el lote completo, también los pasos ya hechos.
+                    self._requeue(*taken)
+                else:
+                    self._requeue(products, upserts, deletes, stock_deltas, sales, appended_sales,
+                                  aggregates, movements, snapshots)
+
+    def _requeue(self, products: Optional[List[Dict]], upserts: List[Dict], deletes: List[str],
+                 stock_deltas: Dict[str, int], sales: Optional[List[Dict]], appended_sales: List[Dict],
+                 aggregates: Optional[Dict], movements: List[Dict], snapshots: List[Dict]):
+        """
+        Devuelve a la cola los cambios de un volcado fallido, delante de los que
+        se encolaron mientras tanto (que prevalecen sobre ellos).
+        """
+        with self._lock:
+            newer_products = self._pending_products
+            newer_upserts = list(self._product_upserts.values())
+            newer_deletes = list(self._product_deletes)
+            newer_deltas = dict(self._stock_deltas)
+            newer_sales = self._pending_sales
+            newer_appended = list(self._appended_sales)
+            newer_aggregates = self._pending_aggregates
+            newer_movements = self._pending_movements
+            newer_snapshots = self._pending_snapshots
+            self._reset_pending()
+
+            self._pending_products = products
+            self._queue_product_changes(upserts, deletes, stock_deltas)
+            if newer_products is not None:
+                self._pending_products = newer_products
+                self._product_upserts.clear()
+                self._product_deletes.clear()
+                self._stock_deltas.clear()
+            self._queue_product_changes(newer_upserts, newer_deletes, newer_deltas)
+
+            self._pending_sales = sales
+            self._appended_sales = list(appended_sales)
+            if newer_sales is not None:
+                self._pending_sales = newer_sales
+                self._appended_sales = []
+            self._queue_sales(newer_appended)
+
+            self._pending_aggregates = newer_aggregates if newer_aggregates is not None else aggregates
+            self._pending_movements = movements + newer_movements
+            self._pending_snapshots = snapshots + newer_snapshots
+        self._mark_dirty()
+
+    def close(self):
+        """Detiene el hilo, vacía la cola y cierra el almacenamiento interno."""
+        self._closed.set()
+        self._dirty.set()
+        self._worker.join()
+        super().close()
+        self.inner.close()
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+from storage.json_storage import JSONStorage
+
+def io_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('JSONStorage-io')]
+
+def test_async_writes_run_in_order_on_one_io_thread(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    products = [{'id': f'p{i}', 'name': f'Producto {i}', 'cost': 1.0, 'price': 2.0, 'stock': i,
+                 'sku': None, 'reorder_threshold': 0} for i in range(3)]
+
+    async def run():
+        for i in range(1, 4):
+            await storage.save_products_async(products[:i])
+        return await storage.run_async(threading.current_thread)
+    io_thread = asyncio.run(run())
+    assert io_thread is not threading.current_thread()
+    assert [p['id'] for p in storage.load_products()] == ['p0', 'p1', 'p2']
+    storage.close()
+
+def test_close_waits_for_queued_writes_and_stops_io_thread(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    release = threading.Event()
+    storage._io_executor().submit(release.wait)
+    future = storage._io_executor().submit(storage.upsert_product, {
+        'id': 'p1', 'name': 'Producto 1', 'cost': 1.0, 'price': 2.0, 'stock': 5,
+        'sku': None, 'reorder_threshold': 0,
+    })
+    threading.Timer(0.05, release.set).start()
+    storage.close()
+    assert future.done()
+    assert not io_threads()
+    assert [p['id'] for p in JSONStorage(str(tmp_path)).load_products()] == ['p1']
@@ -0,0 +1,67 @@
+import os
+import pytest
+from storage.journal_storage import JournalStorage
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto 1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+def test_appends_without_rewriting_snapshot(tmp_path):
+    storage = JournalStorage(str(tmp_path), compact_threshold=100)
+    storage.save_sales([sale('s1', '2024-01-01T10:00:00')])
+    snapshot_mtime = os.stat(storage.sales_file).st_mtime_ns
+    storage.append_sale(sale('s2', '2024-01-02T10:00:00'))
+    assert os.stat(storage.sales_file).st_mtime_ns == snapshot_mtime
+    assert [s['id'] for s in JournalStorage(str(tmp_path)).load_sales()] == ['s1', 's2']
+
+def test_compaction_merges_journal_into_snapshot(tmp_path):
+    storage = JournalStorage(str(tmp_path), compact_threshold=3)
+    storage.append_sales([sale(f's{i}', f'2024-01-0{i + 1}T10:00:00') for i in range(3)])
+    storage.close()
+    assert not os.path.exists(storage.journal_file)
+    assert not os.path.exists(storage.compacting_file)
+    assert [s['id'] for s in storage._read_snapshot()] == ['s0', 's1', 's2']
+
+def test_resumes_interrupted_compaction(tmp_path):
+    storage = JournalStorage(str(tmp_path), compact_threshold=100)
+    storage.append_sales([sale('s1', '2024-01-01T10:00:00'), sale('s2', '2024-01-02T10:00:00')])
+    # Corte después de rotar el diario y antes de reemplazar la instantánea.
+    os.replace(storage.journal_file, storage.compacting_file)
+
+    restarted = JournalStorage(str(tmp_path), compact_threshold=100)
+    restarted.close()
+    assert not os.path.exists(restarted.compacting_file)
+    assert [s['id'] for s in restarted.load_sales()] == ['s1', 's2']
+
+def test_torn_tail_is_not_glued_to_next_sale(tmp_path):
+    storage = JournalStorage(str(tmp_path), compact_threshold=100)
+    storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    with open(storage.journal_file, 'ab') as f:
+        f.write(b'{"id": "s2", "timest')
+
+    restarted = JournalStorage(str(tmp_path), compact_threshold=100)
+    assert [s['id'] for s in restarted.load_sales()] == ['s1']
+    restarted.append_sale(sale('s3', '2024-01-03T10:00:00'))
+    assert [s['id'] for s in JournalStorage(str(tmp_path)).load_sales()] == ['s1', 's3']
+    assert restarted.load_sale('s3')['timestamp'] == '2024-01-03T10:00:00'
+
+def test_failed_append_raises_and_keeps_the_journal_readable(tmp_path):
+    storage = JournalStorage(str(tmp_path), compact_threshold=100)
+    storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    os.replace(storage.journal_file, f"{storage.journal_file}.bak")
+    os.mkdir(storage.journal_file)
+    with pytest.raises(OSError):
+        storage.append_sale(sale('s2', '2024-01-02T10:00:00'))
+    os.rmdir(storage.journal_file)
+    os.replace(f"{storage.journal_file}.bak", storage.journal_file)
+    assert storage.load_sale('s2') is None
+    assert [s['id'] for s in JournalStorage(str(tmp_path)).load_sales()] == ['s1']
+
+def test_close_waits_for_async_appends(tmp_path):
+    storage = JournalStorage(str(tmp_path), compact_threshold=100)
+    futures = [storage._io_executor().submit(storage.append_sale, sale(f's{i}', f'2024-01-0{i + 1}T10:00:00'))
+               for i in range(3)]
+    storage.close()
+    assert all(f.done() for f in futures)
+    assert [s['id'] for s in JournalStorage(str(tmp_path)).load_sales()] == ['s0', 's1', 's2']
@@ -0,0 +1,37 @@
+from storage.json_storage import JSONStorage
+
+def product(product_id: str, stock: int = 10) -> dict:
+    return {'id': product_id, 'name': f"Producto {product_id}", 'cost': 1.0, 'price': 2.0,
+            'stock': stock, 'sku': None, 'reorder_threshold': 0}
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto p1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+def test_row_level_product_changes_survive_restart(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    storage.save_products([product('p1'), product('p2'), product('p3')])
+    storage.upsert_product(product('p4', stock=4))
+    storage.upsert_product(dict(product('p1'), name="Café"))
+    storage.delete_product('p2')
+    storage.apply_stock_delta('p3', 5)
+    storage.apply_product_changes(stock_deltas={'p1': -3, 'missing': 1})
+    storage.close()
+
+    products = {p['id']: p for p in JSONStorage(str(tmp_path)).load_products()}
+    assert sorted(products) == ['p1', 'p3', 'p4']
+    assert (products['p1']['name'], products['p1']['stock']) == ("Café", 7)
+    assert (products['p3']['stock'], products['p4']['stock']) == (15, 4)
+
+def test_sales_survive_restart_and_filter_by_range(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    storage.append_sale(sale('s1', '2024-01-15T10:00:00'))
+    storage.append_sales([sale('s2', '2024-02-01T09:00:00'), sale('s3', '2024-03-20T18:30:00')])
+    storage.close()
+
+    restarted = JSONStorage(str(tmp_path))
+    assert [s['id'] for s in restarted.iter_sales()] == ['s1', 's2', 's3']
+    assert [s['id'] for s in restarted.load_sales_range('2024-02-01', '2024-03-01')] == ['s2']
+    assert restarted.load_sale('s3')['timestamp'] == '2024-03-20T18:30:00'
+    assert restarted.load_sale('missing') is None
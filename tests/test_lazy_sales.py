@@ -0,0 +1,42 @@
+import threading
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.journal_storage import JournalStorage
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto 1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+def lazy_service(tmp_path, count, cache_size):
+    storage = JournalStorage(str(tmp_path))
+    storage.append_sales([sale(f"s{i}", f"2024-01-01T10:{i // 60:02d}:{i % 60:02d}") for i in range(count)])
+    return SalesService(storage, InventoryService(storage), lazy=True, cache_size=cache_size)
+
+def test_lazy_mode_reads_sales_on_demand(tmp_path):
+    sales = lazy_service(tmp_path, 10, cache_size=3)
+    assert len(sales._sales) == 0
+    assert sales.get_sale("s4").timestamp == "2024-01-01T10:00:04"
+    assert sales.get_sale("missing") is None
+    for i in range(10):
+        sales.get_sale(f"s{i}")
+    assert list(sales._sales) == ["s7", "s8", "s9"]
+    assert [s.id for s in sales.iter_sales()] == [f"s{i}" for i in range(10)]
+
+def test_lazy_cache_is_shared_safely_between_sessions(tmp_path):
+    sales = lazy_service(tmp_path, 200, cache_size=16)
+    errors = []
+
+    def reader(step):
+        try:
+            for i in range(0, 2000, step):
+                assert sales.get_sale(f"s{i % 200}").id == f"s{i % 200}"
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=reader, args=(step,)) for step in (1, 3, 7, 11)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(sales._sales) <= 16
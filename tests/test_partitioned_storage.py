@@ -0,0 +1,35 @@
+import os
+from storage.json_storage import JSONStorage
+from storage.partitioned_storage import PartitionedStorage
+
+def sale(sale_id: str, timestamp: str, quantity: int = 1) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0 * quantity,
+            'total_cost': 1.0 * quantity, 'total_profit': 1.0 * quantity,
+            'items': [{'product_id': 'p1', 'name': 'Producto p1', 'quantity': quantity,
+                       'price': 2.0, 'cost': 1.0, 'subtotal': 2.0 * quantity}]}
+
+def test_sales_are_split_by_month(tmp_path):
+    storage = PartitionedStorage(str(tmp_path))
+    storage.append_sales([sale('s1', '2024-01-15T10:00:00'), sale('s2', '2024-01-31T23:59:59'),
+                          sale('s3', '2024-02-01T00:00:00')])
+    assert sorted(os.listdir(storage.sales_dir)) == ['2024-01.json', '2024-02.json', 'manifest.json']
+    assert [s['id'] for s in storage.load_sales_range('2024-02-01', '2024-03-01')] == ['s3']
+
+def test_sales_survive_restart_and_filter_by_range(tmp_path):
+    storage = PartitionedStorage(str(tmp_path))
+    storage.append_sale(sale('s1', '2024-01-15T10:00:00'))
+    storage.append_sales([sale('s2', '2024-02-01T09:00:00'), sale('s3', '2024-03-20T18:30:00', quantity=3)])
+    storage.close()
+
+    storage = PartitionedStorage(str(tmp_path))
+    assert [s['id'] for s in storage.iter_sales()] == ['s1', 's2', 's3']
+    assert [s['id'] for s in storage.iter_sales_range('2024-01-20')] == ['s2', 's3']
+    assert storage.load_sale('s3')['items'][0]['quantity'] == 3
+    assert storage.load_sale('missing') is None
+    storage.close()
+
+def test_migrates_legacy_sales_file(tmp_path):
+    JSONStorage(str(tmp_path)).save_sales([sale('s1', '2023-12-01T10:00:00'), sale('s2', '2024-01-01T10:00:00')])
+    storage = PartitionedStorage(str(tmp_path))
+    assert [s['id'] for s in storage.iter_sales()] == ['s1', 's2']
+    assert os.path.exists(os.path.join(storage.sales_dir, '2023-12.json'))
@@ -0,0 +1,66 @@
+from services.inventory_service import InventoryService
+import pytest
+from services.product_import import _parse_number
+from storage.json_storage import JSONStorage
+
+def test_decimal_comma_with_thousands_separator():
+    assert _parse_number("1.234,50", decimal_comma=True) == 1234.5
+    assert _parse_number("12,5", decimal_comma=True) == 12.5
+    assert _parse_number("12.5", decimal_comma=True) == 12.5
+
+def test_comma_thousands_separator():
+    assert _parse_number("1,234.50", decimal_comma=False) == 1234.5
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-Infinity", "1e999"])
+def test_rejects_non_finite_numbers(value):
+    with pytest.raises(ValueError):
+        _parse_number(value, decimal_comma=False)
+
+def test_import_updates_by_sku_and_reports_bad_rows(tmp_path):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    inventory.add_product("Café molido", 1.0, 2.0, 5, sku="779001")
+    path = tmp_path / "proveedor.csv"
+    path.write_text(
+        "Nombre;Costo;Precio;Stock;SKU\n"
+        "Café molido 500 g;1.100,25;1.500,50;12;779001\n"
+        "Té verde;0,80;1,20;30;\n"
+        "Yerba;abc;2;1;\n"
+        "Azúcar;;;4;\n",
+        encoding='utf-8'
+    )
+    progress = []
+
+    result = inventory.import_products(str(path), on_progress=lambda rows, fraction: progress.append(fraction),
+                                       chunk_size=2)
+
+    assert (result.rows, result.created, result.updated) == (4, 1, 1)
+    assert [error.line for error in result.errors] == [4, 5]
+    coffee = inventory.get_product_by_sku("779001")
+    assert (coffee.name, coffee.cost, coffee.price, coffee.stock) == ("Café molido 500 g", 1100.25, 1500.5, 12)
+    assert inventory.search_products("te verde")[0].price == 1.2
+    assert progress[-1] == 1.0
+    assert len(JSONStorage(str(tmp_path)).load_products()) == 2
+
+def test_import_reports_sku_taken_while_reading(tmp_path):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    path = tmp_path / "proveedor.csv"
+    path.write_text("Nombre;Costo;Precio;SKU\nYerba;1;2;779002\nTé;1;2;779003\n", encoding='utf-8')
+
+    def take_sku(rows, fraction):
+        # Otra sesión da de alta un producto con el mismo SKU mientras se lee el archivo.
+        if not inventory.get_product_by_sku("779002"):
+            inventory.add_product("Yerba mate", 1.0, 2.0, 0, sku="779002")
+
+    result = inventory.import_products(str(path), on_progress=take_sku)
+    assert (result.rows, result.created) == (2, 1)
+    assert [(error.line, error.message[:18]) for error in result.errors] == [(2, "el SKU '779002' ya")]
+    assert inventory.get_product_by_sku("779002").name == "Yerba mate"
+    assert inventory.get_product_by_sku("779003").name == "Té"
+    assert sorted(p['name'] for p in JSONStorage(str(tmp_path)).load_products()) == ["Té", "Yerba mate"]
+
+def test_import_reports_non_finite_price(tmp_path):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    path = tmp_path / "proveedor.csv"
+    path.write_text("Nombre,Costo,Precio\nYerba,1,nan\nTé,inf,2\n", encoding='utf-8')
+    result = inventory.import_products(str(path))
+    assert (result.created, [error.line for error in result.errors]) == (0, [2, 3])
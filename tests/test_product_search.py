@@ -0,0 +1,72 @@
+import threading
+from services import inventory_service
+from services.inventory_service import InventoryService
+from services.product_search import ProductSearchIndex, edit_distance
+from storage.json_storage import JSONStorage
+
+def add(inventory, name, stock):
+    inventory.add_product(name, 1.0, 2.0, stock)
+    return next(p for p in inventory.get_all_products() if p.name == name)
+
+def index_of(*names) -> ProductSearchIndex:
+    index = ProductSearchIndex()
+    for i, name in enumerate(names):
+        index.add(f"p{i}", name)
+    return index
+
+def test_edit_distance_counts_a_swap_as_one_edit():
+    assert edit_distance("chocolate", "chcoolate", 2) == 1
+    assert edit_distance("cafe", "cafes", 1) == 1
+    assert edit_distance("leche", "nata", 2) == 3
+
+def test_fuzzy_tolerates_typos_in_every_word():
+    index = index_of("Café Marita molido 500g", "Té verde", "Café Lorenzo tostado 250g")
+    assert index.search_fuzzy("cafe mrita", 10) == ["p0"]
+    assert index.search_fuzzy("caef lorenso", 10) == ["p2"]
+    assert index.search("tostdo", 10) == ["p2"]
+    # Todas las palabras deben tener alguna parecida en el nombre.
+    assert index.search_fuzzy("cafe verdura", 10) == []
+
+def test_fuzzy_ranks_closest_match_first():
+    index = index_of("Galletas de avena", "Galleta")
+    assert index.search_fuzzy("galletas", 10)[0] == "p0"
+    assert index.search_fuzzy("galleta", 10)[0] == "p1"
+
+def test_fuzzy_requires_exact_numbers():
+    index = index_of("Arroz 500g", "Arroz 600g")
+    assert index.search_fuzzy("aroz 500g", 10) == ["p0"]
+
+def test_removed_words_leave_the_vocabulary():
+    index = index_of("Jabón neutro", "Jabón de coco")
+    index.remove("p0")
+    assert index.search_fuzzy("nuetro", 10) == []
+    assert index.search_fuzzy("jabn", 10) == ["p1"]
+    index.add("p1", "Detergente")
+    assert index.search_fuzzy("coco", 10) == []
+
+def test_search_index_includes_changes_made_while_building(tmp_path, monkeypatch):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    product = add(inventory, "Caja chica", 1)
+    add(inventory, "Caja grande", 1)
+    renamed = []
+
+    class SlowIndex(inventory_service.ProductSearchIndex):
+        def add(self, product_id, name):
+            if not renamed:
+                # Otra sesión edita el catálogo mientras se construye el índice.
+                thread = threading.Thread(target=inventory.update_product, args=(product.id,), kwargs={'name': "Sobre"})
+                thread.start()
+                thread.join(timeout=5)
+                renamed.append(product.id)
+            super().add(product_id, name)
+    monkeypatch.setattr(inventory_service, 'ProductSearchIndex', SlowIndex)
+
+    assert [p.name for p in inventory.search_products("caja")] == ["Caja grande"]
+    assert [p.id for p in inventory.search_products("sobre")] == [product.id]
+
+def test_index_is_built_in_the_background(tmp_path):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    product = add(inventory, "Harina integral", 3)
+    inventory.build_search_index_async().join(timeout=5)
+    assert inventory._search_index is not None
+    assert inventory.search_products("harna") == [product]
@@ -0,0 +1,36 @@
+import pytest
+from models.sale import Sale, SaleItem
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.json_storage import JSONStorage
+
+def sale_dict(quantity) -> dict:
+    return {'id': 's1', 'timestamp': '2024-01-01T10:00:00', 'total_revenue': 4.0, 'total_cost': 2.0,
+            'total_profit': 2.0, 'items': [{'product_id': 'p1', 'name': 'Café', 'quantity': quantity,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 4.0}]}
+
+def test_integral_float_quantity_is_stored_as_int():
+    item = SaleItem('p1', 'Café', 2.0, 2.0, 1.0, 4.0)
+    assert item.quantity == 2 and type(item.quantity) is int
+    sale = Sale.from_dict(sale_dict(2.0))
+    assert sale.items[0].quantity == 2
+    assert sale.to_dict() == sale_dict(2)
+
+@pytest.mark.parametrize('quantity', [1.5, "2", None, True, float('nan'), 2 ** 63])
+def test_invalid_quantity_is_rejected(quantity):
+    with pytest.raises(ValueError, match="cantidad"):
+        SaleItem('p1', 'Café', quantity, 2.0, 1.0, 4.0)
+    with pytest.raises(ValueError, match="cantidad"):
+        Sale.from_dict(sale_dict(quantity))
+
+def test_fractional_sale_leaves_stock_untouched(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    inventory = InventoryService(storage)
+    sales = SalesService(storage, inventory)
+    inventory.add_product("Café", 1.0, 2.0, 10)
+    product = inventory.get_all_products()[0]
+
+    assert sales.record_sale([{'product_id': product.id, 'quantity': 1.5}]) is None
+    assert product.stock == 10
+    recorded = sales.record_sale([{'product_id': product.id, 'quantity': 3.0}])
+    assert recorded.items[0].quantity == 3 and product.stock == 7
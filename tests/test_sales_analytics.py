@@ -0,0 +1,35 @@
+import threading
+from models.sale import Sale, SaleItem
+from services.sales_analytics import SalesAnalytics
+
+def make_sale(i: int) -> Sale:
+    item = SaleItem(product_id=f"p{i % 7}", name=f"Producto {i % 7}", quantity=1, price=2.0, cost=1.5, subtotal=2.0)
+    return Sale(str(i), f"2024-01-01T{i % 24:02d}:00:00", 2.0, 1.5, 0.5, [item])
+
+def test_groups_by_product_and_hour():
+    analytics = SalesAnalytics(make_sale(i) for i in range(48))
+    top = analytics.top_products(2, metric="units")
+    assert [row['product_id'] for row in top] == ["p0", "p1"]
+    assert top[0]['units'] == 7 and top[0]['profit'] == 3.5
+    assert list(analytics.by_hour_of_day()['units']) == [2] * 24
+
+def test_sales_added_while_querying_are_not_lost():
+    analytics = SalesAnalytics()
+    errors = []
+
+    def add_sales():
+        for i in range(20000):
+            analytics.add_sale(make_sale(i))
+    writer = threading.Thread(target=add_sales)
+    writer.start()
+    while writer.is_alive():
+        try:
+            analytics.by_product()
+            analytics.time_buckets(3600, start="2024-01-01T05:00:00")
+        except Exception as e:
+            errors.append(e)
+            break
+    writer.join()
+
+    assert errors == []
+    assert analytics.by_product()['units'].sum() == 20000
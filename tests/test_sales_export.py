@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+import os
+import threading
+import pytest
+from services import sales_service
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.journal_storage import JournalStorage
+
+TIMESTAMPS = [f"2024-01-{day:02d}T10:00:00" for day in range(1, 11)]
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto p1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+@pytest.fixture(params=[False, True], ids=['memory', 'lazy'])
+def sales(request, tmp_path):
+    storage = JournalStorage(str(tmp_path))
+    # Registradas fuera de orden: las consultas deben seguir el orden por fecha.
+    storage.append_sales([sale(f"s{i}", timestamp) for i, timestamp in reversed(list(enumerate(TIMESTAMPS)))])
+    return SalesService(storage, InventoryService(storage), lazy=request.param)
+
+def test_export_streams_one_chunk_per_sale(sales):
+    chunks = sales.export_sales("2024-01-02", "2024-01-04", fmt="csv", level="lines")
+    header = next(chunks)
+    assert header.startswith("sale_id,timestamp,product_id")
+    rows = list(csv.DictReader(io.StringIO(header + ''.join(chunks))))
+    # En modo diferido las ventas salen en el orden en que se guardaron.
+    assert sorted((row['sale_id'], row['quantity']) for row in rows) == [('s1', '1'), ('s2', '1')]
+
+    lines = ''.join(sales.export_sales(fmt="jsonl")).splitlines()
+    assert sorted(json.loads(line)['id'] for line in lines) == [f"s{i}" for i in range(10)]
+
+def test_export_to_file_can_be_cancelled(sales, tmp_path, monkeypatch):
+    monkeypatch.setattr(sales_service, 'EXPORT_PROGRESS_EVERY', 2)
+    path = str(tmp_path / "ventas.csv")
+    progress = []
+    assert sales.export_sales_to_file(path, on_progress=lambda done, total: progress.append((done, total))) == 10
+    assert progress[0] == (2, 10) and progress[-1] == (10, 10)
+    with open(path, encoding='utf-8-sig') as f:
+        assert len(list(csv.DictReader(f))) == 10
+
+    cancel = threading.Event()
+    cancelled = str(tmp_path / "cancelada.csv")
+    assert sales.export_sales_to_file(cancelled, on_progress=lambda done, total: cancel.set(), cancel=cancel) is None
+    assert not os.path.exists(cancelled) and not os.path.exists(f"{cancelled}.part")
@@ -0,0 +1,57 @@
+from datetime import datetime
+import pytest
+from services import sales_service
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.journal_storage import JournalStorage
+
+TIMESTAMPS = [f"2024-01-{day:02d}T10:00:00" for day in range(1, 11)]
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto 1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+@pytest.fixture(params=[False, True], ids=['memory', 'lazy'])
+def sales(request, tmp_path):
+    storage = JournalStorage(str(tmp_path))
+    # Registradas fuera de orden: las consultas deben seguir el orden por fecha.
+    storage.append_sales([sale(f"s{i}", timestamp) for i, timestamp in reversed(list(enumerate(TIMESTAMPS)))])
+    return SalesService(storage, InventoryService(storage), lazy=request.param)
+
+def ids(sales):
+    return [s.id for s in sales]
+
+def test_query_sales_pages_by_date(sales):
+    assert ids(sales.query_sales(limit=3)) == ['s0', 's1', 's2']
+    assert ids(sales.query_sales(offset=3, limit=3)) == ['s3', 's4', 's5']
+    assert ids(sales.query_sales(offset=9, limit=3)) == ['s9']
+    assert ids(sales.query_sales(offset=20, limit=3)) == []
+    assert ids(sales.query_sales(order="desc", offset=1, limit=2)) == ['s8', 's7']
+    assert ids(sales.query_sales(order="desc", offset=9, limit=3)) == ['s0']
+
+def test_query_sales_pages_within_range(sales):
+    start, end = "2024-01-03", "2024-01-08"
+    assert ids(sales.query_sales(start, end)) == ['s2', 's3', 's4', 's5', 's6']
+    assert ids(sales.query_sales(start, end, offset=2, limit=2)) == ['s4', 's5']
+    assert ids(sales.query_sales(start, end, offset=1, limit=2, order="desc")) == ['s5', 's4']
+    with pytest.raises(ValueError):
+        list(sales.query_sales(order="random"))
+
+class EarlyClock(datetime):
+    """Reloj atrasado: las ventas nuevas quedan al principio del índice temporal."""
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2023, 12, 31, 10, 0, 0)
+
+def test_page_is_stable_while_older_sales_are_inserted(sales, monkeypatch):
+    monkeypatch.setattr(sales_service, 'datetime', EarlyClock)
+    sales._inventory.add_product("Café", 1.0, 2.0, 10)
+    product = sales._inventory.get_all_products()[0]
+
+    page = sales.query_sales(limit=4)
+    seen = [next(page).id]
+    assert sales.record_sale([{'product_id': product.id, 'quantity': 1}]) is not None
+    seen += ids(page)
+    assert seen == ['s0', 's1', 's2', 's3']
+    assert ids(sales.query_sales(offset=1, limit=2)) == ['s0', 's1']
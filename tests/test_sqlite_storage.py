@@ -0,0 +1,75 @@
+import pytest
+from storage.journal_storage import JournalStorage
+from storage.sqlite_storage import SQLiteStorage
+
+def product(product_id: str, stock: int = 10, sku=None) -> dict:
+    return {'id': product_id, 'name': f"Producto {product_id}", 'cost': 1.0, 'price': 2.0,
+            'stock': stock, 'sku': sku, 'reorder_threshold': 0}
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto p1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+def test_imports_json_files_on_first_open(tmp_path):
+    json_storage = JournalStorage(str(tmp_path))
+    json_storage.save_products([product('p1'), product('p2')])
+    json_storage.save_sales([sale('s1', '2024-01-01T10:00:00')])
+    json_storage.append_sale(sale('s2', '2024-01-02T10:00:00'))
+
+    storage = SQLiteStorage(str(tmp_path))
+    assert sorted(p['id'] for p in storage.load_products()) == ['p1', 'p2']
+    assert [s['id'] for s in storage.iter_sales()] == ['s1', 's2']
+    storage.close()
+
+def test_import_keeps_first_product_with_a_duplicate_sku(tmp_path):
+    JournalStorage(str(tmp_path)).save_products([
+        product('p1', sku='CAF-1'), product('p2', sku='CAF-1'), product('p3', sku='TE-1'),
+    ])
+    storage = SQLiteStorage(str(tmp_path))
+    assert {p['id']: p['sku'] for p in storage.load_products()} == {'p1': 'CAF-1', 'p3': 'TE-1'}
+    storage.close()
+
+def test_stock_delta_updates_single_row(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    storage.save_products([product('p1', stock=5), product('p2', stock=5)])
+    storage.apply_product_changes(stock_deltas={'p1': -2, 'missing': 3})
+    assert {p['id']: p['stock'] for p in storage.load_products()} == {'p1': 3, 'p2': 5}
+    storage.close()
+
+def test_batch_rolls_back_every_write_when_one_fails(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    storage.save_products([product('p1', stock=5)])
+    storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+
+    with pytest.raises(Exception):
+        with storage.batch():
+            storage.apply_product_changes(stock_deltas={'p1': -1})
+            storage.append_sale(sale('s2', '2024-01-02T10:00:00'))
+            # El movimiento no cabe: falta la columna obligatoria `timestamp`.
+            storage.append_stock_movements([{'seq': 1, 'product_id': 'p1', 'delta': -1,
+                                             'balance': 4, 'reason': 'sale'}])
+
+    reopened = SQLiteStorage(str(tmp_path))
+    assert reopened.load_products()[0]['stock'] == 5
+    assert [s['id'] for s in reopened.iter_sales()] == ['s1']
+    assert list(reopened.iter_stock_movements()) == []
+    reopened.close()
+    storage.close()
+
+def test_batch_commits_all_writes_together(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    storage.save_products([product('p1', stock=5)])
+    with storage.batch():
+        storage.apply_product_changes(stock_deltas={'p1': -1})
+        storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+        with storage.batch():
+            storage.append_stock_movements([{'seq': 1, 'timestamp': '2024-01-01T10:00:00', 'product_id': 'p1',
+                                             'delta': -1, 'balance': 4, 'reason': 'sale', 'reference': 's1'}])
+    storage.close()
+
+    reopened = SQLiteStorage(str(tmp_path))
+    assert reopened.load_products()[0]['stock'] == 4
+    assert [s['id'] for s in reopened.iter_sales()] == ['s1']
+    assert [m['seq'] for m in reopened.iter_stock_movements()] == [1]
+    reopened.close()
@@ -0,0 +1,114 @@
+import threading
+from datetime import datetime, timedelta
+from services import stock_ledger
+from services.inventory_service import InventoryService
+from storage import json_storage
+from storage.json_storage import JSONStorage
+from storage.wal_storage import WALStorage
+
+def movement(seq: int, delta: int = -1, balance: int = 0, product_id: str = 'p1') -> dict:
+    return {'seq': seq, 'timestamp': '2024-01-01T00:00:00', 'product_id': product_id, 'delta': delta,
+            'balance': balance, 'reason': 'sale', 'reference': None}
+
+class SteppingClock(datetime):
+    """Reloj que avanza un segundo en cada lectura, para que cada movimiento tenga su propia fecha."""
+    current = datetime(2024, 1, 1, 12, 0, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.current += timedelta(seconds=1)
+        return cls.current
+
+def test_stock_as_of_replays_ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(stock_ledger, 'datetime', SteppingClock)
+    storage = WALStorage(JSONStorage(str(tmp_path)))
+    inventory = InventoryService(storage, ledger_snapshot_every=2)
+    inventory.add_product("Café", 1.0, 2.0, 10)
+    product = inventory.get_all_products()[0]
+    inventory.update_stock(product.id, 3)
+    middle = inventory.get_stock_history(product.id)[0].timestamp
+    inventory.return_stock(product.id, 1, reference="venta-1")
+
+    assert inventory.get_stock_as_of(product.id, middle) == 7
+    assert [m.reason for m in inventory.get_stock_history(product.id)] == ['return', 'adjustment', 'initial']
+    assert InventoryService(WALStorage(JSONStorage(str(tmp_path)))).get_stock_levels_as_of(middle) == {product.id: 7}
+
+class HeldSaleLedgerStorage(JSONStorage):
+    """
+    Retiene la escritura de un movimiento suelto hasta que otro hilo escribe
+    un lote de movimientos (o pasa medio segundo), como un disco lento a mitad
+    de una venta.
+    """
+    def __init__(self, data_dir):
+        super().__init__(data_dir)
+        self.hold_next = False
+        self.holding = threading.Event()
+        self.batch_written = threading.Event()
+
+    def append_stock_movements(self, movements):
+        if len(movements) == 1 and self.hold_next:
+            self.hold_next = False
+            self.holding.set()
+            self.batch_written.wait(0.5)
+        super().append_stock_movements(movements)
+        if len(movements) > 1:
+            self.batch_written.set()
+
+def test_concurrent_import_and_sale_persist_in_seq_order(tmp_path):
+    storage = HeldSaleLedgerStorage(str(tmp_path))
+    inventory = InventoryService(storage)
+    inventory.add_product("Café", 1.0, 2.0, 100)
+    product = inventory.get_all_products()[0]
+    path = tmp_path / "proveedor.csv"
+    path.write_text("Nombre;Costo;Precio;Stock\n" + "".join(
+        f"Producto {i};1;2;{i % 50 + 1}\n" for i in range(1500)), encoding='utf-8')
+
+    storage.hold_next = True
+    seller = threading.Thread(target=inventory.update_stock, args=(product.id, 1))
+    seller.start()
+    assert storage.holding.wait(5)
+    inventory.import_products(str(path))
+    seller.join()
+
+    written = [m['seq'] for _, segment in storage._ledger_segments() for m in storage._read_ledger_segment(segment)]
+    assert written == list(range(1, len(written) + 1))
+    assert [m['seq'] for m in JSONStorage(str(tmp_path)).iter_stock_movements()] == written
+    levels = InventoryService(JSONStorage(str(tmp_path))).get_stock_levels_as_of(datetime.now() + timedelta(days=1))
+    assert levels == {p.id: p.stock for p in inventory.get_all_products()}
+
+def test_movements_and_snapshots_survive_restart(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    storage.append_stock_movements([movement(1), movement(2, product_id='p2'), movement(3)])
+    storage.save_stock_snapshot({'seq': 2, 'timestamp': '2024-01-01T00:00:00', 'stock': {'p1': 9, 'p2': 4}})
+    storage.close()
+
+    restarted = JSONStorage(str(tmp_path))
+    assert [m['seq'] for m in restarted.iter_stock_movements()] == [1, 2, 3]
+    assert [m['seq'] for m in restarted.iter_stock_movements(1, 'p1')] == [3]
+    assert restarted.load_stock_snapshot()['stock'] == {'p1': 9, 'p2': 4}
+    assert restarted.load_stock_snapshot('2023-12-31T00:00:00') is None
+
+def test_torn_tail_is_not_glued_to_next_movement(tmp_path):
+    storage = JSONStorage(str(tmp_path))
+    storage.append_stock_movements([movement(1)])
+    path = storage._ledger_segments()[-1][1]
+    with open(path, 'ab') as f:
+        f.write(b'{"seq": 2, "timesta')
+
+    restarted = JSONStorage(str(tmp_path))
+    restarted.append_stock_movements([movement(2), movement(3)])
+    assert [m['seq'] for m in JSONStorage(str(tmp_path)).iter_stock_movements()] == [1, 2, 3]
+
+def test_torn_tail_is_not_counted_as_a_movement(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_storage, 'LEDGER_SEGMENT_SIZE', 3)
+    storage = JSONStorage(str(tmp_path))
+    storage.append_stock_movements([movement(1), movement(2)])
+    path = storage._ledger_segments()[-1][1]
+    with open(path, 'ab') as f:
+        f.write(b'{"seq": 3, "timesta')
+
+    restarted = JSONStorage(str(tmp_path))
+    restarted.append_stock_movements([movement(3)])
+    restarted.append_stock_movements([movement(4)])
+    assert [seq for seq, _ in restarted._ledger_segments()] == [1, 4]
+    assert [m['seq'] for m in restarted.iter_stock_movements(2)] == [3, 4]
@@ -0,0 +1,70 @@
+import threading
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.json_storage import JSONStorage
+from storage.wal_storage import WALStorage
+
+def add(inventory, name, stock):
+    inventory.add_product(name, 1.0, 2.0, stock)
+    return next(p for p in inventory.get_all_products() if p.name == name)
+
+def test_concurrent_sales_and_edits_persist_the_same_stock(tmp_path):
+    storage = WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=100000)
+    inventory = InventoryService(storage)
+    sales = SalesService(storage, inventory)
+    product = add(inventory, "Café", 10000)
+
+    def sell():
+        for _ in range(300):
+            sales.record_sale([{'product_id': product.id, 'quantity': 1}])
+
+    def edit():
+        for i in range(300):
+            inventory.update_product(product.id, price=2.0 + i % 3)
+    threads = [threading.Thread(target=target) for target in (sell, sell, edit, edit)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert product.stock == 9400
+    replayed = WALStorage(JSONStorage(str(tmp_path)))
+    assert replayed.load_products()[0]['stock'] == 9400
+    assert len(list(replayed.iter_sales())) == 600
+
+def test_concurrent_json_product_changes_are_not_lost(tmp_path):
+    storage = JSONStorage(str(tmp_path), codec='json')
+
+    def writer(prefix):
+        for i in range(50):
+            storage.upsert_product({'id': f'{prefix}-{i}', 'name': f"Producto {prefix}-{i}", 'cost': 1.0,
+                                    'price': 2.0, 'stock': 1, 'sku': None, 'reorder_threshold': 0})
+    threads = [threading.Thread(target=writer, args=(prefix,)) for prefix in 'abcd']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(JSONStorage(str(tmp_path)).load_products()) == 200
+
+def test_stock_cannot_be_set_below_reserved(tmp_path):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    product = add(inventory, "Café", 10)
+    assert inventory.reserve("carrito", product.id, 4)
+
+    assert not inventory.update_product(product.id, stock=3, price=9.0)
+    assert (product.stock, product.price) == (10, 2.0)
+    assert inventory.update_product(product.id, stock=4)
+    assert inventory.available_stock(product.id) == 0
+
+def test_import_clamps_stock_to_reserved(tmp_path):
+    inventory = InventoryService(JSONStorage(str(tmp_path)))
+    product = add(inventory, "Café", 10)
+    assert inventory.reserve("carrito", product.id, 4)
+    path = tmp_path / "proveedor.csv"
+    path.write_text("Nombre;Precio;Stock\nCafé;3,5;1\n", encoding='utf-8')
+
+    result = inventory.import_products(str(path))
+    assert result.updated == 1
+    assert [error.line for error in result.errors] == [2]
+    assert (product.stock, product.price) == (4, 3.5)
+    assert inventory.available_stock(product.id) == 0
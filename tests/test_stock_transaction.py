@@ -0,0 +1,76 @@
+import os
+import pytest
+from services.inventory_service import InventoryService
+from services.sales_service import SalesService
+from storage.json_storage import JSONStorage
+from storage.wal_storage import WALStorage
+
+@pytest.fixture
+def storage(tmp_path):
+    return WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=1000)
+
+def add(inventory, name, stock):
+    inventory.add_product(name, 1.0, 2.0, stock)
+    return next(p for p in inventory.get_all_products() if p.name == name)
+
+def test_transaction_rolls_back_when_block_fails(storage):
+    inventory = InventoryService(storage)
+    first, second = add(inventory, "Café", 10), add(inventory, "Té", 10)
+    history = len(inventory.get_stock_history(first.id))
+
+    with pytest.raises(RuntimeError):
+        with inventory.transaction() as tx:
+            tx.remove_stock(first.id, 3)
+            tx.remove_stock(second.id, 4)
+            raise RuntimeError("cancelada")
+
+    assert (first.stock, second.stock) == (10, 10)
+    assert len(inventory.get_stock_history(first.id)) == history
+    assert {p['id']: p['stock'] for p in storage.load_products()} == {first.id: 10, second.id: 10}
+
+def test_transaction_revalidates_stock_on_commit(storage):
+    inventory = InventoryService(storage)
+    product = add(inventory, "Café", 5)
+
+    with pytest.raises(ValueError):
+        with inventory.transaction() as tx:
+            tx.remove_stock(product.id, 4)
+            # Otra sesión vende mientras la transacción está abierta.
+            assert inventory.update_stock(product.id, 3)
+    assert product.stock == 2
+    assert storage.load_products()[0]['stock'] == 2
+
+def test_sale_that_fails_validation_changes_nothing(storage):
+    inventory = InventoryService(storage)
+    sales = SalesService(storage, inventory)
+    product = add(inventory, "Café", 2)
+
+    assert sales.record_sale([{'product_id': product.id, 'quantity': 3}]) is None
+    recorded = sales.record_sale([{'product_id': product.id, 'quantity': 2}])
+    assert recorded is not None and product.stock == 0
+    assert [s['id'] for s in storage.load_sales()] == [recorded.id]
+    assert storage.load_products()[0]['stock'] == 0
+
+def test_sale_that_cannot_be_written_restores_stock_and_reservation(storage):
+    inventory = InventoryService(storage)
+    sales = SalesService(storage, inventory)
+    product = add(inventory, "Café", 10)
+    history = len(inventory.get_stock_history(product.id))
+    assert inventory.reserve("carrito", product.id, 4)
+
+    storage.checkpoint()
+    os.mkdir(storage.wal_file)
+    assert sales.record_sale([{'product_id': product.id, 'quantity': 4}], reservation_id="carrito") is None
+    os.rmdir(storage.wal_file)
+
+    assert product.stock == 10
+    assert inventory.get_reserved("carrito") == {product.id: 4}
+    assert inventory.available_stock(product.id) == 6
+    assert len(inventory.get_stock_history(product.id)) == history
+    assert sales.get_all_sales() == []
+    assert list(storage.iter_sales()) == []
+
+    recorded = sales.record_sale([{'product_id': product.id, 'quantity': 4}], reservation_id="carrito")
+    assert recorded is not None and product.stock == 6
+    assert inventory.get_reserved("carrito") == {}
+    assert [m.balance for m in inventory.get_stock_history(product.id)][:2] == [6, 10]
@@ -0,0 +1,122 @@
+import os
+import pytest
+from storage.json_storage import JSONStorage
+from storage.wal_storage import WALStorage
+
+def product(product_id: str, stock: int = 10) -> dict:
+    return {'id': product_id, 'name': f"Producto {product_id}", 'cost': 1.0, 'price': 2.0,
+            'stock': stock, 'sku': None, 'reorder_threshold': 0}
+
+def sale(sale_id: str, timestamp: str, quantity: int = 1) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0 * quantity,
+            'total_cost': 1.0 * quantity, 'total_profit': 1.0 * quantity,
+            'items': [{'product_id': 'p1', 'name': 'Producto p1', 'quantity': quantity,
+                       'price': 2.0, 'cost': 1.0, 'subtotal': 2.0 * quantity}]}
+
+def block_writes(path: str):
+    """Hace fallar de verdad la escritura atómica de `path`: su archivo temporal es un directorio."""
+    os.mkdir(f"{path}.tmp")
+
+def unblock_writes(path: str):
+    os.rmdir(f"{path}.tmp")
+
+def test_defaults_to_inner_data_dir(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)))
+    assert os.path.dirname(wal.wal_file) == str(tmp_path)
+
+def test_replays_log_after_crash(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=1000)
+    wal.upsert_product(product('p1'))
+    with wal.batch():
+        wal.apply_stock_delta('p1', -2)
+        wal.append_sale(sale('s1', '2024-01-01T10:00:00', quantity=2))
+    assert JSONStorage(str(tmp_path)).load_products() == []
+
+    # Sin close(): la nueva instancia solo cuenta con el log.
+    recovered = WALStorage(JSONStorage(str(tmp_path)))
+    assert recovered.load_products()[0]['stock'] == 8
+    assert [s['id'] for s in recovered.iter_sales()] == ['s1']
+    # La recuperación consolida el log en el almacenamiento interno.
+    assert not os.path.exists(recovered.wal_file)
+    assert JSONStorage(str(tmp_path)).load_products()[0]['stock'] == 8
+
+def test_discarded_batch_is_not_logged(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)))
+    wal.upsert_product(product('p1'))
+    try:
+        with wal.batch():
+            wal.apply_stock_delta('p1', -5)
+            raise ValueError("cancelada")
+    except ValueError:
+        pass
+    assert WALStorage(JSONStorage(str(tmp_path))).load_products()[0]['stock'] == 10
+
+def test_checkpoint_compacts_log(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=1000)
+    for i in range(5):
+        wal.upsert_product(product(f'p{i}'))
+    assert os.path.getsize(wal.wal_file) > 0
+    wal.checkpoint()
+    assert not os.path.exists(wal.wal_file)
+    assert not os.path.exists(wal.checkpoint_file)
+    assert len(JSONStorage(str(tmp_path)).load_products()) == 5
+
+def test_resumes_interrupted_checkpoint(tmp_path):
+    inner = JSONStorage(str(tmp_path))
+    wal = WALStorage(inner, checkpoint_every=1000)
+    wal.upsert_product(product('p1'))
+    wal.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    block_writes(inner.products_file)
+    wal.checkpoint()
+    assert os.path.exists(wal.checkpoint_file)
+    unblock_writes(inner.products_file)
+    # Un corte deja una línea a medias al final del segmento del checkpoint.
+    with open(wal.checkpoint_file, 'ab') as f:
+        f.write(b'{"ops": [{"op": "upsert')
+    wal.upsert_product(product('p2'))
+    wal.checkpoint()
+
+    recovered = WALStorage(JSONStorage(str(tmp_path)))
+    assert sorted(p['id'] for p in recovered.load_products()) == ['p1', 'p2']
+    assert [s['id'] for s in recovered.iter_sales()] == ['s1']
+    assert not os.path.exists(recovered.checkpoint_file)
+
+def test_skips_corrupt_records_and_torn_tail(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=1000)
+    wal.upsert_product(product('p1'))
+    with open(wal.wal_file, 'ab') as f:
+        f.write(b'no es un registro\n')
+    wal.upsert_product(product('p2'))
+    with open(wal.wal_file, 'ab') as f:
+        f.write(b'{"ops": [{"op": "upsert_pro')
+    wal.upsert_product(product('p3'))
+
+    recovered = WALStorage(JSONStorage(str(tmp_path)))
+    assert sorted(p['id'] for p in recovered.load_products()) == ['p1', 'p2', 'p3']
+
+def test_failed_checkpoint_keeps_the_log(tmp_path):
+    inner = JSONStorage(str(tmp_path))
+    wal = WALStorage(inner, checkpoint_every=1000)
+    wal.upsert_product(product('p1'))
+    wal.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    block_writes(inner.sales_file)
+    wal.checkpoint()
+    assert os.path.exists(wal.checkpoint_file)
+    assert [s['id'] for s in wal.iter_sales()] == ['s1']
+
+    # Sin close(): el estado sale del log conservado, no de un almacenamiento vacío.
+    unblock_writes(inner.sales_file)
+    recovered = WALStorage(JSONStorage(str(tmp_path)))
+    assert [p['id'] for p in recovered.load_products()] == ['p1']
+    assert [s['id'] for s in recovered.iter_sales()] == ['s1']
+    assert [s['id'] for s in JSONStorage(str(tmp_path)).load_sales()] == ['s1']
+
+def test_failed_log_write_raises_without_applying(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=1000)
+    wal.upsert_product(product('p1'))
+    wal.checkpoint()
+    os.mkdir(wal.wal_file)
+    with pytest.raises(OSError):
+        wal.apply_stock_delta('p1', -3)
+    os.rmdir(wal.wal_file)
+    assert wal.load_products()[0]['stock'] == 10
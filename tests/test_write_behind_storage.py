@@ -0,0 +1,85 @@
+import os
+import threading
+from storage.json_storage import JSONStorage
+from storage.wal_storage import WALStorage
+from storage.write_behind_storage import WriteBehindStorage
+
+def product(product_id: str, stock: int = 10) -> dict:
+    return {'id': product_id, 'name': f"Producto {product_id}", 'cost': 1.0, 'price': 2.0,
+            'stock': stock, 'sku': None, 'reorder_threshold': 0}
+
+def sale(sale_id: str, timestamp: str) -> dict:
+    return {'id': sale_id, 'timestamp': timestamp, 'total_revenue': 2.0, 'total_cost': 1.0,
+            'total_profit': 1.0, 'items': [{'product_id': 'p1', 'name': 'Producto p1', 'quantity': 1,
+                                            'price': 2.0, 'cost': 1.0, 'subtotal': 2.0}]}
+
+def test_coalesces_changes_until_flush(tmp_path):
+    inner = JSONStorage(str(tmp_path))
+    storage = WriteBehindStorage(inner, flush_interval=60)
+    storage.upsert_product(product('p1'))
+    storage.apply_stock_delta('p1', -3)
+    storage.apply_stock_delta('p1', -2)
+    assert inner.load_products() == []
+    assert storage.load_products()[0]['stock'] == 5
+    storage.close()
+
+def test_close_drains_the_queue(tmp_path):
+    storage = WriteBehindStorage(JSONStorage(str(tmp_path)), flush_interval=60)
+    storage.upsert_product(product('p1'))
+    storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    storage.close()
+    inner = JSONStorage(str(tmp_path))
+    assert [p['id'] for p in inner.load_products()] == ['p1']
+    assert [s['id'] for s in inner.load_sales()] == ['s1']
+
+def test_failed_flush_keeps_pending_changes(tmp_path):
+    inner = JSONStorage(str(tmp_path))
+    storage = WriteBehindStorage(inner, flush_interval=60)
+    storage.upsert_product(product('p1'))
+    storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    os.mkdir(f"{inner.products_file}.tmp")
+    storage.flush()
+    assert inner.load_products() == []
+
+    storage.apply_stock_delta('p1', -4)
+    storage.append_sale(sale('s2', '2024-01-02T10:00:00'))
+    os.rmdir(f"{inner.products_file}.tmp")
+    storage.flush()
+    assert inner.load_products()[0]['stock'] == 6
+    assert [s['id'] for s in inner.load_sales()] == ['s1', 's2']
+    storage.close()
+
+def test_failed_atomic_flush_requeues_every_step(tmp_path):
+    wal = WALStorage(JSONStorage(str(tmp_path)), checkpoint_every=1000)
+    storage = WriteBehindStorage(wal, flush_interval=60)
+    storage.upsert_product(product('p1'))
+    storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    # El log no se puede escribir: el lote entero se descarta al cerrarse.
+    os.mkdir(wal.wal_file)
+    storage.flush()
+    assert wal.load_products() == []
+
+    os.rmdir(wal.wal_file)
+    storage.flush()
+    assert [p['id'] for p in wal.load_products()] == ['p1']
+    assert [s['id'] for s in wal.iter_sales()] == ['s1']
+    storage.close()
+
+def test_batch_reaches_the_same_flush(tmp_path):
+    inner = JSONStorage(str(tmp_path))
+    storage = WriteBehindStorage(inner, flush_interval=60)
+    storage.upsert_product(product('p1'))
+    storage.flush()
+    with storage.batch():
+        storage.apply_stock_delta('p1', -1)
+        # Un volcado de otro hilo a mitad del lote no se lleva solo una parte.
+        flusher = threading.Thread(target=storage.flush)
+        flusher.start()
+        flusher.join()
+        storage.append_sale(sale('s1', '2024-01-01T10:00:00'))
+    assert inner.load_products()[0]['stock'] == 10
+    assert inner.load_sales() == []
+    storage.flush()
+    assert inner.load_products()[0]['stock'] == 9
+    assert [s['id'] for s in inner.load_sales()] == ['s1']
+    storage.close()
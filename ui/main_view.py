@@ -1,4 +1,5 @@
 import flet as ft
+from typing import Callable, Dict
 from services.inventory_service import InventoryService
 from services.sales_service import SalesService
 from ui.pages.catalog_page import CatalogPage
@@ -15,12 +16,16 @@ class MainView(ft.Column):
         self.page = page
         self.inventory_service = inventory_service
         self.sales_service = sales_service
-        self.pages = {
-            "Catálogo": CatalogPage(self.inventory_service, self.page),
-            "Ventas": SalesPage(self.inventory_service, self.sales_service, self.page),
-            "Reportes": ReportsPage(self.sales_service, self.page)
+        # Las páginas se construyen la primera vez que se visitan.
+        self.page_builders: Dict[str, Callable[[], ft.Control]] = {
+            "Catálogo": lambda: CatalogPage(self.inventory_service, self.page),
+            "Ventas": lambda: SalesPage(self.inventory_service, self.sales_service, self.page),
+            "Reportes": lambda: ReportsPage(self.sales_service, self.page)
         }
-        self.current_page = self.pages["Catálogo"]
+        self.pages: Dict[str, ft.Control] = {}
+        # Versión de los datos con que se refrescó por última vez cada página.
+        self.page_versions: Dict[str, object] = {}
+        self.current_page = self.show_page("Catálogo")
         
         # Se usa ft.NavigationBar para la navegación horizontal en la parte inferior.
         self.navigation_bar = ft.NavigationBar(
@@ -57,20 +62,39 @@ class MainView(ft.Column):
             self.page_container
         ]
 
+    def show_page(self, page_name: str) -> ft.Control:
+        """
+        Devuelve la página, construyéndola en la primera visita, y la refresca
+        solo si la versión de sus datos (`data_version`) cambió desde la última
+        vez; las páginas sin versión se refrescan siempre.
+        """
+        page = self.pages.get(page_name)
+        if page is None:
+            page = self.pages[page_name] = self.page_builders[page_name]()
+            logger.info(f"Página construida: {page_name}")
+        if hasattr(page, 'refresh_products'):
+            # La versión se lee antes de refrescar: un cambio durante la carga
+            # hará que la próxima visita vuelva a refrescar.
+            version = page.data_version() if hasattr(page, 'data_version') else None
+            if version is None or self.page_versions.get(page_name) != version:
+                page.refresh_products()
+                self.page_versions[page_name] = version
+        return page
+
     def handle_navigation_change(self, e: ft.ControlEvent):
         """Maneja la navegación entre páginas y refresca la vista."""
         page_index = e.control.selected_index
-        page_name = list(self.pages.keys())[page_index]
+        page_name = list(self.page_builders.keys())[page_index]
 
         self.page_container.controls.clear()
         self.page_container.opacity = 0
         self.page_container.update()
         
-        self.current_page = self.pages[page_name]
-        
-        # Llama a un método de refresco si existe
-        if hasattr(self.current_page, 'refresh_products'):
-            self.current_page.refresh_products()
+        first_visit = page_name not in self.pages
+        self.current_page = self.show_page(page_name)
+        if first_visit:
+            # Los selectores de archivos que la página agregó a `page.overlay` se envían con la página.
+            self.page.update()
         
         self.page_container.controls.append(self.current_page)
         
@@ -78,3 +102,9 @@ class MainView(ft.Column):
         self.page_container.update()
         
         logger.info(f"Navegando a la página: {page_name}")
+
+    def close(self):
+        """Libera los recursos de las páginas de esta sesión en los servicios compartidos."""
+        for page in self.pages.values():
+            if hasattr(page, 'close'):
+                page.close()
@@ -1,10 +1,29 @@
 import flet as ft
+from typing import Dict, List
 from services.inventory_service import InventoryService
 from models.product import Product
 from utils.logger import get_logger
 
 logger = get_logger()
 
+# Productos por página en la tabla del catálogo.
+CATALOG_PAGE_SIZE = 50
+# Columnas de la tabla que se pueden ordenar, con su criterio en `InventoryService.query_products`.
+SORT_COLUMNS = {1: 'sku', 2: 'name', 3: 'cost', 4: 'price', 5: 'stock'}
+# Máximo de errores de importación que se listan en el diálogo.
+IMPORT_ERRORS_SHOWN = 50
+# Movimientos de stock que se muestran en el historial de un producto.
+STOCK_HISTORY_SHOWN = 50
+MOVEMENT_REASONS = {
+    'initial': "Alta",
+    'sale': "Venta",
+    'adjustment': "Ajuste",
+    'import': "Importación",
+    'return': "Devolución",
+    'removal': "Baja",
+    'reconcile': "Conciliación",
+}
+
 class CatalogPage(ft.Column):
     def __init__(self, inventory_service: InventoryService, page: ft.Page):
         super().__init__(
@@ -13,27 +32,66 @@ class CatalogPage(ft.Column):
         )
         self.inventory_service = inventory_service
         self.page = page
-        self.products = self.inventory_service.get_all_products()
+        # Productos de la página visible de la tabla y sus filas, por ID.
+        self.products = []
+        self.rows: Dict[str, ft.DataRow] = {}
+        # Mientras la página no está en pantalla no se envían cambios al cliente:
+        # al volver a mostrarla se envía completa.
+        self.mounted = False
+        self.catalog_page = 0
+        self.sort_by = 'name'
+        self.sort_descending = False
         
         # Controles para agregar un nuevo producto
         self.product_name = ft.TextField(label="Nombre", col={"xs": 12, "sm": 6, "md": 4})
         self.product_cost = ft.TextField(label="Costo", value="0.00", col={"xs": 12, "sm": 6, "md": 4})
         self.product_price = ft.TextField(label="Precio", value="0.00", col={"xs": 12, "sm": 6, "md": 4})
         self.product_stock = ft.TextField(label="Stock", value="0", col={"xs": 12, "sm": 6, "md": 4})
+        self.product_sku = ft.TextField(label="SKU / Código de barras", col={"xs": 12, "sm": 6, "md": 4})
+        self.product_reorder = ft.TextField(label="Stock mínimo", value="0", col={"xs": 12, "sm": 6, "md": 4})
         self.add_product_button = ft.ElevatedButton("Agregar Producto", on_click=self.add_product, col={"xs": 12, "sm": 12, "md": 4})
+
+        # Importación masiva desde CSV
+        self.import_picker = ft.FilePicker(on_result=self.import_csv)
+        self.page.overlay.append(self.import_picker)
+        self.import_button = ft.OutlinedButton(
+            "Importar CSV",
+            icon=ft.Icons.UPLOAD_FILE,
+            on_click=lambda e: self.import_picker.pick_files(
+                dialog_title="Importar productos", allowed_extensions=["csv"]
+            )
+        )
+        self.import_progress = ft.ProgressBar(value=0, visible=False)
+        self.import_status = ft.Text("")
         
+        # Filtro, orden y paginación de la tabla; los resuelve el servicio y
+        # solo se construyen las filas de la página visible.
+        self.search_field = ft.TextField(
+            label="Buscar por nombre o SKU", prefix_icon=ft.Icons.SEARCH, width=300, on_change=self.on_filter_change
+        )
+        self.reorder_filter = ft.Checkbox(label="Solo por reabastecer", value=False, on_change=self.on_filter_change)
+        self.prev_page_button = ft.IconButton(ft.Icons.CHEVRON_LEFT, on_click=self.previous_catalog_page)
+        self.next_page_button = ft.IconButton(ft.Icons.CHEVRON_RIGHT, on_click=self.next_catalog_page)
+        self.page_text = ft.Text("")
+
         self.data_table = ft.DataTable(
             columns=[
                 ft.DataColumn(ft.Text("ID")),
-                ft.DataColumn(ft.Text("Nombre")),
-                ft.DataColumn(ft.Text("Costo")),
-                ft.DataColumn(ft.Text("Precio")),
-                ft.DataColumn(ft.Text("Stock")),
+                ft.DataColumn(ft.Text("SKU"), on_sort=self.on_sort),
+                ft.DataColumn(ft.Text("Nombre"), on_sort=self.on_sort),
+                ft.DataColumn(ft.Text("Costo"), numeric=True, on_sort=self.on_sort),
+                ft.DataColumn(ft.Text("Precio"), numeric=True, on_sort=self.on_sort),
+                ft.DataColumn(ft.Text("Stock"), numeric=True, on_sort=self.on_sort),
                 ft.DataColumn(ft.Text("Acciones")), # Nueva columna para acciones
             ],
-            rows=[]
+            rows=[],
+            sort_column_index=2,
+            sort_ascending=True
         )
-        self.load_table()
+
+        # Aviso de productos por reabastecer, actualizado por las alertas del servicio.
+        self.low_stock_text = ft.Text("", color=ft.Colors.ORANGE)
+        self.unsubscribe_stock_alerts = self.inventory_service.subscribe_stock_alerts(self.on_stock_alert)
         
         self.controls = [
             ft.Text("Catálogo de Productos", size=24, weight="bold"),
@@ -45,6 +103,8 @@ class CatalogPage(ft.Column):
                         self.product_cost,
                         self.product_price,
                         self.product_stock,
+                        self.product_sku,
+                        self.product_reorder,
                         self.add_product_button,
                     ],
                     run_spacing=10
@@ -53,8 +113,13 @@ class CatalogPage(ft.Column):
                 border=ft.border.all(1, ft.Colors.OUTLINE),
                 border_radius=8
             ),
+            ft.Row([self.import_button, self.import_status]),
+            self.import_progress,
             ft.Divider(),
+            self.low_stock_text,
             ft.Text("Productos existentes", size=18, weight="bold"),
+            ft.Row([self.search_field, self.reorder_filter], wrap=True),
+            ft.Row([self.prev_page_button, self.page_text, self.next_page_button]),
             # Contenedor para la tabla de productos, usando ListView para scroll optimizado
             ft.Container(
                 content=ft.ListView(
@@ -65,38 +130,190 @@ class CatalogPage(ft.Column):
             )
         ]
 
+    def did_mount(self):
+        self.mounted = True
+
+    def will_unmount(self):
+        self.mounted = False
+
+    def data_version(self) -> int:
+        """Versión de los datos mostrados; `MainView` solo refresca la página si cambió."""
+        return self.inventory_service.version
+
+    def refresh_products(self):
+        """Carga la tabla y el aviso de stock bajo. Llamado por MainView al mostrar la página."""
+        self.load_table()
+        self.load_low_stock()
+
     def load_table(self):
-        self.data_table.rows.clear()
-        self.products = self.inventory_service.get_all_products()
+        """
+        Sincroniza la tabla con la página actual del catálogo (filtro, orden y
+        paginación). Las filas de los productos que siguen visibles se
+        reutilizan corrigiendo solo las celdas que cambiaron, y solo se crean
+        filas para los productos que entran en la página; así lo que se envía
+        al cliente depende del cambio y no del tamaño del catálogo.
+        """
+        query = self.search_field.value or ""
+        to_reorder = bool(self.reorder_filter.value)
+        total = self.inventory_service.count_products(query, to_reorder)
+        pages = max(1, -(-total // CATALOG_PAGE_SIZE))
+        self.catalog_page = min(self.catalog_page, pages - 1)
+        self.products = self.inventory_service.query_products(
+            query, self.sort_by, self.sort_descending,
+            offset=self.catalog_page * CATALOG_PAGE_SIZE, limit=CATALOG_PAGE_SIZE, to_reorder=to_reorder
+        )
+        self.page_text.value = f"Página {self.catalog_page + 1} de {pages} ({total} productos)"
+        self.prev_page_button.disabled = self.catalog_page == 0
+        self.next_page_button.disabled = self.catalog_page >= pages - 1
+
+        changed = [self.page_text, self.prev_page_button, self.next_page_button]
+        rows = []
         for p in self.products:
-            self.data_table.rows.append(
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(p.id[:8])),
-                        ft.DataCell(ft.Text(p.name)),
-                        ft.DataCell(ft.Text(f"${p.cost:.2f}")),
-                        ft.DataCell(ft.Text(f"${p.price:.2f}")),
-                        ft.DataCell(ft.Text(str(p.stock))),
-                        ft.DataCell(
-                            ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.EDIT,
-                                    tooltip="Editar",
-                                    on_click=lambda e, product_id=p.id: self.edit_product(product_id)
-                                ),
-                                ft.IconButton(
-                                    icon=ft.Icons.DELETE,
-                                    tooltip="Eliminar",
-                                    on_click=lambda e, product_id=p.id: self.delete_product(product_id)
-                                )
-                            ])
+            row = self.rows.get(p.id)
+            if row is None:
+                row = self.product_row(p)
+            else:
+                changed += self.patch_row(row, p)
+            rows.append(row)
+        self.rows = {p.id: row for p, row in zip(self.products, rows)}
+        if rows != self.data_table.rows:
+            # Cambiaron las filas visibles: Flet envía solo las filas nuevas, las
+            # quitadas y las celdas corregidas de las reutilizadas.
+            self.data_table.rows = rows
+            changed = [self.data_table] + changed[:3]
+        if self.mounted:
+            self.page.update(*changed)
+
+    @staticmethod
+    def row_values(p: Product) -> List[str]:
+        """Texto de cada celda de datos de la fila de un producto."""
+        return [p.id[:8], p.sku or "", p.name, f"${p.cost:.2f}", f"${p.price:.2f}", str(p.stock)]
+
+    def patch_row(self, row: ft.DataRow, p: Product) -> List[ft.Control]:
+        """Actualiza las celdas de la fila que no coinciden con el producto y devuelve las modificadas."""
+        changed = []
+        for cell, value in zip(row.cells, self.row_values(p)):
+            if cell.content.value != value:
+                cell.content.value = value
+                changed.append(cell.content)
+        return changed
+
+    def product_row(self, p: Product) -> ft.DataRow:
+        return ft.DataRow(
+            cells=[ft.DataCell(ft.Text(value)) for value in self.row_values(p)] + [
+                ft.DataCell(
+                    ft.Row([
+                        ft.IconButton(
+                            icon=ft.Icons.EDIT,
+                            tooltip="Editar",
+                            on_click=lambda e, product_id=p.id: self.edit_product(product_id)
+                        ),
+                        ft.IconButton(
+                            icon=ft.Icons.HISTORY,
+                            tooltip="Movimientos de stock",
+                            data=p.id,
+                            # Flet solo espera manejadores que sean funciones async.
+                            on_click=self.on_history_click
+                        ),
+                        ft.IconButton(
+                            icon=ft.Icons.DELETE,
+                            tooltip="Eliminar",
+                            on_click=lambda e, product_id=p.id: self.delete_product(product_id)
                         )
-                    ]
+                    ])
                 )
-            )
+            ]
+        )
+
+    def on_filter_change(self, e):
+        self.catalog_page = 0
+        self.load_table()
+
+    def on_sort(self, e: ft.DataColumnSortEvent):
+        self.sort_by = SORT_COLUMNS[e.column_index]
+        self.sort_descending = not e.ascending
+        self.data_table.sort_column_index = e.column_index
+        self.data_table.sort_ascending = e.ascending
+        self.catalog_page = 0
+        self.load_table()
+
+    def previous_catalog_page(self, e):
+        self.catalog_page = max(0, self.catalog_page - 1)
+        self.load_table()
+
+    def next_catalog_page(self, e):
+        self.catalog_page += 1
+        self.load_table()
+
+    def load_low_stock(self):
+        count = self.inventory_service.count_products_to_reorder()
+        if not count:
+            self.low_stock_text.value = ""
+            return
+        names = ", ".join(p.name for p in self.inventory_service.get_products_to_reorder(5))
+        extra = f" y {count - 5} más" if count > 5 else ""
+        self.low_stock_text.value = f"Por reabastecer ({count}): {names}{extra}"
+
+    def on_stock_alert(self, alert):
+        self.load_low_stock()
+        if self.low_stock_text.page:
+            self.low_stock_text.update()
+
+    def close(self):
+        """Deja de recibir alertas de stock (al cerrarse la sesión)."""
+        self.unsubscribe_stock_alerts()
+
+    async def import_csv(self, e: ft.FilePickerResultEvent):
+        """Importa el CSV elegido mostrando el avance; la tabla se recarga una sola vez al final."""
+        if not e.files:
+            return
+        path = e.files[0].path
+        self.import_button.disabled = True
+        self.import_progress.value = 0
+        self.import_progress.visible = True
+        self.import_status.value = "Importando..."
         self.update()
 
-    def add_product(self, e):
+        def on_progress(rows: int, fraction: float):
+            self.import_progress.value = fraction
+            self.import_status.value = f"Importando... {rows} filas leídas"
+            self.import_progress.update()
+            self.import_status.update()
+
+        result = await self.inventory_service.import_products_async(path, on_progress)
+
+        self.import_button.disabled = False
+        self.import_progress.visible = False
+        self.import_status.value = (f"{result.created} productos nuevos, {result.updated} actualizados, "
+                                    f"{len(result.errors)} filas con errores.")
+        self.load_table()
+        self.load_low_stock()
+        if result.errors:
+            self.show_import_errors(result.errors)
+        else:
+            self.page.overlay.append(ft.SnackBar(ft.Text("Importación completada."), open=True))
+        self.page.update()
+
+    def show_import_errors(self, errors):
+        shown = errors[:IMPORT_ERRORS_SHOWN]
+        lines = [ft.Text(f"Línea {error.line}: {error.message}" if error.line else error.message) for error in shown]
+        if len(errors) > len(shown):
+            lines.append(ft.Text(f"... y {len(errors) - len(shown)} errores más."))
+
+        def close_dialog(e):
+            self.page.dialog.open = False
+            self.page.update()
+
+        dialog = ft.AlertDialog(
+            title=ft.Text("Filas con errores"),
+            content=ft.Column(lines, tight=True, scroll=ft.ScrollMode.AUTO, height=300),
+            actions=[ft.TextButton("Cerrar", on_click=close_dialog)],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.dialog = dialog
+        dialog.open = True
+
+    async def add_product(self, e):
         # Validación: El nombre del producto no puede estar vacío
         if not self.product_name.value:
             self.page.overlay.append(ft.SnackBar(ft.Text("El nombre del producto no puede estar vacío.")))
@@ -108,12 +325,20 @@ class CatalogPage(ft.Column):
             cost_str = self.product_cost.value.replace(',', '')
             price_str = self.product_price.value.replace(',', '')
             stock_str = self.product_stock.value.replace(',', '')
+            reorder_str = self.product_reorder.value.replace(',', '') or "0"
 
             cost = float(cost_str)
             price = float(price_str)
             stock = int(stock_str)
+            reorder_threshold = int(reorder_str)
             
-            self.inventory_service.add_product(self.product_name.value, cost, price, stock)
+            if not await self.inventory_service.add_product_async(self.product_name.value, cost, price, stock,
+                                                                  self.product_sku.value, reorder_threshold):
+                self.page.overlay.append(
+                    ft.SnackBar(content=ft.Text("No se pudo agregar el producto. Verifica que el SKU no esté repetido."), open=True)
+                )
+                self.page.update()
+                return
             self.load_table()
             
             # Muestra el mensaje de éxito
@@ -126,13 +351,15 @@ class CatalogPage(ft.Column):
             self.product_cost.value = "0.00"
             self.product_price.value = "0.00"
             self.product_stock.value = "0"
+            self.product_sku.value = ""
+            self.product_reorder.value = "0"
 
             self.page.update()
 
         except ValueError:
             # Muestra un mensaje de error específico
             self.page.overlay.append(
-                ft.SnackBar(content=ft.Text("Error en los valores. Asegúrate de que costo, precio y stock sean números válidos."))
+                ft.SnackBar(content=ft.Text("Error en los valores. Asegúrate de que costo, precio, stock y stock mínimo sean números válidos."))
             )
             self.page.update()
             
@@ -149,28 +376,36 @@ class CatalogPage(ft.Column):
         edit_cost = ft.TextField(label="Costo", value=str(product.cost))
         edit_price = ft.TextField(label="Precio", value=str(product.price))
         edit_stock = ft.TextField(label="Stock", value=str(product.stock))
+        edit_sku = ft.TextField(label="SKU / Código de barras", value=product.sku or "")
+        edit_reorder = ft.TextField(label="Stock mínimo", value=str(product.reorder_threshold))
         
-        def save_changes(e):
+        async def save_changes(e):
             try:
                 name = edit_name.value
                 cost = float(edit_cost.value.replace(',', ''))
                 price = float(edit_price.value.replace(',', ''))
                 stock = int(edit_stock.value.replace(',', ''))
+                reorder_threshold = int(edit_reorder.value.replace(',', '') or "0")
                 
                 logger.info(f"Guardando cambios para producto '{product.name}' (ID: {product_id})")
                 
-                if self.inventory_service.update_product(
+                if await self.inventory_service.update_product_async(
                     product_id,
                     name=name,
                     cost=cost,
                     price=price,
-                    stock=stock
+                    stock=stock,
+                    sku=edit_sku.value,
+                    reorder_threshold=reorder_threshold
                 ):
                     self.load_table()
                     self.page.overlay.append(ft.SnackBar(ft.Text(f"Producto '{name}' actualizado.")))
                     logger.info("Producto actualizado exitosamente.")
                 else:
-                    self.page.overlay.append(ft.SnackBar(ft.Text("Error al actualizar producto.")))
+                    self.page.overlay.append(ft.SnackBar(ft.Text(
+                        "Error al actualizar producto: revisa que el SKU no esté repetido y que el "
+                        "stock no sea menor que lo reservado en carritos."
+                    )))
                     logger.error("El servicio de inventario regresó 'False' al intentar actualizar.")
             except ValueError:
                 self.page.overlay.append(ft.SnackBar(ft.Text("Error en los valores. Verifica que sean números válidos.")))
@@ -190,7 +425,9 @@ class CatalogPage(ft.Column):
                 edit_name,
                 edit_cost,
                 edit_price,
-                edit_stock
+                edit_stock,
+                edit_sku,
+                edit_reorder
             ], tight=True),
             actions=[
                 ft.TextButton("Cancelar", on_click=cancel_edit),
@@ -203,6 +440,47 @@ class CatalogPage(ft.Column):
         dialog.open = True
         self.page.update()
 
+    async def on_history_click(self, e):
+        await self.show_stock_history(e.control.data)
+
+    async def show_stock_history(self, product_id: str):
+        product = self.inventory_service.get_product(product_id)
+        if not product:
+            return
+        movements = await self.inventory_service.get_stock_history_async(product_id, STOCK_HISTORY_SHOWN)
+
+        def close_dialog(e):
+            self.page.dialog.open = False
+            self.page.update()
+
+        table = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Fecha")),
+                ft.DataColumn(ft.Text("Motivo")),
+                ft.DataColumn(ft.Text("Cambio"), numeric=True),
+                ft.DataColumn(ft.Text("Stock"), numeric=True),
+            ],
+            rows=[
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(m.timestamp[:19].replace("T", " "))),
+                    ft.DataCell(ft.Text(MOVEMENT_REASONS.get(m.reason, m.reason))),
+                    ft.DataCell(ft.Text(f"{m.delta:+d}")),
+                    ft.DataCell(ft.Text(str(m.balance))),
+                ])
+                for m in movements
+            ],
+        )
+        dialog = ft.AlertDialog(
+            title=ft.Text(f"Movimientos de '{product.name}'"),
+            content=ft.Column([table] if movements else [ft.Text("Sin movimientos registrados.")],
+                              tight=True, scroll=ft.ScrollMode.AUTO, height=300),
+            actions=[ft.TextButton("Cerrar", on_click=close_dialog)],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.dialog = dialog
+        dialog.open = True
+        self.page.update()
+
     def delete_product(self, product_id: str):
         logger.info(f"Intentando eliminar producto con ID: {product_id}")
         product = self.inventory_service.get_product(product_id)
@@ -212,9 +490,9 @@ class CatalogPage(ft.Column):
             self.page.update()
             return
             
-        def confirm_delete(e):
+        async def confirm_delete(e):
             logger.info(f"Confirmando eliminación de '{product.name}' (ID: {product_id})")
-            if self.inventory_service.delete_product(product_id):
+            if await self.inventory_service.delete_product_async(product_id):
                 self.load_table()
                 self.page.overlay.append(ft.SnackBar(ft.Text(f"Producto '{product.name}' eliminado.")))
                 logger.info("Producto eliminado exitosamente.")
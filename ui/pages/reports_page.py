@@ -1,9 +1,14 @@
 import flet as ft
+import threading
+from datetime import datetime, timedelta
 from services.sales_service import SalesService
 from utils.logger import get_logger
 
 logger = get_logger()
 
+# Ventas por página en la tabla del historial.
+SALES_PAGE_SIZE = 100
+
 class ReportsPage(ft.Column):
     def __init__(self, sales_service: SalesService, page: ft.Page):
         super().__init__(
@@ -13,8 +18,29 @@ class ReportsPage(ft.Column):
         self.sales_service = sales_service
         self.page = page
         self.sales = []
+        self.sales_page = 0
         
         self.reports_text = ft.Text("Generando reporte...", size=16)
+        self.analytics_text = ft.Text("", size=14)
+
+        # Exportación de ventas por rango de fechas
+        self.export_start = ft.TextField(label="Desde (AAAA-MM-DD)", width=170)
+        self.export_end = ft.TextField(label="Hasta (AAAA-MM-DD)", width=170)
+        self.export_format = ft.Dropdown(
+            label="Formato", width=120, value="csv",
+            options=[ft.dropdown.Option("csv", "CSV"), ft.dropdown.Option("jsonl", "JSONL")]
+        )
+        self.export_level = ft.Dropdown(
+            label="Detalle", width=170, value="sales",
+            options=[ft.dropdown.Option("sales", "Una fila por venta"), ft.dropdown.Option("lines", "Una fila por producto")]
+        )
+        self.export_picker = ft.FilePicker(on_result=self.export_sales)
+        self.page.overlay.append(self.export_picker)
+        self.export_button = ft.ElevatedButton("Exportar", icon=ft.Icons.DOWNLOAD, on_click=self.pick_export_file)
+        self.cancel_export_button = ft.TextButton("Cancelar", on_click=self.cancel_export, visible=False)
+        self.export_progress = ft.ProgressBar(value=0, visible=False)
+        self.export_status = ft.Text("")
+        self.export_cancel = None
         
         self.sales_table = ft.DataTable(
             columns=[
@@ -28,6 +54,11 @@ class ReportsPage(ft.Column):
         )
         
         # Eliminada la llamada a self.load_sales_table_data() del constructor
+
+        # Paginación del historial, de la venta más reciente a la más antigua
+        self.prev_page_button = ft.IconButton(ft.Icons.CHEVRON_LEFT, on_click=self.previous_sales_page)
+        self.next_page_button = ft.IconButton(ft.Icons.CHEVRON_RIGHT, on_click=self.next_sales_page)
+        self.page_text = ft.Text("")
         
         self.controls = [
             ft.Text("Reportes y Historial", size=24, weight="bold"),
@@ -36,6 +67,14 @@ class ReportsPage(ft.Column):
                 ft.Column(
                     [
                         self.reports_text,
+                        self.analytics_text,
+                        ft.Row([
+                            self.export_start, self.export_end, self.export_format, self.export_level,
+                            self.export_button, self.cancel_export_button
+                        ], wrap=True),
+                        self.export_progress,
+                        self.export_status,
+                        ft.Row([self.prev_page_button, self.page_text, self.next_page_button]),
                         ft.Container(
                             content=ft.ListView(
                                 [self.sales_table],
@@ -50,9 +89,115 @@ class ReportsPage(ft.Column):
             ])
         ]
         
+    def load_summary(self):
+        """Muestra los totales a partir de los agregados del servicio, sin recorrer el historial."""
+        totals = self.sales_service.get_totals()
+        today = self.sales_service.get_day_totals(datetime.now().date().isoformat())
+        top = self.sales_service.get_top_products(1)
+        lines = [
+            f"Ventas: {totals['sales']}  |  Unidades: {totals['units']}",
+            f"Ingresos: ${totals['revenue']:.2f}  |  Costo: ${totals['cost']:.2f}  |  Ganancia: ${totals['profit']:.2f}",
+            f"Hoy: {today['sales']} ventas, ${today['revenue']:.2f} en ingresos, ${today['profit']:.2f} de ganancia",
+        ]
+        if top:
+            lines.append(f"Producto más vendido: {top[0]['name']} (${top[0]['revenue']:.2f})")
+        self.reports_text.value = "\n".join(lines)
+
+    def load_analytics(self):
+        """Productos más vendidos con su margen y la hora de mayores ingresos."""
+        analytics = self.sales_service.get_analytics()
+        top = analytics.top_products(5)
+        if not top:
+            self.analytics_text.value = ""
+            return
+        lines = ["Top productos por ingresos:"]
+        lines += [
+            f"  {p['name']}: {p['units']:.0f} u., ${p['revenue']:.2f} (margen {p['margin']:.0%})"
+            for p in top
+        ]
+        hourly = analytics.by_hour_of_day()['revenue']
+        peak = int(hourly.argmax())
+        lines.append(f"Hora pico: {peak:02d}:00-{peak + 1:02d}:00 (${hourly[peak]:.2f} acumulados)")
+        self.analytics_text.value = "\n".join(lines)
+
+    def export_range(self):
+        """Rango de la exportación; la fecha final se incluye completa. Lanza ValueError si no es válido."""
+        start = self.export_start.value.strip() or None
+        end = self.export_end.value.strip() or None
+        if start:
+            start = datetime.strptime(start, "%Y-%m-%d").date().isoformat()
+        if end:
+            end = (datetime.strptime(end, "%Y-%m-%d").date() + timedelta(days=1)).isoformat()
+        return start, end
+
+    def pick_export_file(self, e):
+        try:
+            self.export_range()
+        except ValueError:
+            self.page.overlay.append(ft.SnackBar(ft.Text("Las fechas deben tener el formato AAAA-MM-DD."), open=True))
+            self.page.update()
+            return
+        self.export_picker.save_file(
+            dialog_title="Exportar ventas",
+            file_name=f"ventas.{self.export_format.value}",
+            allowed_extensions=[self.export_format.value]
+        )
+
+    async def export_sales(self, e: ft.FilePickerResultEvent):
+        """Exporta en segundo plano mostrando el avance; se puede cancelar."""
+        if not e.path:
+            return
+        start, end = self.export_range()
+        self.export_cancel = threading.Event()
+        self.export_button.disabled = True
+        self.cancel_export_button.visible = True
+        self.export_progress.value = None
+        self.export_progress.visible = True
+        self.export_status.value = "Exportando..."
+        self.update()
+
+        def on_progress(exported: int, total: int):
+            self.export_progress.value = exported / total if total else None
+            self.export_status.value = f"Exportando... {exported} de {total} ventas"
+            self.export_progress.update()
+            self.export_status.update()
+
+        exported = await self.sales_service.export_sales_to_file_async(
+            e.path, start, end, self.export_format.value, self.export_level.value,
+            on_progress, self.export_cancel
+        )
+
+        if exported is not None:
+            self.export_status.value = f"Se exportaron {exported} ventas a {e.path}."
+        elif self.export_cancel.is_set():
+            self.export_status.value = "Exportación cancelada."
+        else:
+            self.export_status.value = "Error al exportar las ventas."
+        self.export_cancel = None
+        self.export_button.disabled = False
+        self.cancel_export_button.visible = False
+        self.export_progress.visible = False
+        self.update()
+
+    def cancel_export(self, e):
+        if self.export_cancel is not None:
+            self.export_cancel.set()
+
+    def close(self):
+        """Cancela la exportación en curso (al cerrarse la sesión)."""
+        self.cancel_export(None)
+
     def load_sales_table_data(self):
-        """Carga los datos de la tabla."""
-        self.sales = self.sales_service.get_all_sales()
+        """Carga en la tabla la página actual del historial, sin recorrer el resto de las ventas."""
+        total = self.sales_service.count_sales_between()
+        pages = max(1, -(-total // SALES_PAGE_SIZE))
+        self.sales_page = min(self.sales_page, pages - 1)
+        self.sales = list(self.sales_service.query_sales(
+            offset=self.sales_page * SALES_PAGE_SIZE, limit=SALES_PAGE_SIZE, order="desc"
+        ))
+        self.page_text.value = f"Página {self.sales_page + 1} de {pages} ({total} ventas)"
+        self.prev_page_button.disabled = self.sales_page == 0
+        self.next_page_button.disabled = self.sales_page >= pages - 1
         self.sales_table.rows.clear()
         
         for sale in self.sales:
@@ -68,10 +213,25 @@ class ReportsPage(ft.Column):
                 )
             )
 
+    def previous_sales_page(self, e):
+        self.sales_page = max(0, self.sales_page - 1)
+        self.load_sales_table_data()
+        self.update()
+
+    def next_sales_page(self, e):
+        self.sales_page += 1
+        self.load_sales_table_data()
+        self.update()
+
+    def data_version(self) -> int:
+        return self.sales_service.version
+
     def refresh_products(self):
         """
         Método público para refrescar los datos. 
         Llamado por MainView al navegar a esta página.
         """
+        self.load_summary()
+        self.load_analytics()
         self.load_sales_table_data()
         # Eliminada la llamada a self.update()
@@ -1,11 +1,16 @@
 import flet as ft
-import asyncio
+import uuid
+from typing import Optional
+from models.product import Product
 from services.inventory_service import InventoryService
 from services.sales_service import SalesService
 from utils.logger import get_logger
 
 logger = get_logger()
 
+# Máximo de productos que se muestran en el selector a la vez.
+PRODUCT_OPTIONS_LIMIT = 50
+
 class SalesPage(ft.Column):
     def __init__(self, inventory_service: InventoryService, sales_service: SalesService, page: ft.Page):
         super().__init__(expand=True)
@@ -13,6 +18,17 @@ class SalesPage(ft.Column):
         self.sales_service = sales_service
         self.page = page
         
+        self.scan_field = ft.TextField(
+            label="Escanear código / SKU",
+            autofocus=True,
+            expand=True,
+            on_submit=self.scan_code
+        )
+        self.search_field = ft.TextField(
+            label="Buscar Producto",
+            width=250,
+            on_change=self.filter_products
+        )
         self.selected_product = ft.Dropdown(
             label="Seleccionar Producto",
             expand=True,
@@ -24,11 +40,18 @@ class SalesPage(ft.Column):
         self.total_text = ft.Text("Total: $0.00", size=20, weight="bold")
         self.checkout_btn = ft.ElevatedButton("Finalizar Venta", on_click=self.checkout, style=ft.ButtonStyle(bgcolor=ft.Colors.GREEN))
         
-        self.cart = []
+        # Líneas del carrito y su control en la lista, por ID de producto.
+        self.cart = {}
+        self.cart_tiles = {}
+        # El stock de los productos en el carrito queda apartado con esta reserva
+        # para que otras sesiones no lo vendan antes de finalizar la venta.
+        self.reservation_id = str(uuid.uuid4())
         
         self.controls = [
             ft.Text("Registro de Ventas", size=24, weight="bold"),
+            ft.Row([self.scan_field]),
             ft.Row([
+                self.search_field,
                 self.selected_product,
                 self.quantity_field,
                 self.add_to_cart_btn
@@ -43,13 +66,25 @@ class SalesPage(ft.Column):
         ]
 
     def load_products_dropdown(self):
-        products = self.inventory_service.get_all_products()
+        products = self.inventory_service.search_products(self.search_field.value or "", PRODUCT_OPTIONS_LIMIT)
         self.selected_product.options = [ft.dropdown.Option(p.id, p.name) for p in products]
         # Eliminada la llamada a self.update()
     
+    def data_version(self) -> int:
+        # El selector solo muestra nombres: el stock se valida al agregar al carrito.
+        return self.inventory_service.catalog_version
+
     def refresh_products(self):
         self.load_products_dropdown()
+        # Otra sesión pudo eliminar productos que están en el carrito.
+        self.drop_deleted_products()
         
+    def filter_products(self, e):
+        self.load_products_dropdown()
+        if self.selected_product.value not in {o.key for o in self.selected_product.options}:
+            self.selected_product.value = None
+        self.update()
+
     def update_product_info(self, e):
         pass
 
@@ -58,55 +93,121 @@ class SalesPage(ft.Column):
         try:
             quantity = int(self.quantity_field.value)
             product = self.inventory_service.get_product(product_id)
-            
-            if not product or product.stock < quantity or quantity <= 0:
-                self.page.overlay.append(ft.SnackBar(ft.Text("Cantidad inválida o stock insuficiente.")))
-                self.page.update()
+            if not self.add_product_to_cart(product, quantity):
                 return
-            
-            item_found = False
-            for item in self.cart:
-                if item['product_id'] == product_id:
-                    item['quantity'] += quantity
-                    item_found = True
-                    break
-            
-            if not item_found:
-                self.cart.append({'product_id': product_id, 'quantity': quantity})
-            
-            self.render_cart()
             self.quantity_field.value = "1"
         except (ValueError, TypeError):
             self.page.overlay.append(ft.SnackBar(ft.Text("Selecciona un producto y una cantidad válida.")))
             self.page.update()
         
         self.update()
+
+    def scan_code(self, e):
+        """Agrega una unidad del producto cuyo SKU o código de barras se escaneó."""
+        code = self.scan_field.value
+        self.scan_field.value = ""
+        product = self.inventory_service.get_product_by_sku(code)
+        if not product:
+            self.page.overlay.append(ft.SnackBar(ft.Text(f"Código no encontrado: {code}"), open=True))
+            self.page.update()
+        else:
+            self.add_product_to_cart(product, 1)
+        self.scan_field.update()
+        self.scan_field.focus()
+
+    def add_product_to_cart(self, product: Optional[Product], quantity: int) -> bool:
+        """
+        Suma `quantity` unidades al carrito, reservando el stock. Solo se
+        actualiza (o se agrega) la línea de ese producto y el total, sin
+        reconstruir el resto de la lista.
+        """
+        if not product or quantity <= 0 or \
+                not self.inventory_service.reserve(self.reservation_id, product.id, quantity):
+            self.page.overlay.append(ft.SnackBar(ft.Text("Cantidad inválida o stock insuficiente."), open=True))
+            self.page.update()
+            return False
+
+        item = self.cart.setdefault(product.id, {'product_id': product.id, 'quantity': 0})
+        item['quantity'] += quantity
+        tile = self.cart_tiles.get(product.id)
+        if tile is None:
+            tile = ft.ListTile(title=ft.Text(), trailing=ft.Text())
+            self.cart_tiles[product.id] = tile
+            self.fill_cart_tile(tile, product, item['quantity'])
+            self.cart_list.controls.append(tile)
+            self.cart_list.update()
+        else:
+            self.fill_cart_tile(tile, product, item['quantity'])
+            tile.update()
+        self.update_total()
+        return True
+
+    @staticmethod
+    def fill_cart_tile(tile: ft.ListTile, product: Product, quantity: int):
+        tile.title.value = f"{product.name} x {quantity}"
+        tile.trailing.value = f"${product.price * quantity:.2f}"
+
+    def drop_deleted_products(self) -> bool:
+        """
+        Quita del carrito (sin actualizar la vista) las líneas de productos que
+        otra sesión eliminó del catálogo y avisa al usuario. Devuelve True si
+        quitó alguna.
+        """
+        deleted = [product_id for product_id in self.cart if self.inventory_service.get_product(product_id) is None]
+        if not deleted:
+            return False
+        for product_id in deleted:
+            del self.cart[product_id]
+            tile = self.cart_tiles.pop(product_id, None)
+            if tile in self.cart_list.controls:
+                self.cart_list.controls.remove(tile)
+        logger.warning(f"Se quitaron del carrito {len(deleted)} productos eliminados del catálogo.")
+        self.page.overlay.append(ft.SnackBar(
+            ft.Text(f"Se quitaron del carrito {len(deleted)} productos que ya no están en el catálogo."), open=True
+        ))
+        self.page.update()
+        return True
+
+    def update_total(self):
+        if self.drop_deleted_products():
+            self.cart_list.update()
+        total = 0.0
+        for item in self.cart.values():
+            product = self.inventory_service.get_product(item['product_id'])
+            if product is not None:
+                total += product.price * item['quantity']
+        self.total_text.value = f"Total: ${total:.2f}"
+        self.total_text.update()
         
     def render_cart(self):
+        self.drop_deleted_products()
         self.cart_list.controls.clear()
-        total = 0.0
-        for item in self.cart:
+        self.cart_tiles.clear()
+        for item in self.cart.values():
             product = self.inventory_service.get_product(item['product_id'])
-            subtotal = product.price * item['quantity']
-            total += subtotal
-            self.cart_list.controls.append(
-                ft.ListTile(
-                    title=ft.Text(f"{product.name} x {item['quantity']}"),
-                    trailing=ft.Text(f"${subtotal:.2f}")
-                )
-            )
-        self.total_text.value = f"Total: ${total:.2f}"
+            if product is None:
+                continue
+            tile = ft.ListTile(title=ft.Text(), trailing=ft.Text())
+            self.fill_cart_tile(tile, product, item['quantity'])
+            self.cart_tiles[product.id] = tile
+            self.cart_list.controls.append(tile)
+        self.update_total()
         self.update()
 
     async def checkout(self, e):
+        if self.drop_deleted_products():
+            # El total cambió: se muestra el carrito actualizado antes de cobrar.
+            self.render_cart()
+            return
         if not self.cart:
             self.page.overlay.append(ft.SnackBar(ft.Text("El carrito está vacío.")))
             self.page.update()
             return
             
-        sale = self.sales_service.record_sale(self.cart)
+        sale = await self.sales_service.record_sale_async(list(self.cart.values()), self.reservation_id)
         
         if sale:
+            self.inventory_service.release(self.reservation_id)
             self.cart.clear()
             self.render_cart()
             self.page.overlay.append(ft.SnackBar(ft.Text("Venta registrada exitosamente.")))
@@ -115,3 +216,8 @@ class SalesPage(ft.Column):
         
         self.page.update()
         self.update()
+
+    def close(self):
+        """Libera el stock reservado por el carrito (al cerrarse la sesión)."""
+        self.inventory_service.release(self.reservation_id)
+        self.cart.clear()
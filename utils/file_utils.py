@@ -0,0 +1,37 @@
+import os
+from typing import BinaryIO
+from utils.logger import get_logger
+
+logger = get_logger()
+
+_TAIL_CHUNK_SIZE = 64 * 1024
+
+def _last_line_end(f: BinaryIO, size: int) -> int:
+    """Posición justo después del último salto de línea de un archivo abierto en binario (0 si no hay)."""
+    pos = size
+    while pos > 0:
+        step = min(_TAIL_CHUNK_SIZE, pos)
+        pos -= step
+        f.seek(pos)
+        index = f.read(step).rfind(b'\n')
+        if index >= 0:
+            return pos + index + 1
+    return 0
+
+def open_for_append(path: str) -> BinaryIO:
+    """
+    Abre un archivo de registros de una línea (diarios, logs) para agregar al
+    final. Si un corte dejó la última línea a medias, la descarta antes: de lo
+    contrario el siguiente registro quedaría pegado a ella y se perdería al leer.
+    """
+    f = open(path, 'ab')
+    size = f.tell()
+    if size:
+        with open(path, 'rb') as reader:
+            reader.seek(size - 1)
+            if reader.read(1) != b'\n':
+                end = _last_line_end(reader, size)
+                f.truncate(end)
+                logger.warning(f"Registro incompleto al final de {os.path.basename(path)}: "
+                               f"se descartan {size - end} bytes.")
+    return f
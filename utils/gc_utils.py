@@ -0,0 +1,16 @@
+import gc
+from contextlib import contextmanager
+
+@contextmanager
+def paused_gc():
+    """
+    Suspende el recolector de ciclos mientras se crean muchos objetos de golpe
+    (cargas masivas), donde sus pasadas no liberan nada y solo cuestan tiempo.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()